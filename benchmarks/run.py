@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks of tenc on synthetic power-law multigraphs, see tenc.synthetic.
+
+    python benchmarks/run.py --scales 10000,100000 -O results.json
+
+Every scenario runs in a process of its own, such that its peak RSS can be
+measured. Results are written as JSON with seconds, relations per second
+(triples_per_sec) and peak RSS in KB of every scenario and scale. Inputs of
+the parse scenarios have additional literal attributes (--attributes), which
+are tokenized with has_word. Parse scenarios time the conversion without
+compressing the archive, the compress scenario times the compression.
+"""
+
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import traceback
+from multiprocessing import Process, Queue
+from optparse import OptionParser
+from Queue import Empty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tenc import TZArchive, available_parsers, available_serializers
+from tenc._tenc import fjoin, read_tensor_size, read_tensor_index
+from tenc.synthetic import FORMATS, generate, write
+
+log = logging.getLogger('benchmark')
+
+SCENARIOS = ['parse', 'compress', 'read', 'serialize']
+
+# file extension of the synthetic input by parser
+EXTENSIONS = {'tab-delimited': 'tsv', 'ntriples': 'nt', 'reverb': 'reverb', 'mln': 'db'}
+
+# attribute predicates of the synthetic graphs and their attribute map
+ATTRIBUTE_PREDICATES = 2
+ATTR_MAP = dict(('attr%d' % a, 'has_word') for a in xrange(ATTRIBUTE_PREDICATES))
+
+# seconds between checks whether a scenario process died without a result
+POLL = 1
+
+
+def archive(workdir, scale):
+    return os.path.join(workdir, 'graph-%d' % scale)
+
+
+def input_file(workdir, scale, fmt):
+    return os.path.join(workdir, 'graph-%d.%s' % (scale, EXTENSIONS[fmt]))
+
+
+def prepare(workdir, scale, attributes):
+    """
+    Write synthetic inputs of all formats and the archive that the read and
+    serialize scenarios work on
+    """
+    g = generate(scale, n_attributes=int(scale * attributes), n_attribute_predicates=ATTRIBUTE_PREDICATES)
+    for fmt in FORMATS:
+        write(g, input_file(workdir, scale, fmt), fmt)
+    # mln has no literals, such that the archive does not depend on nltk
+    available_parsers['mln'][0](archive(workdir, scale)).convert([input_file(workdir, scale, 'mln')])
+
+
+def parse(workdir, scale, fmt):
+    # literals are attributes, the members are not compressed
+    prefix = os.path.join(workdir, 'parse-%s-%d' % (fmt, scale))
+    p = available_parsers[fmt][0](prefix, ATTR_MAP)
+    yield
+    p.convert([input_file(workdir, scale, fmt)], compress=False)
+    yield
+    p.discard()
+
+
+def compress(workdir, scale, _):
+    # compress the members of the prepared archive again
+    tmp = tempfile.mkdtemp(dir=workdir)
+    with tarfile.open(archive(workdir, scale) + '.tz', 'r:bz2') as arc:
+        names = arc.getnames()
+        arc.extractall(tmp)
+    out = TZArchive(os.path.join(workdir, 'compress-%d' % scale), 'w:bz2')
+    for name in names:
+        out.add_file(os.path.join(tmp, name), name)
+    yield
+    out.compress()
+    yield
+    shutil.rmtree(tmp)
+
+
+def read(workdir, scale, member):
+    arc = TZArchive(archive(workdir, scale), 'r:bz2')
+    if member == 'size':
+        read_tensor_size(arc.member(fjoin(arc.SUBS_FOUT, arc.SHAPE_SUFFIX)))
+    else:
+        read_tensor_index(arc.member(fjoin(arc.ENTITIES_FOUT, arc.MAP_SUFFIX)))
+
+
+def serialize(workdir, scale, name):
+    # serializers write next to the archive, work on a copy
+    prefix = os.path.join(workdir, 'serialize-%s-%d' % (name, scale))
+    shutil.copy(archive(workdir, scale) + '.tz', prefix + '.tz')
+    ser = available_serializers[name][0](prefix)
+    ser.serialize((1, 1))
+
+
+def variants(scenario):
+    if scenario == 'parse':
+        return FORMATS
+    if scenario == 'compress':
+        return [None]
+    if scenario == 'read':
+        return ['size', 'entities']
+    return available_serializers.names()
+
+
+def _run(queue, fun, workdir, scale, variant):
+    # runs in a process of its own, scenarios that are generators yield
+    # before and after the timed part
+    try:
+        t = time.time()
+        result = fun(workdir, scale, variant)
+        if hasattr(result, 'next'):
+            result.next()
+            t = time.time()
+            result.next()
+            seconds = time.time() - t
+            for _ in result:
+                pass
+        else:
+            seconds = time.time() - t
+        queue.put((seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, None))
+    except Exception:
+        queue.put((None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, traceback.format_exc()))
+
+
+def run(scenario, workdir, scale, variant):
+    queue = Queue()
+    p = Process(target=_run, args=(queue, globals()[scenario], workdir, scale, variant))
+    p.start()
+    while True:
+        try:
+            seconds, rss, error = queue.get(timeout=POLL)
+            break
+        except Empty:
+            # e.g. killed by the OOM killer. Processes put their result
+            # before they exit.
+            if p.exitcode is not None:
+                try:
+                    seconds, rss, error = queue.get(timeout=POLL)
+                except Empty:
+                    seconds, rss, error = None, None, 'Process exited with code %d' % p.exitcode
+                break
+    p.join()
+    result = {'scenario': scenario, 'variant': variant, 'scale': scale, 'triples': scale,
+              'seconds': seconds, 'triples_per_sec': scale / seconds if seconds else None,
+              'peak_rss_kb': rss}
+    if error is not None:
+        result['error'] = error.strip().splitlines()[-1]
+        log.warn('%s %s at %d failed: %s' % (scenario, variant, scale, result['error']))
+    else:
+        log.info('%s %s at %d: %.3fs, %.0f triples/s, %d KB' % (
+            scenario, variant, scale, seconds, result['triples_per_sec'] or 0, rss))
+    return result
+
+
+def main():
+    opt = OptionParser(usage='%prog [options]')
+    opt.add_option('-s', '--scales', dest='scales', default='10000,100000',
+                   help='Numbers of relations of the synthetic graphs, separated by commas')
+    opt.add_option('-a', '--attributes', dest='attributes', default=0.5, type='float',
+                   help='Number of literal attributes per relation')
+    opt.add_option('-b', '--scenarios', dest='scenarios', default=','.join(SCENARIOS),
+                   help='Scenarios to run, separated by commas (%s)' % ', '.join(SCENARIOS))
+    opt.add_option('-O', '--out', dest='out', default='benchmark.json',
+                   help='JSON file for the results')
+    opt.add_option('-w', '--workdir', dest='workdir', default=None,
+                   help='Directory for synthetic inputs and outputs (default: temporary)')
+    (options, args) = opt.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('tenc').setLevel(logging.WARN)
+
+    workdir = options.workdir or tempfile.mkdtemp(prefix='tenc-bench-')
+    scenarios = [s for s in options.scenarios.split(',') if s]
+    for s in scenarios:
+        if not s in SCENARIOS:
+            raise SystemExit('Unknown scenario (%s)' % s)
+
+    results = []
+    try:
+        for scale in [int(s) for s in options.scales.split(',')]:
+            prepare(workdir, scale, options.attributes)
+            for scenario in scenarios:
+                for variant in variants(scenario):
+                    results.append(run(scenario, workdir, scale, variant))
+    finally:
+        if options.workdir is None:
+            shutil.rmtree(workdir)
+
+    with open(options.out, 'w') as fout:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }, fout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,90 @@
 from _tenc import TZArchive
 from _tenc import MAP_ORDER as MAP
 
-available_parsers = dict()
-available_serializers = dict()
+
+
+class Registry(dict):
+    """
+    Plugins by name. Plugins that are declared with their module are only
+    imported when they are looked up, such that listing plugins or parsing
+    options does not import NLTK, scipy etc.
+    """
+
+    def __init__(self):
+        super(Registry, self).__init__()
+        self.declared = {}
+
+    def declare(self, module, *names):
+        """
+        Declare plugins (name, description) of module. The declaration is
+        the only place of the description of built-in plugins.
+        """
+        for name, description in names:
+            self.declared[name] = (module, description)
+
+    def register(self, name, cls, description=None):
+        """
+        Register plugin cls, the description defaults to the declared one
+        """
+        if description is None:
+            description = self.declared.get(name, (None, ''))[1]
+        self[name] = (cls, description)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.declared
+
+    def __getitem__(self, name):
+        if not dict.__contains__(self, name) and name in self.declared:
+            __import__(self.declared[name][0])
+        return dict.__getitem__(self, name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def names(self):
+        return sorted(set(self.keys()) | set(self.declared))
+
+    def description(self, name):
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)[1]
+        return self.declared[name][1]
+
+
+available_parsers = Registry()
+available_parsers.declare(
+    'tenc.parser',
+    ('mln', 'Markov Logic Network data'),
+    ('tab-delimited', ''),
+    ('ntriples', ''),
+    ('rdfxml', ''),
+    ('turtle', ''),
+    ('reverb', ''),
+    ('ypss-surface', ''),
+    ('ypss-facts', ''),
+)
+
+available_serializers = Registry()
+available_serializers.declare(
+    'tenc.serializer',
+    ('matlab', ''),
+    ('matlab-stream', 'MATLAB format, written in chunks'),
+    ('mln', ''),
+    ('ntriples', ''),
+    ('turtle', ''),
+    ('shards', 'Self-contained shards of the tensor (shards:subject:8, shards:grid:16, shards:predicate:4)'),
+)
+
+available_postprocessors = Registry()
+available_postprocessors.declare(
+    'tenc.postprocess',
+    ('log', 'Replace values v by log(1 + v)'),
+    ('idf', 'Scale columns by their smoothed inverse document frequency'),
+    ('l1', 'Scale rows to unit l1 norm'),
+    ('l2', 'Scale rows to unit l2 norm'),
+    ('tfidf', 'Tf-idf weighting (idf followed by l2)'),
+    ('degree', 'Symmetric degree normalization D^-1/2 X D^-1/2'),
+    ('colcap', 'Remove columns that occur in more than a fraction of rows (colcap:0.5)'),
+)
 
 # -- Convenience Functions --
 def entities_index(archive_path, prefix=None, fprune=None):
@@ -22,6 +104,22 @@ def predicate_attributes_index(archive_path, prefix=None):
     return __extract_index(archive_path, TZArchive.PREDICATES_FOUT + '_attr', prefix)
 
 
+def tensor_view(archive_path, max_bytes=1 << 28):
+    """
+    Lazy view on the tensor of an archive, see tenc.view.TensorView
+    """
+    from view import TensorView
+    return TensorView(archive_path, max_bytes)
+
+
+def query_client(address, timeout=None):
+    """
+    Client of a query service (10c serve), see tenc.serve.Client
+    """
+    from serve import Client
+    return Client(address, timeout)
+
+
 def __extract_index(farc, fin, prefix=None):
     import tarfile
     from _tenc import read_tensor_index, fjoin
@@ -40,13 +138,22 @@ def __prune_elements(elements, fprune):
             elements = [elements[int(i)] for i in idx]
     return elements
 
-def register_parser(name, description):
+def register_parser(name, description=None):
+    def _reg(cls):
+        available_parsers.register(name, cls, description)
+        return cls
+    return _reg
+
+
+def register_serializer(name, description=None):
     def _reg(cls):
-        available_parsers[name] = (cls, description)
+        available_serializers.register(name, cls, description)
+        return cls
     return _reg
 
 
-def register_serializer(name, description):
+def register_postprocessor(name, description=None):
     def _reg(cls):
-        available_serializers[name] = (cls, description)
+        available_postprocessors.register(name, cls, description)
+        return cls
     return _reg
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import tarfile
 import os
 import json
@@ -52,6 +52,54 @@ MAP_ORDER = enum(
 )
 
 
+# Signed integer dtypes for subscripts and counts, from narrow to wide
+INDEX_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+# Dtypes for values of serialized tensors, 'ones' stores no values at all,
+# i.e. all values are implicitly one
+VALUE_DTYPES = ['float64', 'float32', 'int8', 'bool', 'ones']
+
+# Names per write of write_tensor_index
+INDEX_BATCH = 1 << 16
+
+
+def index_dtype(n, smallest=np.int8):
+    """
+    Narrowest signed integer dtype, at least smallest, that holds n, e.g.
+    max(N, K) for the 1-based subscripts of a tensor of size N x N x K
+    """
+    for dtype in INDEX_DTYPES[INDEX_DTYPES.index(smallest):]:
+        if n <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError('No index dtype for %d' % n)
+
+
+def value_dtype(name):
+    """
+    dtype for name in VALUE_DTYPES, None for implicit ones
+    """
+    if not name in VALUE_DTYPES:
+        raise ValueError('Unknown value dtype (%s)' % name)
+    return None if name == 'ones' else np.dtype(name)
+
+
+def cast_values(vals, dtype):
+    """
+    vals as dtype. Integer dtypes (int8) only hold integral values in their
+    range, others raise ValueError instead of being truncated or wrapped.
+    bool is a threshold: every nonzero value, e.g. a confidence of 0.1, a
+    count of 5 or -1 of a negated MLN fact, becomes True.
+    """
+    if dtype.kind == 'i' and len(vals):
+        info = np.iinfo(dtype)
+        if (vals != np.floor(vals)).any():
+            raise ValueError('Values %s require integral values, use float32 or float64' % dtype.name)
+        if vals.min() < info.min or vals.max() > info.max:
+            raise ValueError('Values %s hold %d to %d, got %g to %g, use float32 or float64' % (
+                dtype.name, info.min, info.max, vals.min(), vals.max()))
+    return vals.astype(dtype)
+
+
 def serialize(fname, min_count, serfun):
     tzf = TZArchive(fname)
     tzf.serialize(min_count, serfun)
@@ -76,25 +124,38 @@ class TZArchive(object):
     MAP_SUFFIX = 'idx'
     # Suffix for archive
     ARC_SUFFIX = 'tz'
+    # Suffix for metadata
+    META_SUFFIX = 'json'
 
     # MATLAB format is whitespace delimited numbers
     # for possible compatibility, we'll stick with that
     SUBS_TEMPLATE = '%d %d %d %f\n'
 
+    # all member headers have been read, see member
+    complete = False
+
     def __init__(self, fname, mode):
         log.debug('Opening archive %s in mode %s' % (fname, mode))
         self.fname = fname
-        self.files = dict()
+        # members are added in order, small members should come first
+        self.files = OrderedDict()
+        self.remove = []
         self.arc = tarfile.open(fjoin(fname, self.ARC_SUFFIX), mode)
 
     def __del__(self):
         if self.arc is not None:
             self.arc.close()
 
-    def add(self, f, arcname):
-        """add file to archive"""
-        self.files[os.path.abspath(f.name)] = arcname
+    def add(self, f, arcname, remove=False):
+        """add file to archive, if remove is True delete it afterwards"""
         f.flush()
+        self.add_file(f.name, arcname, remove)
+
+    def add_file(self, path, arcname, remove=False):
+        """add file at path to archive, if remove is True delete it afterwards"""
+        self.files[os.path.abspath(path)] = arcname
+        if remove:
+            self.remove.append(os.path.abspath(path))
 
     def compress(self):
         from io import StringIO
@@ -107,10 +168,40 @@ class TZArchive(object):
             self.arc.add(f, arcname=aname)
         self.arc.close()
         self.arc = None
+        for f in self.remove:
+            os.remove(f)
+
+    def member(self, name):
+        """
+        File object for member name. Unlike TarFile.extractfile, headers are
+        only read up to the requested member, i.e. members at the start of
+        the archive are read without decompressing the rest of it.
+        """
+        for info in self.arc.members:
+            if info.name == name:
+                return self.arc.extractfile(info)
+        while not self.complete:
+            info = self.arc.next()
+            if info is None:
+                self.complete = True
+            elif info.name == name:
+                return self.arc.extractfile(info)
+        raise KeyError('Archive %s has no member %s' % (self.fname, name))
+
+    def metadata(self):
+        """
+        Metadata of the archive, i.e. dtypes of subscripts and values, see
+        write_metadata. It is the first member, archives without it are not
+        read any further.
+        """
+        info = self.arc.members[0] if self.arc.members else self.arc.next()
+        if info is None or info.name != fjoin(self.SUBS_FOUT, self.META_SUFFIX):
+            return {}
+        return json.load(self.arc.extractfile(info))
 
     def __get_index(self, mode, prune_idx=None):
         f = fjoin(mode, self.MAP_SUFFIX)
-        idx = read_tensor_index(self.arc.extractfile(f))
+        idx = read_tensor_index(self.member(f))
         if prune_idx:
             nidx = [None for _ in xrange(len(prune_idx))]
             for orig_idx, new_idx in prune_idx.iteritems():
@@ -165,6 +256,36 @@ def write_tensor_size(fout, entity_map, predicate_map, nnz):
         fout.write('%d\n' % c)
 
 
+def write_metadata(fout, N, K, values=None):
+    """
+    Write metadata of a tensor of size N x N x K, values is the default
+    value dtype of its serializations, see VALUE_DTYPES and cast_values
+    (int8 requires integral values, bool keeps whether values are nonzero)
+    """
+    json.dump({
+        'index_dtype': index_dtype(max(N, K)).name,
+        'values': values or 'float64',
+    }, fout)
+    fout.write('\n')
+
+
+class IdMap(dict):
+    """
+    Map of names to consecutive ids, unknown names get the next id. The
+    names are kept in id order in the list names, such that the index can be
+    written without sorting the map.
+    """
+
+    def __init__(self):
+        super(IdMap, self).__init__()
+        self.names = []
+
+    def __missing__(self, name):
+        i = self[name] = len(self.names)
+        self.names.append(name)
+        return i
+
+
 def write_tensor_index(fout, index, sort=True):
     """
     Write mapping of id -> tensor index to file
@@ -172,7 +293,8 @@ def write_tensor_index(fout, index, sort=True):
     Parameter
     ---------
       fout: file-like object
-      index: dict with key = id and value = tensor index entries
+      index: dict with key = id and value = tensor index entries, or with
+             sort=False a sequence of ids in index order (e.g. IdMap.names)
 
     File Format
     -----------
@@ -184,16 +306,31 @@ def write_tensor_index(fout, index, sort=True):
 
     """
     log.debug('Writing index map to %s' % fout.name)
-    # since we have interned strings, creating a new array "is not a
-    # problem"(tm)
     if sort:
-        sorted_names = [name for name, _ in sorted(index.iteritems(), key=lambda (k, v): v)]
+        # indexes are dense, place every name at its index
+        names = [None] * len(index)
+        for name, i in index.iteritems():
+            names[i] = name
     else:
         # we already have a sorted array
-        sorted_names = index
-    fout.write("length: %d\n" % len(sorted_names))
-    for name in sorted_names:
-        fout.write('%s\n' % name)
+        names = index
+    fout.write("length: %d\n" % len(names))
+    for i in xrange(0, len(names), INDEX_BATCH):
+        chunk = names[i:i + INDEX_BATCH]
+        if isinstance(chunk, np.ndarray):
+            chunk = chunk.tolist()
+        fout.write(''.join(['%s\n' % name for name in chunk]))
+
+
+def write_remap_index(fout, remap):
+    """
+    Write the index of pruned ids, i.e. the original id of every pruned id,
+    from a dense remap array (see remap_array)
+    """
+    keep = np.flatnonzero(remap >= 0)
+    ids = np.empty(len(keep), dtype=index_dtype(len(remap)))
+    ids[remap[keep]] = keep
+    write_tensor_index(fout, ids, sort=False)
 
 
 def read_tensor_index(fin):
@@ -206,6 +343,82 @@ def read_tensor_index(fin):
     return idx
 
 
+def select_tensor_index(fin, ids):
+    """
+    Names for the sorted ids from an index file, only reads the file up to
+    the largest id
+    """
+    fin.readline()
+    names = []
+    j = 0
+    for i, line in enumerate(fin):
+        if j == len(ids):
+            break
+        if i == ids[j]:
+            names.append(line.strip())
+            j += 1
+    return names
+
+
+def write_archive(fname, rows, entities, predicates, eattr=None, rattr=None,
+                  eattr_names=(), rattr_names=(), indexes=(), values=None):
+    """
+    Write tensor archive from arrays, the counterpart of Converter.convert
+    for tensors that are already in memory
+
+    Parameter
+    ---------
+    fname: basename of the archive
+    rows: array of shape (nnz, 4) with columns s, o, p, val as in tensor.ten
+    entities, predicates: names of entities and predicates, in id order
+    eattr, rattr: arrays of shape (n, 3) with rows (item, attribute, count)
+    eattr_names, rattr_names: names of entity and predicate attributes
+    indexes: sorted subscript indexes to add, see tenc.index
+    values: default value dtype of serializations, see write_metadata
+    """
+    import tempfile
+    from tenc.index import build_index, member_name
+
+    arc = TZArchive(fname, 'w:bz2')
+    N, K = len(entities), len(predicates)
+    s, o, p = [rows[:, i].astype(np.int) for i in xrange(3)]
+    nnz = [
+        np.bincount(s, minlength=N) + np.bincount(o, minlength=N),
+        np.bincount(p, minlength=K),
+        len(eattr) if eattr is not None else 0,
+        len(rattr) if rattr is not None else 0
+    ]
+
+    def tmp():
+        return tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', delete=False)
+
+    members = [
+        (fjoin(arc.SUBS_FOUT, arc.META_SUFFIX), lambda f: write_metadata(f, N, K, values)),
+        (fjoin(arc.SUBS_FOUT, arc.SHAPE_SUFFIX), lambda f: write_tensor_size(f, entities, predicates, nnz)),
+        (fjoin(arc.ENTITIES_FOUT, arc.MAP_SUFFIX), lambda f: write_tensor_index(f, entities, False)),
+        (fjoin(arc.PREDICATES_FOUT, arc.MAP_SUFFIX), lambda f: write_tensor_index(f, predicates, False)),
+        (fjoin(arc.ENTITIES_FOUT + '_attr', arc.MAP_SUFFIX), lambda f: write_tensor_index(f, eattr_names, False)),
+        (fjoin(arc.PREDICATES_FOUT + '_attr', arc.MAP_SUFFIX), lambda f: write_tensor_index(f, rattr_names, False)),
+    ]
+    for name, attr in [(arc.ENTITIES_FOUT, eattr), (arc.PREDICATES_FOUT, rattr)]:
+        if attr is None:
+            attr = np.zeros((0, 3))
+        members.append((fjoin(name, arc.ATTR_SUFFIX), lambda f, attr=attr: np.savetxt(f, attr, fmt='%d %d %d')))
+    members.append((fjoin(arc.SUBS_FOUT, arc.SUBS_SUFFIX), lambda f: np.savetxt(f, rows, fmt='%d %d %d %f')))
+
+    for arcname, write in members:
+        f = tmp()
+        write(f)
+        f.close()
+        arc.add_file(f.name, arcname, remove=True)
+
+    for name in indexes:
+        size = K if name == 'predicate' else N
+        for part, path in build_index(lambda: [rows], name, size).iteritems():
+            arc.add_file(path, member_name(name, part), remove=True)
+    arc.compress()
+
+
 def read_tensor_size(fin):
     """
     Read size of tensor, for format see write_tensor_index
@@ -213,17 +426,19 @@ def read_tensor_size(fin):
     log.debug('Reading tensor size')
     N = int(fin.readline().strip())
     K = int(fin.readline().strip())
-    nnz = [np.zeros(N, dtype=np.int), np.zeros(K, dtype=np.int), 0, 0]
-    # read attribute nnz
-    for n in xrange(N):
-        nnz[MAP_ORDER.ENTITY][n] = int(fin.readline().strip())
-    # read predicate nnz
-    for k in xrange(K):
-        nnz[MAP_ORDER.PREDICATE][k] = int(fin.readline().strip())
-    # read number eattr
-    nnz[MAP_ORDER.EATTR] = int(fin.readline().strip())
-    # read number rattr
-    nnz[MAP_ORDER.RATTR] = int(fin.readline().strip())
+    counts = [b.ravel() for b in read_blocks(fin, 1)]
+    counts = np.concatenate(counts) if counts else np.zeros(0)
+    counts = counts.astype(index_dtype(counts.max() if len(counts) else 0, np.int32))
+    if len(counts) != N + K + 2:
+        raise ValueError('Tensor size has %d counts, expected %d' % (len(counts), N + K + 2))
+    nnz = [
+        # number of occurrences of entities and predicates
+        counts[:N],
+        counts[N:N + K],
+        # number of entity and predicate attributes
+        int(counts[N + K]),
+        int(counts[N + K + 1])
+    ]
     log.debug('  tensor has size N: %d, K: %d, nnz: %d, eattr %d, rattr %d' % (
         N, K,
         nnz[MAP_ORDER.PREDICATE].sum(),
@@ -247,6 +462,37 @@ def prune(min_count, nnz, SZ, name='object'):
     return pidx
 
 
+def remap_array(pidx, SZ):
+    """
+    Dense array that maps original ids to pruned ids, -1 for pruned ids
+    """
+    remap = np.empty(SZ, dtype=index_dtype(SZ))
+    remap.fill(-1)
+    if len(pidx) > 0:
+        keys = np.fromiter(pidx.iterkeys(), dtype=np.int, count=len(pidx))
+        remap[keys] = np.fromiter(pidx.itervalues(), dtype=remap.dtype, count=len(pidx))
+    return remap
+
+
+def read_blocks(fin, ncols, size=1 << 22):
+    """
+    Parse whitespace delimited numbers from fin in blocks of roughly size
+    bytes. Yields arrays of shape (n, ncols) that hold complete lines.
+    """
+    tail = ''
+    while True:
+        buf = fin.read(size)
+        if not buf:
+            break
+        buf = tail + buf
+        cut = buf.rfind('\n') + 1
+        tail = buf[cut:]
+        if cut > 0:
+            yield np.fromstring(buf[:cut], dtype=np.double, sep=' ').reshape(-1, ncols)
+    if tail.strip():
+        yield np.fromstring(tail, dtype=np.double, sep=' ').reshape(-1, ncols)
+
+
 # code from
 # http://stackoverflow.com/questions/845058/how-to-get-line-count-cheaply-in-python
 def linecount(filename):
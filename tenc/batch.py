@@ -0,0 +1,355 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Conversion jobs and the batch runner for jobs declared in tenc.cfg:
+
+  [jobs]
+    [[dblp]]
+    file = dblp-1.tsv, dblp-2.tsv
+    parser = tab-delimited
+    serializer = matlab, ntriples
+    min_count_ent = 5
+    max_memory = 8G
+    max_cpu = 7200
+    external_budget = 4G
+      [[[attributes]]]
+      HasWordTitle = has_word
+
+Jobs take the same options as the [tenc] section and default to its values,
+attributes and postprocessing default to the global [attributes] and
+[postprocess] sections. Every job runs in a process of its own, and jobs
+are skipped if their config and inputs did not change since their last
+successful run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import traceback
+from multiprocessing import Process, Queue
+from Queue import Empty
+
+from tenc import available_parsers, available_serializers, available_postprocessors
+from tenc._tenc import VALUE_DTYPES, fjoin
+from tenc.index import INDEXES
+from tenc.reorder import ORDERINGS
+
+log = logging.getLogger('tenc.batch')
+
+CONFIG = 'tenc.cfg'
+STATE = '.tenc-batch.json'
+
+# options of a job, same as the options of 10c
+JOB_DEFAULTS = {
+    'file': [],
+    'parser': 'ntriples',
+    'serializer': ['matlab'],
+    'prefix': None,
+    'min_count_ent': 1,
+    'min_count_pred': 1,
+    'indexes': [],
+    'processes': 1,
+    # number of processes that extract entity attributes
+    'attr_processes': 1,
+    'do_convert': True,
+    'attributes': {},
+    'postprocess': {},
+    # dtype of serialized values, see tenc._tenc.VALUE_DTYPES, defaults to
+    # the one of the archive
+    'values': None,
+    # ordering of entity ids, see tenc.reorder
+    'reorder': None,
+    # limit of the address space of jobs in bytes (or with suffix K, M, G)
+    'max_memory': None,
+    # memory budget of the vocabulary in bytes (or with suffix K, M, G),
+    # converts with external id assignment, see tenc.external
+    'external_budget': None,
+    # size of the count-min sketch for prefiltering, e.g. 64M
+    'prefilter': None,
+    # read, parse and write in pipeline stages, see tenc.pipeline
+    'pipeline': False,
+    # serialize from the uncompressed members of the conversion, the
+    # archive is only written with keep_archive
+    'direct': False,
+    'keep_archive': False,
+    # limit of the CPU time of batch jobs in seconds
+    'max_cpu': None,
+}
+
+LIST_KEYS = ['file', 'serializer', 'indexes']
+INT_KEYS = ['min_count_ent', 'min_count_pred', 'processes', 'attr_processes', 'max_cpu']
+BOOL_KEYS = ['do_convert', 'pipeline', 'direct', 'keep_archive']
+
+
+def read_config(fname=CONFIG):
+    from configobj import ConfigObj
+    if not os.path.exists(fname):
+        return {}
+    return ConfigObj(fname)
+
+
+def as_list(value):
+    if isinstance(value, basestring):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return list(value)
+
+
+def as_bool(value):
+    if isinstance(value, basestring):
+        return value.lower() in ['1', 'true', 'yes', 'on']
+    return bool(value)
+
+
+def as_dict(section):
+    """
+    Plain dict of a config section, lists of comma separated values are
+    joined again
+    """
+    return dict((k, v if isinstance(v, basestring) else ','.join(v)) for k, v in section.iteritems())
+
+
+def make_job(options, conf={}):
+    """
+    Job from options, missing attributes and postprocessing are taken from
+    the global sections of config conf
+    """
+    job = dict(JOB_DEFAULTS)
+    job['attributes'] = dict(conf.get('attributes', {}))
+    job['postprocess'] = as_dict(conf.get('postprocess', {}))
+    for key, value in options.iteritems():
+        if key == 'attributes':
+            job[key].update(value)
+        elif key == 'postprocess':
+            job[key].update(as_dict(value))
+        elif key.startswith('pp_'):
+            if value is not None:
+                job['postprocess'][key[3:]] = value
+        elif key in LIST_KEYS:
+            job[key] = as_list(value)
+        elif key in INT_KEYS:
+            job[key] = int(value)
+        elif key in BOOL_KEYS:
+            job[key] = as_bool(value)
+        elif key in JOB_DEFAULTS:
+            job[key] = value
+    return job
+
+
+def jobs_from_config(conf):
+    """
+    Jobs of the [jobs] section, options default to the [tenc] section and
+    the prefix of a job to its name
+    """
+    jobs = []
+    for name, section in conf.get('jobs', {}).iteritems():
+        options = dict(conf.get('tenc', {}))
+        options['prefix'] = name
+        options.update(section)
+        jobs.append((name, make_job(options, conf)))
+    return jobs
+
+
+def check_job(job):
+    """
+    Raise ValueError for unknown parsers, serializers, postprocessors or
+    indexes of job
+    """
+    if not job['parser'] in available_parsers:
+        raise ValueError('Unknown parser (%s)' % job['parser'])
+    for spec in job['serializer']:
+        name, _, arg = spec.partition(':')
+        if not name in available_serializers:
+            raise ValueError('Unknown serializer (%s)' % name)
+        if arg:
+            available_serializers[name][0].parse_arg(arg)
+    for spec in job['postprocess'].itervalues():
+        for name in as_list(spec):
+            if not name.split(':')[0] in available_postprocessors:
+                raise ValueError('Unknown postprocessor (%s)' % name)
+    for name in job['indexes']:
+        if not name in INDEXES:
+            raise ValueError('Unknown index (%s)' % name)
+    if job['reorder'] is not None and not job['reorder'] in ORDERINGS:
+        raise ValueError('Unknown ordering (%s)' % job['reorder'])
+    if job['values'] is not None and not job['values'] in VALUE_DTYPES:
+        raise ValueError('Unknown value dtype (%s)' % job['values'])
+    if job['direct'] and not job['do_convert']:
+        raise ValueError('Direct serialization requires conversion')
+    if job['prefilter'] is not None and (not job['file'] or '' in job['file']):
+        raise ValueError('Prefiltering reads the input twice and requires input files, not stdin')
+
+
+def parse_bytes(value):
+    value = str(value).strip().upper()
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def set_limits(job):
+    """
+    Limit memory and CPU time of the current process
+    """
+    import resource
+    if job['max_memory'] is not None:
+        limit = parse_bytes(job['max_memory'])
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if job['max_cpu'] is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (job['max_cpu'], job['max_cpu']))
+
+
+def run_job(job):
+    """
+    Convert the input files of job and serialize the archive
+    """
+    check_job(job)
+    p = None
+    if job['do_convert']:
+        parser_cls = available_parsers[job['parser']][0]
+        budget = None if job['external_budget'] is None else parse_bytes(job['external_budget'])
+        prefilter = None
+        if job['prefilter'] is not None:
+            prefilter = (job['min_count_ent'], job['min_count_pred'], parse_bytes(job['prefilter']))
+        p = parser_cls(job['prefix'], job['attributes'], job['indexes'], budget, prefilter,
+                       pipelined=job['pipeline'], values=job['values'], attr_processes=job['attr_processes'])
+        p.convert(job['file'], compress=not job['direct'])
+
+    min_count = (job['min_count_ent'], job['min_count_pred'])
+    try:
+        sers = []
+        for spec in job['serializer']:
+            name, _, arg = spec.partition(':')
+            ser = available_serializers[name][0](
+                job['prefix'], job['attributes'], postprocess=job['postprocess'], processes=job['processes'],
+                order=job['reorder'], values=job['values']
+            )
+            ser.configure(arg)
+            if job['direct']:
+                ser.read_from(p)
+            sers.append(ser)
+        if len(sers) == 1:
+            sers[0].serialize(min_count)
+        else:
+            # read archive once and feed all serializers
+            from tenc.serializer import fanout
+            fanout(sers, min_count)
+    except BaseException:
+        # no truncated archive and no uncompressed members are left behind
+        if job['direct']:
+            p.discard()
+        raise
+
+    if job['direct']:
+        if job['keep_archive']:
+            p.compress()
+        else:
+            p.discard()
+
+
+def job_hash(job):
+    """
+    Hash of the config of job and of size and modification time of its inputs
+    """
+    h = hashlib.sha1(json.dumps(job, sort_keys=True))
+    for fname in job['file']:
+        st = os.stat(fname)
+        h.update('%s %d %d' % (fname, st.st_size, st.st_mtime))
+    return h.hexdigest()
+
+
+def _run(name, job, results):
+    # runs in a process of its own, see run_batch
+    try:
+        set_limits(job)
+        run_job(job)
+        results.put((name, None))
+    except BaseException:
+        results.put((name, traceback.format_exc()))
+
+
+def run_batch(conf, processes=1, names=None, force=False, state_file=STATE):
+    """
+    Run jobs of config conf, at most processes jobs at once
+
+    Parameter
+    ---------
+    conf: config with [jobs] section, see read_config
+    processes: number of jobs that run concurrently
+    names: names of jobs to run, all jobs if None
+    force: run jobs even if config and inputs did not change
+
+    Returns dict job name -> traceback of failed jobs
+    """
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file) as fin:
+            state = json.load(fin)
+
+    todo = []
+    for name, job in jobs_from_config(conf):
+        if names and not name in names:
+            continue
+        check_job(job)
+        h = job_hash(job)
+        if not force and state.get(name) == h and os.path.exists(fjoin(job['prefix'], 'tz')):
+            log.info('Skipping job %s, config and inputs are unchanged' % name)
+            continue
+        todo.append((name, job, h))
+
+    def finished(name, error):
+        p = running.pop(name)
+        p.join()
+        if error is None:
+            log.info('Finished job %s' % name)
+            state[name] = hashes[name]
+        else:
+            log.error('Job %s failed:\n%s' % (name, error))
+            failed[name] = error
+
+    # a new process for every job, such that limits apply per job. Unlike
+    # workers of a pool, these are not daemonic, i.e. jobs can start
+    # processes of their own (processes, attr_processes).
+    failed = {}
+    hashes = dict((name, h) for name, _, h in todo)
+    results = Queue()
+    running = {}
+    while todo or running:
+        while todo and len(running) < max(processes, 1):
+            name, job, _ = todo.pop(0)
+            running[name] = Process(target=_run, args=(name, job, results), name='tenc-job-%s' % name)
+            running[name].start()
+        try:
+            finished(*results.get(timeout=1))
+        except Empty:
+            # processes that died without a result, e.g. killed at their
+            # limits. Processes put their result before they exit.
+            dead = [name for name, p in running.iteritems() if p.exitcode is not None]
+            while True:
+                try:
+                    name, error = results.get_nowait()
+                except Empty:
+                    break
+                finished(name, error)
+            for name in dead:
+                if name in running:
+                    finished(name, 'Job process exited with code %d' % running[name].exitcode)
+
+    with open(state_file, 'w') as fout:
+        json.dump(state, fout, indent=2, sort_keys=True)
+    return failed
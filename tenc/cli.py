@@ -21,8 +21,8 @@ import sys
 import os
 from optparse import OptionParser
 from configobj import ConfigObj
-from tenc import parser, serializer
-from tenc import available_parsers, available_serializers
+from tenc import batch
+from tenc import available_parsers, available_serializers, available_postprocessors
 
 # setup logging
 log = logging.getLogger('10c')
@@ -41,7 +41,7 @@ def err(txt):
 
 
 def print_registry(reg):
-    for name, dat in reg.iteritems():
+    for name in reg.names():
         print "  " + name
 
 
@@ -49,7 +49,224 @@ def check_file_exists(*files):
     return all([os.path.exists(f.replace('file://', '')) for f in files])
 
 
+def archive_options(usage):
+    """
+    Option parser with the options of commands that work on a converted archive
+    """
+    opt = OptionParser(usage=usage)
+    opt.add_option('-p', '--prefix', dest='prefix', default=None,
+                   help='Prefix of the archive')
+    opt.add_option('--min-count-pred', dest='min_count_pred', default=1, type='int',
+                   help='Minimal number of entries in predicate to avoid pruning (default: 1)')
+    opt.add_option('--min-count-ent', dest='min_count_ent', default=1, type='int',
+                   help='Minimal number of entries for an entity to avoid pruning (default: 1)')
+    return opt
+
+
+def split(argv):
+    opt = archive_options('%prog split [options]')
+    opt.add_option('-m', '--mode', dest='mode', default='random',
+                   help='How to split: random, stratified (per predicate) or entity (entity-disjoint)')
+    opt.add_option('--fractions', dest='fractions', default='0.8,0.1,0.1',
+                   help='Fractions of train, validation and test triples (default: 0.8,0.1,0.1)')
+    opt.add_option('--seed', dest='seed', default=0, type='int',
+                   help='Seed of the random number generator')
+    opt.add_option('--negatives', dest='negatives', default=0, type='int',
+                   help='Number of filtered negative triples per training triple')
+    (options, args) = opt.parse_args(argv)
+
+    from tenc.sampling import split_archive, SPLIT_MODES
+    if not options.mode in SPLIT_MODES:
+        err('Unknown split mode (%s)' % options.mode)
+    split_archive(
+        options.prefix,
+        (options.min_count_ent, options.min_count_pred),
+        [float(f) for f in options.fractions.split(',')],
+        options.mode, options.seed, options.negatives
+    )
+
+
+def subgraph(argv):
+    opt = OptionParser(usage='%prog subgraph [options] -p PREFIX -O OUT')
+    opt.add_option('-p', '--prefix', dest='prefix', default=None,
+                   help='Prefix of the archive, needs subject and object indexes')
+    opt.add_option('-O', '--out', dest='out', default=None,
+                   help='Prefix of the archive for the subgraph')
+    opt.add_option('-s', '--seeds', dest='seeds', default=None,
+                   help='File with names of seed entities, one per line')
+    opt.add_option('--seed-ids', dest='seed_ids', default=None,
+                   help='Ids of seed entities, separated by commas')
+    opt.add_option('-k', '--hops', dest='hops', default=1, type='int',
+                   help='Size of the neighborhood in hops (default: 1)')
+    opt.add_option('--cache-dir', dest='cache_dir', default=None,
+                   help='Directory for memory-mapped copies of the indexes, reused by later runs '
+                        '(default: temporary directory)')
+    opt.add_option('--index', dest='indexes', default='',
+                   help='Sorted subscript indexes for the new archive, separated by commas')
+    opt.add_option('--no-attributes', dest='attributes', default=True, action='store_false',
+                   help='Do not copy attributes')
+    (options, args) = opt.parse_args(argv)
+
+    from tenc.subgraph import extract
+    if options.out is None:
+        err('No output archive given (-O)')
+    seeds = []
+    if options.seeds is not None:
+        with open(options.seeds) as fin:
+            seeds += [line.strip() for line in fin if line.strip()]
+    if options.seed_ids is not None:
+        seeds += [int(i) for i in options.seed_ids.split(',')]
+    if len(seeds) == 0:
+        err('No seed entities given')
+    extract(options.prefix, seeds, options.hops, options.out, options.cache_dir,
+            [i for i in options.indexes.split(',') if i], options.attributes)
+
+
+def index(argv):
+    opt = OptionParser(usage='%prog index [options] -p PREFIX --index subject,object')
+    opt.add_option('-p', '--prefix', dest='prefix', default=None,
+                   help='Prefix of the archive')
+    opt.add_option('--index', dest='indexes', default='predicate,subject,object',
+                   help='Sorted subscript indexes to add, separated by commas')
+    (options, args) = opt.parse_args(argv)
+
+    from tenc.index import INDEXES, add_indexes
+    indexes = [i for i in options.indexes.split(',') if i]
+    for name in indexes:
+        if not name in INDEXES:
+            err('Unknown index (%s)' % name)
+    add_indexes(options.prefix, indexes)
+
+
+def diff_options(usage):
+    opt = OptionParser(usage=usage)
+    opt.add_option('-O', '--out', dest='out', default=None,
+                   help='Prefix of the output files')
+    opt.add_option('--run-rows', dest='run_rows', default=None, type='int',
+                   help='Number of triples that are sorted in memory at once')
+    return opt
+
+
+def diff(argv):
+    opt = diff_options('%prog diff [options] OLD NEW')
+    (options, args) = opt.parse_args(argv)
+    if len(args) != 2:
+        err('diff takes two archives')
+    if not check_file_exists(*['%s.tz' % a for a in args]):
+        err('Archive does not exist (%s)' % ', '.join(args))
+
+    from tenc.diff import diff, RUN_ROWS
+    counts = diff(args[0], args[1], options.out or 'diff', options.run_rows or RUN_ROWS)
+    print 'added: %(added)d, removed: %(removed)d, changed: %(changed)d, unchanged: %(unchanged)d' % counts
+
+
+def merge(argv):
+    opt = diff_options('%prog merge [options] -O OUT FIRST SECOND')
+    (options, args) = opt.parse_args(argv)
+    if len(args) != 2:
+        err('merge takes two archives')
+    if options.out is None:
+        err('No output archive given (-O)')
+    if not check_file_exists(*['%s.tz' % a for a in args]):
+        err('Archive does not exist (%s)' % ', '.join(args))
+
+    from tenc.diff import merge, RUN_ROWS
+    merge(args[0], args[1], options.out, options.run_rows or RUN_ROWS)
+
+
+def stats(argv):
+    opt = OptionParser(usage='%prog stats [options] -p PREFIX')
+    opt.add_option('-p', '--prefix', dest='prefix', default=None,
+                   help='Prefix of the archive')
+    opt.add_option('-t', '--thresholds', dest='thresholds', default=None,
+                   help='Pruning thresholds for the what-if tables, separated by commas')
+    opt.add_option('--exact', dest='exact', default=False, action='store_true',
+                   help='Count surviving triples for each pair of thresholds (reads tensor.ten)')
+    opt.add_option('--json', dest='json', default=False, action='store_true',
+                   help='Print statistics as JSON')
+    (options, args) = opt.parse_args(argv)
+
+    from tenc.stats import archive_stats, format_stats, DEFAULT_THRESHOLDS
+    thresholds = DEFAULT_THRESHOLDS
+    if options.thresholds is not None:
+        thresholds = sorted(int(t) for t in options.thresholds.split(','))
+    s = archive_stats(options.prefix, thresholds, options.exact)
+    if options.json:
+        import json
+        print json.dumps(s, indent=2)
+    else:
+        print format_stats(s)
+
+
+def serve(argv):
+    opt = OptionParser(usage='%prog serve [options] -p PREFIX (--socket PATH | --http [HOST:]PORT)')
+    opt.add_option('-p', '--prefix', dest='prefix', default=None,
+                   help='Prefix of the archive, indexes (10c index) are used if it has them, '
+                        'subject and object indexes are built in memory otherwise')
+    opt.add_option('--socket', dest='socket', default=None,
+                   help='Path of the Unix socket to listen on')
+    opt.add_option('--http', dest='http', default=None,
+                   help='Port on localhost to listen on for HTTP requests')
+    opt.add_option('--cache-dir', dest='cache_dir', default=None,
+                   help='Directory for memory-mapped copies of the indexes (default: temporary directory)')
+    opt.add_option('--cache-bytes', dest='cache_bytes', default='64M',
+                   help='Size of the result cache (default: 64M)')
+    (options, args) = opt.parse_args(argv)
+
+    if options.prefix is None or not check_file_exists('%s.tz' % options.prefix):
+        err('Archive does not exist (%s)' % options.prefix)
+    if (options.socket is None) == (options.http is None):
+        err('Give either --socket or --http')
+    from tenc.serve import serve
+    try:
+        serve(options.prefix, options.socket or options.http, options.cache_dir,
+              batch.parse_bytes(options.cache_bytes))
+    except ValueError as e:
+        err(str(e))
+
+
+def run_batch(argv):
+    opt = OptionParser(usage='%prog batch [options] [job ...]')
+    opt.add_option('-c', '--config', dest='config', default=batch.CONFIG,
+                   help='Config file with a [jobs] section (default: tenc.cfg)')
+    opt.add_option('-j', '--jobs', dest='jobs', default=1, type='int',
+                   help='Number of jobs to run concurrently')
+    opt.add_option('--force', dest='force', default=False, action='store_true',
+                   help='Run jobs even if their config and inputs are unchanged')
+    (options, args) = opt.parse_args(argv)
+
+    conf = batch.read_config(options.config)
+    if not conf.get('jobs'):
+        err('No jobs in config file (%s)' % options.config)
+    names = [name for name, _ in batch.jobs_from_config(conf)]
+    for name in args:
+        if not name in names:
+            err('Unknown job (%s)' % name)
+    try:
+        failed = batch.run_batch(conf, options.jobs, args or None, options.force)
+    except ValueError as e:
+        err(str(e))
+    if failed:
+        err('Failed jobs: %s' % ', '.join(sorted(failed)))
+
+
+# commands, called as 10c <command>
+commands = {
+    'batch': run_batch,
+    'diff': diff,
+    'merge': merge,
+    'serve': serve,
+    'stats': stats,
+    'split': split,
+    'subgraph': subgraph,
+    'index': index,
+}
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        return commands[sys.argv[1]](sys.argv[2:])
+
     # create option parser
     opt = OptionParser()
     opt.add_option('-f', '--file', dest='file', default=None,
@@ -57,7 +274,8 @@ def main():
     opt.add_option('-i', '--input-format', dest='parser', default='ntriples',
                    help='Which parser to use (use option -l to list available parsers)')
     opt.add_option('-o', '--output-format', dest='serializer', default='matlab',
-                   help='Which serializer to use (use option -l to list available serializers)')
+                   help='Which serializers to use, separated by commas, with options after a colon, e.g. shards:grid:16 '
+                        '(use option -l to list available serializers)')
     opt.add_option('-l', '--list-parsers', dest='list', default=False, action='store_true',
                    help='List available parsers and serializers')
     opt.add_option('-p', '--prefix', dest='prefix', default=None,
@@ -70,24 +288,63 @@ def main():
                    help='Do not convert raw data into tz file, but work from precomputed one')
     opt.add_option('-v', '--verbose', dest='quiet', default=True, action='store_false',
                    help='Verbose output messages')
+    opt.add_option('--postprocess-tensor', dest='pp_tensor', default=None,
+                   help='Postprocessors for tensor slices, separated by commas (default: none)')
+    opt.add_option('--postprocess-eattr', dest='pp_eattr', default=None,
+                   help='Postprocessors for entity attributes, separated by commas (default: tfidf)')
+    opt.add_option('--postprocess-rattr', dest='pp_rattr', default=None,
+                   help='Postprocessors for predicate attributes, separated by commas (default: tfidf)')
+    opt.add_option('-j', '--processes', dest='processes', default=1, type='int',
+                   help='Number of processes for postprocessing tensor slices')
+    opt.add_option('--attr-processes', dest='attr_processes', default=1, type='int',
+                   help='Number of processes that extract entity attributes during conversion')
+    opt.add_option('--index', dest='indexes', default='',
+                   help='Sorted subscript indexes to add to the archive, separated by commas (predicate, subject, object)')
+    opt.add_option('--max-memory', dest='max_memory', default=None,
+                   help='Limit of the address space, e.g. 8G')
+    opt.add_option('--external-budget', dest='external_budget', default=None,
+                   help='Memory budget for the vocabulary, e.g. 4G. Assigns ids with an external sort of name hashes')
+    opt.add_option('--prefilter', dest='prefilter', default=None,
+                   help='Size of a count-min sketch, e.g. 64M. Skips triples of certainly pruned entities during conversion')
+    opt.add_option('--pipeline', dest='pipeline', default=False, action='store_true',
+                   help='Read, parse and write input in concurrent stages (tab-delimited, reverb, mln)')
+    opt.add_option('--direct', dest='direct', default=False, action='store_true',
+                   help='Serialize directly from the conversion without writing the archive')
+    opt.add_option('--keep-archive', dest='keep_archive', default=False, action='store_true',
+                   help='Write the archive after serializing with --direct')
+    opt.add_option('--values', dest='values', default=None,
+                   help='Dtype of serialized values: float64, float32, int8 (integral values only), '
+                        'bool (whether values are nonzero) or ones (no values) (default: float64)')
+    opt.add_option('--reorder', dest='reorder', default=None,
+                   help='Reorder entity ids for locality: degree, rcm or attribute')
     opt.add_option('--init', dest='do_init', default=False, action='store_true',
                    help='Create initial config file')
 
     # if config file exists read its content and set as defaults for optparse
-    #if os.path.exists('tenc.cfg'):
-    #    conf = ConfigObj('tenc.cfg')
-    #    opt.set_defaults(**conf['tenc'])
+    conf = batch.read_config()
+    defaults = {}
+    for key, value in conf.get('tenc', {}).iteritems():
+        if key in batch.BOOL_KEYS or key == 'quiet':
+            value = batch.as_bool(value)
+        elif key in ['serializer', 'indexes'] and not isinstance(value, basestring):
+            value = ','.join(value)
+        elif key in ['processes', 'attr_processes']:
+            value = int(value)
+        defaults[key] = value
+    opt.set_defaults(**defaults)
 
     # parse cli options
     (options, args) = opt.parse_args()
 
     if options.do_init is True:
-        print 'HERE'
         c = ConfigObj()
-        c.filename = 'tenc.cfg'
-        options.do_init = False
-        c['tenc'] = vars(options)
+        c.filename = batch.CONFIG
+        c['tenc'] = dict((k, v) for k, v in vars(options).iteritems()
+                         if v is not None and not k in ['do_init', 'list'])
+        c['attributes'] = conf.get('attributes', {})
+        c['postprocess'] = conf.get('postprocess', {'eattr': 'tfidf', 'rattr': 'tfidf'})
         c.write()
+        log.info('Wrote config to %s' % c.filename)
         sys.exit()
 
     # if list option exists list available parsers and exit
@@ -97,20 +354,11 @@ def main():
         print
         print "Available serializer:"
         print_registry(available_serializers)
+        print
+        print "Available postprocessors:"
+        print_registry(available_postprocessors)
         sys.exit()
 
-    # handle unknown parsers
-    if not options.parser in available_parsers:
-        err('Unknown parser (%s)' % options.parser)
-    else:
-        parser_cls = available_parsers[options.parser][0]
-
-    # handle unknown serializer
-    if not options.serializer in available_serializers:
-        err('Unknown serializer (%s)' % options.serializer)
-    else:
-        ser_cls = available_serializers[options.serializer][0]
-
     if not options.quiet:
         logging.basicConfig(level=logging.DEBUG)
 
@@ -126,12 +374,14 @@ def main():
         fin = options.file
         log.info('Reading data from %s' % fin)
 
-    if options.do_convert:
-        attributes = {}
-        p = parser_cls(options.prefix, attributes)
-        p.convert(options.file)
-
-    s = ser_cls(options.prefix)
-    s.serialize(
-        (int(options.min_count_ent), int(options.min_count_pred)),
-    )
+    # attributes and postprocessing from tenc.cfg, command line options
+    # take precedence
+    job = dict((k, v) for k, v in vars(options).iteritems() if k in batch.JOB_DEFAULTS or k.startswith('pp_'))
+    job['file'] = fin
+    job = batch.make_job(job, conf)
+    try:
+        batch.check_job(job)
+    except ValueError as e:
+        err(str(e))
+    batch.set_limits(job)
+    batch.run_job(job)
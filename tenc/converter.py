@@ -26,16 +26,23 @@ ATTR_AGGREGATION = 10
 
 log = logging.getLogger('tenc.converter')
 
-# Check if NLTK is present
-try:
-    import nltk
-    from nltk.corpus import wordnet as wn
-    _STOPWORDS = set(nltk.corpus.stopwords.words())
-    _STOPWORDS = _STOPWORDS.union(['http', 'www'])
-    USE_NLTK = True
-except ImportError:
-    log.warn('Could not import NLTK, switching to fallback')
-    USE_NLTK = False
+# NLTK and its stopwords are loaded on first use, see _nltk
+_NLTK = {}
+
+
+def _nltk():
+    """
+    Returns the nltk module or None if NLTK is not present
+    """
+    if not _NLTK:
+        try:
+            import nltk
+            _NLTK['nltk'] = nltk
+            _NLTK['stopwords'] = set(nltk.corpus.stopwords.words()).union(['http', 'www'])
+        except ImportError:
+            log.warn('Could not import NLTK, switching to fallback')
+            _NLTK['nltk'] = None
+    return _NLTK['nltk']
 
 
 def has_word(prop, value):
@@ -56,10 +63,12 @@ def has_word(prop, value):
     """
     prop = str(unicode(prop, errors="replace"))
     value = str(unicode(value, errors="replace"))
-    if USE_NLTK:
+    nltk = _nltk()
+    if nltk is not None:
         tok = nltk.tokenize.WordPunctTokenizer()
         tokens = tok.tokenize(value)
-        tokens = [t for t in tokens if t not in _STOPWORDS and re.match(r'\w+', t) is not None]
+        stopwords = _NLTK['stopwords']
+        tokens = [t for t in tokens if t not in stopwords and re.match(r'\w+', t) is not None]
         stemmer = nltk.stem.porter.PorterStemmer()
         for t in tokens:
             yield (ATTR_WORD, prop, stemmer.stem(t).upper())
@@ -96,6 +105,8 @@ def has_id(prop, value):
 
 
 def synset(prop, value, pos=None):
+    nltk = _nltk()
+    from nltk.corpus import wordnet as wn
     hyps = set()
     tok = nltk.tokenize.WordPunctTokenizer()
     tokens = tok.tokenize(value)
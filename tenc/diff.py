@@ -0,0 +1,381 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Differences and unions of two archives with their own id numbering.
+
+The index members of both archives are aligned to a common numbering,
+where the ids of the first archive are kept and names that only occur in
+the second archive are appended. Subscripts of the second archive are
+remapped with lookup arrays. Both sides are then sorted in runs of bounded
+size on disk and compared or merged in a single pass over the merged runs.
+Triples are identified by (s, o, p). Archives of multigraphs may contain
+a triple several times, such triples are compared as multisets: occurrences
+with equal values are paired first, the remaining ones are paired in order
+of their values and reported as changed, extra occurrences as added or
+removed. A merge keeps the larger number of occurrences. On conflicts the
+value of the second archive wins.
+
+Only the rows are sorted externally. The indexes are aligned in memory
+with a dict of the names of the first archive, see align.
+"""
+
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+from itertools import groupby
+import numpy as np
+
+from tenc._tenc import TZArchive, fjoin, read_blocks, read_tensor_index, write_metadata, write_tensor_index
+from tenc.index import INDEXES, PARTS, build_index, member_name
+
+log = logging.getLogger('tenc.diff')
+
+# number of rows of a sorted run
+RUN_ROWS = 1 << 21
+
+
+def align(a, b):
+    """
+    Common numbering of names a and b. Returns the names in the common
+    numbering and an array that maps ids of b to common ids, ids of a are
+    unchanged. The names of a are held in a dict, so memory grows with the
+    size of the indexes even though the rows are sorted on disk.
+    """
+    ids = dict((name, i) for i, name in enumerate(a))
+    names = list(a)
+    remap = np.empty(len(b), dtype=np.int)
+    for j, name in enumerate(b):
+        i = ids.get(name)
+        if i is None:
+            i = len(names)
+            names.append(name)
+        remap[j] = i
+    return names, remap
+
+
+def sorted_runs(blocks, dirname, max_rows=RUN_ROWS):
+    """
+    Write rows of blocks to files of at most max_rows rows that are sorted
+    by all columns, such that rows with equal keys are ordered by value.
+    Returns paths and number of columns.
+    """
+    runs, buf, n, ncols = [], [], 0, None
+
+    def spill():
+        rows = np.concatenate(buf)
+        rows = rows[np.lexsort(rows.T[::-1])]
+        fd, path = tempfile.mkstemp(prefix='tenc-run-', dir=dirname)
+        with os.fdopen(fd, 'wb') as fout:
+            rows.astype(np.double).tofile(fout)
+        runs.append(path)
+
+    for block in blocks:
+        ncols = block.shape[1]
+        buf.append(block)
+        n += len(block)
+        if n >= max_rows:
+            spill()
+            buf, n = [], 0
+    if buf:
+        spill()
+    return runs, ncols
+
+
+def _read_run(path, ncols, size=1 << 16):
+    with open(path, 'rb') as fin:
+        while True:
+            rows = np.fromfile(fin, dtype=np.double, count=size * ncols)
+            if len(rows) == 0:
+                break
+            for row in rows.reshape(-1, ncols).tolist():
+                yield tuple(row)
+
+
+def merge_runs(runs, ncols):
+    """
+    Rows of sorted runs in sorted order, rows with equal keys are kept
+    """
+    return heapq.merge(*[_read_run(path, ncols) for path in runs])
+
+
+def _groups(rows, nkeys):
+    # (key, sorted values) of rows that are sorted by all columns
+    for key, group in groupby(rows, lambda row: row[:nkeys]):
+        yield key, [row[nkeys] for row in group]
+
+
+def pair_values(va, vb):
+    """
+    Pairs (value of a, value of b) of the sorted values va and vb of a key.
+    Equal values are paired first, the remaining ones in order, values
+    without a partner are paired with None.
+    """
+    equal, ra, rb = [], [], []
+    i = j = 0
+    while i < len(va) and j < len(vb):
+        if va[i] == vb[j]:
+            equal.append(va[i])
+            i, j = i + 1, j + 1
+        elif va[i] < vb[j]:
+            ra.append(va[i])
+            i += 1
+        else:
+            rb.append(vb[j])
+            j += 1
+    ra.extend(va[i:])
+    rb.extend(vb[j:])
+    n = min(len(ra), len(rb))
+    return ([(v, v) for v in equal] + zip(ra[:n], rb[:n]) +
+            [(v, None) for v in ra[n:]] + [(None, v) for v in rb[n:]])
+
+
+def join(a, b, nkeys):
+    """
+    Full outer join of rows a and b that are sorted by all columns. Yields
+    (key, value of a, value of b), values are None for missing rows. Rows
+    with equal keys are paired by pair_values.
+    """
+    a, b = _groups(a, nkeys), _groups(b, nkeys)
+    ga, gb = next(a, None), next(b, None)
+    while ga is not None or gb is not None:
+        if gb is None or (ga is not None and ga[0] < gb[0]):
+            pairs, key = [(v, None) for v in ga[1]], ga[0]
+            ga = next(a, None)
+        elif ga is None or gb[0] < ga[0]:
+            pairs, key = [(None, v) for v in gb[1]], gb[0]
+            gb = next(b, None)
+        else:
+            pairs, key = pair_values(ga[1], gb[1]), ga[0]
+            ga, gb = next(a, None), next(b, None)
+        for va, vb in pairs:
+            yield key, va, vb
+
+
+def _remap_blocks(blocks, remaps):
+    for block in blocks:
+        for col, remap in enumerate(remaps):
+            if remap is not None:
+                block[:, col] = remap[block[:, col].astype(np.int)]
+        yield block
+
+
+class _Pair(object):
+    """
+    Two archives with aligned indexes
+    """
+
+    def __init__(self, fa, fb, max_rows=RUN_ROWS):
+        self.a = TZArchive(fa, 'r:bz2')
+        self.b = TZArchive(fb, 'r:bz2')
+        self.max_rows = max_rows
+        self.entities, self.eremap = align(self.a.entity_index(), self.b.entity_index())
+        self.predicates, self.premap = align(self.a.predicate_index(), self.b.predicate_index())
+        # sorted runs and members of a merge
+        self.dir = tempfile.mkdtemp(prefix='tenc-')
+
+    def runs(self, member, ncols, remap_b):
+        """
+        Sorted rows of member for both archives, remap_b are the lookup
+        arrays for the columns of the second archive
+        """
+        a = read_blocks(self.a.member(member), ncols)
+        b = _remap_blocks(read_blocks(self.b.member(member), ncols), remap_b)
+        result = []
+        for blocks in [a, b]:
+            runs, _ = sorted_runs(blocks, self.dir, self.max_rows)
+            result.append(merge_runs(runs, ncols))
+        return result
+
+    def relations(self):
+        member = fjoin(TZArchive.SUBS_FOUT, TZArchive.SUBS_SUFFIX)
+        a, b = self.runs(member, 4, [self.eremap, self.eremap, self.premap])
+        return join(a, b, 3)
+
+    def values(self):
+        """
+        Value dtype of both archives, float64 if they differ
+        """
+        va, vb = [arc.metadata().get('values', 'float64') for arc in [self.a, self.b]]
+        if va != vb:
+            log.warn('Archives have values %s and %s, merging as float64' % (va, vb))
+            return 'float64'
+        return va
+
+    def indexes(self):
+        """
+        Names of the indexes that both archives have
+        """
+        members = [set(arc.arc.getnames()) for arc in [self.a, self.b]]
+        return [name for name in sorted(INDEXES)
+                if all(member_name(name, part) in m for m in members for part in PARTS)]
+
+    def close(self):
+        shutil.rmtree(self.dir)
+
+
+def _read_index(arc, member):
+    return read_tensor_index(arc.member(fjoin(member, TZArchive.MAP_SUFFIX)))
+
+
+def _write_triples(fout, rows, entities, predicates):
+    for (s, o, p), val in rows:
+        fout.write('%s\t%s\t%s\t%f\n' % (entities[int(s)], predicates[int(p)], entities[int(o)], val))
+
+
+def diff(fa, fb, out, max_rows=RUN_ROWS):
+    """
+    Triples of archive fb that were added, removed or changed compared to
+    fa. Writes them with names to <out>-added.tsv, <out>-removed.tsv and
+    <out>-changed.tsv (with the new value) and returns their numbers. On
+    errors no partial outputs are left behind.
+    """
+    pair = _Pair(fa, fb, max_rows)
+    counts = dict((kind, 0) for kind in ['added', 'removed', 'changed', 'unchanged'])
+    fouts = {}
+    try:
+        for kind in ['added', 'removed', 'changed']:
+            fouts[kind] = open('%s-%s.tsv' % (out, kind), 'wb')
+        for key, va, vb in pair.relations():
+            if va is None:
+                kind, val = 'added', vb
+            elif vb is None:
+                kind, val = 'removed', va
+            elif va != vb:
+                kind, val = 'changed', vb
+            else:
+                counts['unchanged'] += 1
+                continue
+            counts[kind] += 1
+            _write_triples(fouts[kind], [(key, val)], pair.entities, pair.predicates)
+        for fout in fouts.itervalues():
+            fout.close()
+    except BaseException:
+        for fout in fouts.itervalues():
+            fout.close()
+            os.remove(fout.name)
+        raise
+    finally:
+        pair.close()
+    log.info('Added %(added)d, removed %(removed)d, changed %(changed)d triples' % counts)
+    return counts
+
+
+def merge(fa, fb, out, max_rows=RUN_ROWS):
+    """
+    Union of archives fa and fb as archive out. Entity ids of fa are kept,
+    values and attribute counts of fb win on conflicts. A triple occurs as
+    often as in the archive where it occurs more often. The value dtype of
+    the archives is kept and the indexes that both archives have are
+    rebuilt. On errors no partial archive is left behind.
+    """
+    pair = _Pair(fa, fb, max_rows)
+    arc = None
+    try:
+        a, b = pair.a, pair.b
+        N, K = len(pair.entities), len(pair.predicates)
+
+        def tmp():
+            return tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', dir=pair.dir, delete=False)
+
+        # relations, counting occurrences on the way
+        ecount = np.zeros(N, dtype=np.int64)
+        pcount = np.zeros(K, dtype=np.int64)
+        ften = tmp()
+        buf = []
+
+        def flush():
+            rows = np.array([key + (val,) for key, val in buf], dtype=np.double).reshape(-1, 4)
+            np.savetxt(ften, rows, fmt=TZArchive.SUBS_TEMPLATE.rstrip('\n'))
+            s, o, p = [rows[:, i].astype(np.int) for i in xrange(3)]
+            ecount[:] += np.bincount(s, minlength=N) + np.bincount(o, minlength=N)
+            pcount[:] += np.bincount(p, minlength=K)
+
+        for key, va, vb in pair.relations():
+            buf.append((key, va if vb is None else vb))
+            if len(buf) == RUN_ROWS // 16:
+                flush()
+                buf = []
+        flush()
+        ften.close()
+
+        # attributes, with aligned item and attribute indexes
+        attrs, names = [], []
+        for item, remap in [(TZArchive.ENTITIES_FOUT, pair.eremap), (TZArchive.PREDICATES_FOUT, pair.premap)]:
+            anames, aremap = align(_read_index(a, item + '_attr'), _read_index(b, item + '_attr'))
+            names.append(anames)
+            ra, rb = pair.runs(fjoin(item, TZArchive.ATTR_SUFFIX), 3, [remap, aremap, None])
+            f = tmp()
+            n = 0
+            for (i, j), va, vb in join(ra, rb, 2):
+                f.write('%d %d %d\n' % (i, j, va if vb is None else vb))
+                n += 1
+            f.close()
+            attrs.append((f.name, n))
+
+        # sorted subscript indexes, see Converter.write_indexes
+        def blocks():
+            with open(ften.name, 'rb') as fin:
+                for block in read_blocks(fin, 4):
+                    yield block
+
+        sizes = {'predicate': (K, pcount), 'subject': (N, None), 'object': (N, None)}
+        indexes = {}
+        for name in pair.indexes():
+            size, counts = sizes[name]
+            indexes[name] = build_index(blocks, name, size, counts, pair.dir)
+
+        arc = TZArchive(out, 'w:bz2')
+        # metadata goes first, see TZArchive.metadata
+        fmeta = tmp()
+        write_metadata(fmeta, N, K, pair.values())
+        fmeta.close()
+        arc.add_file(fmeta.name, fjoin(arc.SUBS_FOUT, arc.META_SUFFIX), remove=True)
+        fsz = tmp()
+        for c in [N, K] + ecount.tolist() + pcount.tolist() + [attrs[0][1], attrs[1][1]]:
+            fsz.write('%d\n' % c)
+        fsz.close()
+        arc.add_file(fsz.name, fjoin(arc.SUBS_FOUT, arc.SHAPE_SUFFIX), remove=True)
+        arc.add_file(attrs[0][0], fjoin(arc.ENTITIES_FOUT, arc.ATTR_SUFFIX), remove=True)
+        arc.add_file(attrs[1][0], fjoin(arc.PREDICATES_FOUT, arc.ATTR_SUFFIX), remove=True)
+        for member, index in [
+            (arc.ENTITIES_FOUT, pair.entities),
+            (arc.PREDICATES_FOUT, pair.predicates),
+            (arc.ENTITIES_FOUT + '_attr', names[0]),
+            (arc.PREDICATES_FOUT + '_attr', names[1]),
+        ]:
+            f = tmp()
+            write_tensor_index(f, index, sort=False)
+            f.close()
+            arc.add_file(f.name, fjoin(member, arc.MAP_SUFFIX), remove=True)
+        arc.add_file(ften.name, fjoin(arc.SUBS_FOUT, arc.SUBS_SUFFIX), remove=True)
+        for name, paths in sorted(indexes.iteritems()):
+            for part, path in paths.iteritems():
+                arc.add_file(path, member_name(name, part), remove=True)
+        arc.compress()
+    except BaseException:
+        # see Converter.discard
+        if arc is not None:
+            if arc.arc is not None:
+                arc.arc.close()
+            os.remove(fjoin(out, arc.ARC_SUFFIX))
+        raise
+    finally:
+        pair.close()
+    log.info('Merged %s and %s into %s: %d entities, %d predicates, %d triples' % (
+        fa, fb, out, N, K, pcount.sum()))
@@ -0,0 +1,207 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+External id assignment for vocabularies that do not fit into memory.
+
+While parsing, names are replaced by 64-bit hashes and the (hash, name)
+pairs are spilled to sorted runs on disk. Afterwards the runs are merged,
+which assigns dense ids in hash order and detects hash collisions against
+the stored names, and the hashed subscripts are rewritten to ids in a
+streaming pass.
+"""
+
+import hashlib
+import heapq
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import numpy as np
+
+log = logging.getLogger('tenc.external')
+
+# record of a run: hash, length of name, name
+RECORD = struct.Struct('<qI')
+
+# estimated bytes per name in memory in addition to its length (dict
+# entry, str and int objects)
+NAME_OVERHEAD = 120
+
+# hashed subscripts as written while parsing
+HASHED = np.dtype([('s', '<i8'), ('o', '<i8'), ('p', '<i8'), ('val', '<f8')])
+
+CHUNK_SIZE = 1 << 16
+
+
+def name_hash(name):
+    """
+    Signed 64-bit hash of name
+    """
+    return struct.unpack('<q', hashlib.md5(name).digest()[:8])[0]
+
+
+def _collision(a, b):
+    raise ValueError('Hash collision between %r and %r, convert without --external-budget' % (a, b))
+
+
+def _read_run(fname):
+    with open(fname, 'rb') as fin:
+        while True:
+            head = fin.read(RECORD.size)
+            if not head:
+                break
+            h, n = RECORD.unpack(head)
+            yield h, fin.read(n)
+
+
+class HashVocabulary(object):
+    """
+    Names by their 64-bit hash. Names are kept in memory until they exceed
+    max_bytes and are then written to a sorted run on disk.
+
+    Looking up a name returns its hash, such that the vocabulary can stand
+    in for the dict maps of Converter. After assign, len() is the number of
+    distinct names and ids() maps hashes to dense ids.
+    """
+
+    def __init__(self, max_bytes, dirname=None):
+        self.max_bytes = max_bytes
+        self.dirname = dirname
+        self.names = {}
+        self.nbytes = 0
+        self.runs = []
+        self.hashes = None
+
+    def __getitem__(self, name):
+        h = name_hash(name)
+        known = self.names.get(h)
+        if known is None:
+            self.names[h] = name
+            self.nbytes += len(name) + NAME_OVERHEAD
+            if self.nbytes > self.max_bytes:
+                self.spill()
+        elif known != name:
+            _collision(known, name)
+        return h
+
+    def __len__(self):
+        if self.hashes is None:
+            raise ValueError('Ids are not assigned yet')
+        return len(self.hashes)
+
+    def spill(self):
+        fd, fname = tempfile.mkstemp(prefix='tenc-vocab-', dir=self.dirname)
+        with os.fdopen(fd, 'wb') as fout:
+            for h in sorted(self.names):
+                name = self.names[h]
+                fout.write(RECORD.pack(h, len(name)))
+                fout.write(name)
+        log.debug('Spilled %d names to %s' % (len(self.names), fname))
+        self.runs.append(fname)
+        self.names = {}
+        self.nbytes = 0
+
+    def assign(self, fout):
+        """
+        Merge runs, write the index map of names by id to fout and keep
+        the sorted hashes in a memory-mapped file
+        """
+        self.spill()
+        body = tempfile.TemporaryFile(prefix='tenc-', dir=self.dirname)
+        fhashes = tempfile.NamedTemporaryFile(prefix='tenc-', dir=self.dirname)
+        buf = []
+        n = 0
+        last_h, last_name = None, None
+        for h, name in heapq.merge(*[_read_run(f) for f in self.runs]):
+            if h == last_h:
+                if name != last_name:
+                    _collision(last_name, name)
+                continue
+            body.write('%s\n' % name)
+            buf.append(h)
+            if len(buf) == CHUNK_SIZE:
+                np.array(buf, dtype='<i8').tofile(fhashes)
+                buf = []
+            last_h, last_name = h, name
+            n += 1
+        np.array(buf, dtype='<i8').tofile(fhashes)
+        fhashes.flush()
+        for f in self.runs:
+            os.remove(f)
+        self.runs = []
+
+        # same format as write_tensor_index
+        fout.write('length: %d\n' % n)
+        body.seek(0)
+        shutil.copyfileobj(body, fout)
+        body.close()
+
+        self._fhashes = fhashes
+        if n > 0:
+            self.hashes = np.memmap(fhashes.name, dtype='<i8', mode='r')
+        else:
+            self.hashes = np.zeros(0, dtype='<i8')
+        log.debug('Assigned ids to %d names' % n)
+        return n
+
+    def ids(self, hashes):
+        return np.searchsorted(self.hashes, hashes)
+
+
+class HashedSubscripts(object):
+    """
+    Buffered binary file of hashed subscripts
+    """
+
+    def __init__(self, dirname=None):
+        self.fout = tempfile.NamedTemporaryFile(prefix='tenc-', dir=dirname)
+        self.buf = []
+
+    def write(self, s, o, p, val):
+        self.buf.append((s, o, p, val))
+        if len(self.buf) == CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        np.array(self.buf, dtype=HASHED).tofile(self.fout)
+        self.buf = []
+        self.fout.flush()
+
+    def rewrite(self, fout, SUBS_TEMPLATE, evocab, pvocab):
+        """
+        Write subscripts with ids to fout, returns number of occurrences of
+        entities and predicates
+        """
+        self.flush()
+        ecount = np.zeros(len(evocab), dtype=np.int64)
+        pcount = np.zeros(len(pvocab), dtype=np.int64)
+        fmt = SUBS_TEMPLATE.rstrip('\n')
+        with open(self.fout.name, 'rb') as fin:
+            while True:
+                block = np.fromfile(fin, dtype=HASHED, count=CHUNK_SIZE)
+                if len(block) == 0:
+                    break
+                s = evocab.ids(block['s'])
+                o = evocab.ids(block['o'])
+                p = pvocab.ids(block['p'])
+                np.savetxt(fout, np.column_stack((s, o, p, block['val'])), fmt=fmt)
+                ecount += np.bincount(s, minlength=len(ecount))
+                ecount += np.bincount(o, minlength=len(ecount))
+                pcount += np.bincount(p, minlength=len(pcount))
+        self.fout.close()
+        return ecount, pcount
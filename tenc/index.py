@@ -0,0 +1,184 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Sorted subscript indexes of a tensor archive. An index stores the rows of
+tensor.ten sorted by one of its columns together with an offsets array,
+i.e. the tensor in CSR format with respect to that column:
+
+  tensor.<name>-subs.npy     remaining subscripts, sorted by key
+  tensor.<name>-vals.npy     values, sorted by key
+  tensor.<name>-offsets.npy  rows of key k are [offsets[k], offsets[k + 1])
+
+The predicate index holds the frontal slices, the subject and object
+indexes are the adjacency lists of outgoing and incoming edges.
+"""
+
+import logging
+import os
+import tarfile
+import tempfile
+from contextlib import closing
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from tenc._tenc import TZArchive, fjoin, read_tensor_size, read_blocks
+
+log = logging.getLogger('tenc.index')
+
+# Columns of tensor.ten
+S, O, P, VAL = 0, 1, 2, 3
+
+# index name -> (key column, stored subscript columns)
+INDEXES = {
+    'predicate': (P, (S, O)),
+    'subject': (S, (P, O)),
+    'object': (O, (P, S)),
+}
+
+PARTS = ['subs', 'vals', 'offsets']
+
+
+def member_name(name, part):
+    """
+    Name of the archive member for part of index name
+    """
+    return fjoin(TZArchive.SUBS_FOUT, '%s-%s.npy' % (name, part))
+
+
+def build_index(blocks, name, size, counts=None, dirname=None):
+    """
+    Sort subscripts with a counting sort on the key column of index name.
+    Rows are scattered into memory-mapped files, hence memory is bounded by
+    the size of a block.
+
+    Parameter
+    ---------
+    blocks: callable that returns an iterator over blocks of tensor.ten
+            rows, see read_blocks
+    name: name of the index, see INDEXES
+    size: number of distinct keys
+    counts: number of rows per key, if None counted in an additional pass
+
+    Returns dict part -> path of the .npy file
+    """
+    key, cols = INDEXES[name]
+    log.debug('Building %s index' % name)
+    if counts is None:
+        counts = np.zeros(size, dtype=np.int64)
+        for b in blocks():
+            counts += np.bincount(b[:, key].astype(np.int), minlength=size)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    nnz = offsets[-1]
+
+    paths = {}
+    for part in PARTS:
+        fd, paths[part] = tempfile.mkstemp(prefix='tenc-', suffix='.npy', dir=dirname)
+        os.close(fd)
+    np.save(paths['offsets'], offsets)
+    if nnz == 0:
+        # empty files can not be memory-mapped
+        np.save(paths['subs'], np.zeros((0, len(cols)), dtype=np.int64))
+        np.save(paths['vals'], np.zeros(0, dtype=np.double))
+        return paths
+
+    subs = open_memmap(paths['subs'], mode='w+', dtype=np.int64, shape=(nnz, len(cols)))
+    vals = open_memmap(paths['vals'], mode='w+', dtype=np.double, shape=(nnz,))
+    pos = offsets[:-1].copy()
+    for b in blocks():
+        k = b[:, key].astype(np.int)
+        order = np.argsort(k, kind='mergesort')
+        k = k[order]
+        # position of rows within their key
+        rank = np.arange(len(k)) - np.searchsorted(k, k)
+        dest = pos[k] + rank
+        subs[dest] = b[order][:, cols]
+        vals[dest] = b[order, VAL]
+        pos += np.bincount(k, minlength=size)
+    subs.flush()
+    vals.flush()
+    del subs, vals
+    return paths
+
+
+def read_header(fin):
+    """
+    Read header of .npy file, returns shape, dtype and offset of the data
+    """
+    version = np.lib.format.read_magic(fin)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(fin)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(fin)
+    return shape, dtype, fin.tell()
+
+
+class Member(object):
+    """
+    Random access to rows of a .npy file without loading it, e.g. a
+    member of a tensor archive
+    """
+
+    def __init__(self, fin):
+        self.fin = fin
+        self.shape, self.dtype, self.offset = read_header(fin)
+        self.row_shape = self.shape[1:]
+        self.row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def rows(self, start, stop):
+        self.fin.seek(self.offset + start * self.row_bytes)
+        buf = self.fin.read((stop - start) * self.row_bytes)
+        return np.frombuffer(buf, dtype=self.dtype).reshape((stop - start,) + self.row_shape)
+
+    def read(self):
+        return self.rows(0, len(self))
+
+
+def add_indexes(fname, names):
+    """
+    Add indexes to an existing archive. Compressed archives can not be
+    appended to, hence the archive is rewritten.
+    """
+    src = TZArchive(fname, 'r:bz2')
+    member = lambda name: src.arc.extractfile(name)
+    N, K, _ = read_tensor_size(member(fjoin(src.SUBS_FOUT, src.SHAPE_SUFFIX)))
+
+    def blocks():
+        # every pass closes its member
+        with closing(member(fjoin(src.SUBS_FOUT, src.SUBS_SUFFIX))) as fin:
+            for block in read_blocks(fin, 4):
+                yield block
+
+    paths = dict((name, build_index(blocks, name, K if name == 'predicate' else N)) for name in names)
+
+    fout = fjoin(fname, TZArchive.ARC_SUFFIX)
+    with tarfile.open(fout + '.tmp', 'w:bz2') as dst:
+        for info in src.arc.getmembers():
+            # replace existing members of the new indexes
+            if any(info.name == member_name(name, part) for name in names for part in PARTS):
+                continue
+            dst.addfile(info, src.arc.extractfile(info))
+        for name in names:
+            for part, path in paths[name].iteritems():
+                dst.add(path, arcname=member_name(name, part))
+                os.remove(path)
+    src.arc.close()
+    src.arc = None
+    os.rename(fout + '.tmp', fout)
@@ -14,16 +14,40 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
-from collections import defaultdict
-from itertools import count
+import os
+from collections import defaultdict, deque
+from itertools import imap
 import tempfile
+import numpy as np
 
 from tenc import MAP, TZArchive, register_parser, converter
-from tenc._tenc import fjoin, write_tensor_size, write_tensor_index
+from tenc._tenc import IdMap, fjoin, write_metadata, write_tensor_size, write_tensor_index, read_blocks
+from tenc.pipeline import Writer, open_input, read_chunks, threaded
 
 log = logging.getLogger('tenc.converter')
 
+# Number of attribute records that are sent to a worker at once
+ATTR_BATCH = 1000
+
+
+def _extract_attributes(records):
+    """
+    Names of the attributes of (item, function, property, value, global)
+    records, where function is the name of an attribute function in
+    tenc.converter. Runs in the workers of Converter.pool.
+    """
+    result = []
+    for idx, funname, prop, value, is_global in records:
+        fun = getattr(converter, funname)
+        if is_global:
+            names = [val for attr_type, attr_id, val in fun(prop, value)]
+        else:
+            names = [','.join(map(str, aid)) for aid in fun(prop, value)]
+        result.append((idx, names))
+    return result
+
 
 def flush_attr_dict(attr_fout, attr_dict):
     for k, v in attr_dict.iteritems():
@@ -36,16 +60,59 @@ class Converter(TZArchive):
     fout_eattr = None
     fout_rattr = None
 
-    def __init__(self, fname='tensor', attr_map={}):
+    # parsers that implement parse_line(line) -> (sname, pname, oname, val)
+    # or None read, parse and write in pipeline stages, see parse_file
+    parse_line = None
+
+    def __init__(self, fname='tensor', attr_map={}, indexes=(), external_budget=None, prefilter=None, pipelined=False,
+                 values=None, attr_processes=1):
         super(Converter, self).__init__(fname, 'w:bz2')
         self.attr_map = attr_map
+        self.indexes = indexes
+        self.pipelined = pipelined
+        # default value dtype of serializations, see write_metadata
+        self.values = values
+        # entity attributes are extracted by a pool of attr_processes
+        # workers, see extract_attributes
+        self.attr_processes = attr_processes
+        self.pool = None
+        self.attr_batch = []
+        self.attr_pending = deque()
         self.eattr_dict = defaultdict(int)
         self.rattr_dict = defaultdict(int)
 
         # setup id -> idx maps
         # for semantics of array entries see MAP_ORDER
-        self.idx = [count() for _ in range(MAP.length)]
-        self.maps = [defaultdict(self.idx[i].next) for i in range(MAP.length)]
+        self.maps = [IdMap() for _ in range(MAP.length)]
+
+        # with a memory budget for the vocabulary, entities and predicates
+        # are hashed while parsing and get their ids afterwards, see
+        # tenc.external
+        self.hashed = None
+        if external_budget is not None:
+            from tenc.external import HashVocabulary, HashedSubscripts
+            self.maps[MAP.ENTITY] = HashVocabulary(external_budget // 4)
+            self.maps[MAP.PREDICATE] = HashVocabulary(external_budget // 4)
+            self.hashed = HashedSubscripts()
+
+        # with prefilter = (min count of entities, min count of predicates,
+        # bytes of the sketch), a first pass counts occurrences in a
+        # count-min sketch and triples of certainly pruned entities and
+        # predicates are skipped, see write_filtered
+        self.sketch = None
+        # pass of prefiltering, 'count' or 'filter', see write
+        self.prefilter_pass = None
+        if prefilter is not None:
+            if external_budget is not None:
+                raise ValueError('Prefiltering can not be combined with external id assignment')
+            from tenc.sketch import CountMinSketch
+            min_count_ent, min_count_pred, nbytes = prefilter
+            self.min_count = {MAP.ENTITY: min_count_ent, MAP.PREDICATE: min_count_pred}
+            self.sketch = {
+                MAP.ENTITY: CountMinSketch(nbytes),
+                # there are few predicates
+                MAP.PREDICATE: CountMinSketch(min(nbytes, 1 << 20)),
+            }
 
         # setup predicate fact counter
         self.nnz = {
@@ -55,24 +122,55 @@ class Converter(TZArchive):
             MAP.RATTR: 0
         }
 
-    def convert(self, input_files):
+    def convert(self, input_files, compress=True):
+        """
+        Convert input_files and write the archive. If compress is False the
+        members are left uncompressed for Serializer.read_from, call
+        compress or discard afterwards.
+        """
+        if self.sketch is not None and '' in input_files:
+            raise ValueError('Prefiltering reads the input twice and requires input files, not stdin')
+
         # Setup temporary files
         self.fout_subs = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-')
         self.fout_eattr = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-')
         self.fout_rattr = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-')
         self.fsz = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', delete=False)
+        self.index_files = {}
+
+        if self.sketch is not None:
+            self.prefilter_pass = 'count'
+            for fin in input_files:
+                self.parse_file(fin)
+            for sketch in self.sketch.itervalues():
+                sketch.flush()
+            self.prefilter_pass = 'filter'
 
         # parse input_files
-        for fin in input_files:
-            self.parse(fin)
+        self.start_pool()
+        try:
+            for fin in input_files:
+                self.parse_file(fin)
+            self.drain_attributes()
+        finally:
+            self.stop_pool()
+        if self.hashed is not None:
+            self.assign_ids()
         self.flush_attributes()
 
+        # Write metadata, it goes first such that it is found without
+        # reading further
+        N, K = len(self.maps[MAP.ENTITY]), len(self.maps[MAP.PREDICATE])
+        fmeta = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', delete=False)
+        write_metadata(fmeta, N, K, self.values)
+        fmeta.close()
+        self.add_file(fmeta.name, fjoin(self.SUBS_FOUT, self.META_SUFFIX), remove=True)
+
         # Write tensor size
         write_tensor_size(self.fsz, self.maps[MAP.ENTITY], self.maps[MAP.PREDICATE], self.nnz)
-        self.add(self.fsz, fjoin(self.SUBS_FOUT, self.SHAPE_SUFFIX))
+        self.add(self.fsz, fjoin(self.SUBS_FOUT, self.SHAPE_SUFFIX), remove=True)
 
         # add files to archive
-        self.add(self.fout_subs, fjoin(self.SUBS_FOUT, self.SUBS_SUFFIX))
         self.add(self.fout_eattr, fjoin(self.ENTITIES_FOUT, self.ATTR_SUFFIX))
         self.add(self.fout_rattr, fjoin(self.PREDICATES_FOUT, self.ATTR_SUFFIX))
 
@@ -83,28 +181,196 @@ class Converter(TZArchive):
             (self.ENTITIES_FOUT + "_attr", MAP.EATTR),
             (self.PREDICATES_FOUT + "_attr", MAP.RATTR)
         ]:
+            if order in self.index_files:
+                self.add(self.index_files[order], fjoin(_fname, self.MAP_SUFFIX), remove=True)
+                continue
             tmp = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', delete=False)
-            write_tensor_index(tmp, self.maps[order])
-            self.add(tmp, fjoin(_fname, self.MAP_SUFFIX))
+            write_tensor_index(tmp, self.maps[order].names, sort=False)
+            self.add(tmp, fjoin(_fname, self.MAP_SUFFIX), remove=True)
 
-        self.compress()
+        # subscripts go last, such that the small members can be read
+        # without decompressing them
+        self.add(self.fout_subs, fjoin(self.SUBS_FOUT, self.SUBS_SUFFIX))
+
+        # Write sorted subscript indexes
+        self.write_indexes()
+
+        if compress:
+            self.compress()
+
+    def member(self, name):
+        """
+        File object for member name that has not been compressed yet, the
+        caller closes it
+        """
+        for path, arcname in self.files.iteritems():
+            if arcname == name:
+                return open(path, 'rb')
+        raise KeyError('Converter %s has no member %s' % (self.fname, name))
+
+    def metadata(self):
+        with self.member(fjoin(self.SUBS_FOUT, self.META_SUFFIX)) as fin:
+            return json.load(fin)
+
+    def compress(self):
+        TZArchive.compress(self)
+        self.close_files()
+
+    def discard(self):
+        """
+        Remove the archive without adding members
+        """
+        self.arc.close()
+        self.arc = None
+        os.remove(fjoin(self.fname, self.ARC_SUFFIX))
+        for f in self.remove:
+            os.remove(f)
+        self.close_files()
+
+    def close_files(self):
+        # temporary files of subscripts and attributes are deleted on close
+        for f in [self.fout_subs, self.fout_eattr, self.fout_rattr]:
+            if f is not None:
+                f.close()
+
+    def assign_ids(self):
+        """
+        Assign ids to hashed entities and predicates and rewrite subscripts
+        and attributes with ids
+        """
+        evocab, pvocab = self.maps[MAP.ENTITY], self.maps[MAP.PREDICATE]
+        for order, vocab in [(MAP.ENTITY, evocab), (MAP.PREDICATE, pvocab)]:
+            tmp = tempfile.NamedTemporaryFile(mode='wb', prefix='tenc-', delete=False)
+            vocab.assign(tmp)
+            self.index_files[order] = tmp
+        ecount, pcount = self.hashed.rewrite(self.fout_subs, self.SUBS_TEMPLATE, evocab, pvocab)
+        self.nnz[MAP.ENTITY] = ecount
+        self.nnz[MAP.PREDICATE] = pcount
+        self.eattr_dict = self.rehash(self.eattr_dict, evocab)
+        self.rattr_dict = self.rehash(self.rattr_dict, pvocab)
+        self.hashed = None
+
+    def rehash(self, attr_dict, vocab):
+        if len(attr_dict) == 0:
+            return attr_dict
+        keys = attr_dict.keys()
+        ids = vocab.ids(np.array([k[0] for k in keys], dtype=np.int64))
+        return dict(((int(i), k[1]), attr_dict[k]) for i, k in zip(ids, keys))
+
+    def write_indexes(self):
+        from tenc.index import build_index, member_name
+        if len(self.indexes) == 0:
+            return
+        self.fout_subs.flush()
+
+        def blocks():
+            # every pass closes its file
+            with open(self.fout_subs.name, 'rb') as fin:
+                for block in read_blocks(fin, 4):
+                    yield block
+        N = len(self.maps[MAP.ENTITY])
+        sizes = {
+            'predicate': (len(self.maps[MAP.PREDICATE]), self.nnz[MAP.PREDICATE]),
+            # entity counts include both roles, count subjects and objects separately
+            'subject': (N, None),
+            'object': (N, None),
+        }
+        for name in self.indexes:
+            size, counts = sizes[name]
+            counts = [counts[i] for i in xrange(size)] if counts is not None else None
+            paths = build_index(blocks, name, size, counts)
+            for part, path in paths.iteritems():
+                self.add_file(path, member_name(name, part), remove=True)
 
 
     def parse(self, fin):
         raise NotImplementedError()
 
-    def process_global_entity_attributes(self, sname, pname, oname):
+    def parse_file(self, fin):
+        if not self.pipelined or self.parse_line is None:
+            return self.parse(fin)
+        self.parse_pipelined(fin)
+
+    def parse_lines(self, lines):
+        parse_line = self.parse_line
+        return [t for t in (parse_line(line) for line in lines) if t is not None]
+
+    def parse_pipelined(self, fin):
+        """
+        Parse fin in stages: reading and decompressing lines, parsing lines
+        and writing subscripts run in threads of their own, ids are assigned
+        in this thread in input order
+        """
+        log.debug('Reading %s in pipeline stages' % fin)
+        chunks = threaded(imap(self.parse_lines, threaded(read_chunks(fin))))
+        fout, self.fout_subs = self.fout_subs, Writer(self.fout_subs)
+        try:
+            for chunk in chunks:
+                self.write_batch(chunk)
+        finally:
+            # stops the stages if write failed
+            chunks.close()
+            writer, self.fout_subs = self.fout_subs, fout
+            writer.close()
+
+    def start_pool(self):
+        # global relation attributes are extracted in this process
+        if self.attr_processes <= 1 or not set(self.attr_map) - set(['global-relations']):
+            return
+        import multiprocessing
+        if multiprocessing.current_process().daemon:
+            # e.g. conversions in pool workers, batch jobs run in
+            # processes that are not daemonic
+            log.warn('Extracting attributes in this process, daemonic processes can not start workers')
+            return
+        log.debug('Extracting attributes with %d processes' % self.attr_processes)
+        self.pool = multiprocessing.Pool(self.attr_processes)
+
+    def stop_pool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def extract_attributes(self, idx, funname, prop, value, is_global=False):
+        """
+        Count the attributes of entity idx from attribute function funname.
+        With a pool, records are sent to the workers in batches and their
+        results are merged in order, such that attribute ids are the same
+        as without a pool.
+        """
+        record = (idx, funname, prop, value, is_global)
+        if self.pool is None:
+            self.merge_attributes(_extract_attributes([record]))
+            return
+        self.attr_batch.append(record)
+        if len(self.attr_batch) >= ATTR_BATCH:
+            self.attr_pending.append(self.pool.apply_async(_extract_attributes, (self.attr_batch,)))
+            self.attr_batch = []
+            # bound the number of batches in flight
+            while len(self.attr_pending) > 2 * self.attr_processes:
+                self.merge_attributes(self.attr_pending.popleft().get())
+
+    def merge_attributes(self, result):
+        for idx, names in result:
+            for name in names:
+                self.eattr_dict[(idx, self.maps[MAP.EATTR][intern(name)])] += 1
+
+    def drain_attributes(self):
+        while self.attr_pending:
+            self.merge_attributes(self.attr_pending.popleft().get())
+        if self.attr_batch:
+            self.merge_attributes(_extract_attributes(self.attr_batch))
+            self.attr_batch = []
+
+    def process_global_entity_attributes(self, *names):
         if 'global-entities' in self.attr_map:
-            sidx = self.maps[MAP.ENTITY][sname]
-            oidx = self.maps[MAP.ENTITY][oname]
+            ids = [self.maps[MAP.ENTITY][name] for name in names]
             for funname in self.attr_map['global-entities']:
-                fun = getattr(converter, funname)
-                for attr_type, attr_id, val in fun(funname + '_entity', sname):
-                    self.eattr_dict[(sidx, self.maps[MAP.EATTR][intern(val)])] += 1
-                for attr_type, attr_id, val in fun(funname + '_entity', oname):
-                    self.eattr_dict[(oidx, self.maps[MAP.EATTR][intern(val)])] += 1
+                for idx, name in zip(ids, names):
+                    self.extract_attributes(idx, funname, funname + '_entity', name, True)
 
-    def process_global_relation_attributes(self, sname, pname, oname):
+    def process_global_relation_attributes(self, pname):
         if 'global-relations' in self.attr_map:
             pidx = self.maps[MAP.PREDICATE][pname]
             for funname in self.attr_map['global-relations']:
@@ -113,23 +379,63 @@ class Converter(TZArchive):
                     self.rattr_dict[(pidx, self.maps[MAP.RATTR][intern(val)])] += 1
 
     def write(self, sname, pname, oname, val):
+        if self.prefilter_pass == 'count':
+            return self.write_sketch(sname, pname, oname, val)
+        if self.prefilter_pass == 'filter':
+            return self.write_filtered(sname, pname, oname, val)
         # process global attributes
-        self.process_global_entity_attributes(sname, pname, oname)
-        self.process_global_relation_attributes(sname, pname, oname)
-
+        self.process_global_entity_attributes(sname, oname)
+        self.process_global_relation_attributes(pname)
+        self.write_triple(sname, pname, oname, val)
+
+    def write_batch(self, rows):
+        """
+        Write (sname, pname, oname, val) tuples of rows. Ids are assigned in
+        the same order as by write, subscripts of the batch are formatted
+        and written at once and occurrences are counted per batch.
+        """
+        if (self.prefilter_pass is not None or self.hashed is not None or
+                'global-entities' in self.attr_map or 'global-relations' in self.attr_map):
+            write = self.write
+            for t in rows:
+                write(*t)
+            return
+        emap, pmap = self.maps[MAP.ENTITY], self.maps[MAP.PREDICATE]
+        attr_map = self.attr_map
+        subs = []
+        for sname, pname, oname, val in rows:
+            sidx = emap[sname]
+            if pname in attr_map:
+                self.extract_attributes(sidx, attr_map[pname], pname, oname)
+            else:
+                subs.append((sidx, emap[oname], pmap[pname], val))
+        if not subs:
+            return
+        template = self.SUBS_TEMPLATE
+        self.fout_subs.write(''.join([template % t for t in subs]))
+
+        # count predicate and entity occurrences
+        ids = np.array([t[:3] for t in subs], dtype=np.int64)
+        for order, counts in [(MAP.ENTITY, np.bincount(ids[:, :2].ravel())), (MAP.PREDICATE, np.bincount(ids[:, 2]))]:
+            nnz = self.nnz[order]
+            for i in counts.nonzero()[0].tolist():
+                nnz[i] += int(counts[i])
+
+    def write_triple(self, sname, pname, oname, val):
         sidx = self.maps[MAP.ENTITY][sname]
         # process specific entity attributes
         if pname in self.attr_map:
-            sidx = self.maps[MAP.ENTITY][sname]
-            fun = getattr(converter, self.attr_map[pname])
-            for aid in fun(pname, oname):
-                aid = ','.join(map(str, aid))
-                self.eattr_dict[(sidx, self.maps[MAP.EATTR][intern(aid)])] += 1
+            self.extract_attributes(sidx, self.attr_map[pname], pname, oname)
         # process relations
         else:
             oidx = self.maps[MAP.ENTITY][oname]
             pidx = self.maps[MAP.PREDICATE][pname]
 
+            if self.hashed is not None:
+                # counted when rewriting subscripts
+                self.hashed.write(sidx, oidx, pidx, val)
+                return
+
             self.fout_subs.write(self.SUBS_TEMPLATE % (sidx, oidx, pidx, val))
 
             # count predicte and entity occurrences
@@ -137,6 +443,45 @@ class Converter(TZArchive):
             self.nnz[MAP.ENTITY][sidx] += 1
             self.nnz[MAP.ENTITY][oidx] += 1
 
+    def write_sketch(self, sname, pname, oname, val):
+        # first pass of prefiltering, only relations count for pruning
+        if not pname in self.attr_map:
+            self.sketch[MAP.ENTITY].add(sname)
+            self.sketch[MAP.ENTITY].add(oname)
+            self.sketch[MAP.PREDICATE].add(pname)
+
+    def is_pruned(self, order, name):
+        # names with ids were kept before, otherwise ask the sketch
+        if name in self.maps[order]:
+            return False
+        return self.sketch[order].count(name) <= self.min_count[order]
+
+    def write_filtered(self, sname, pname, oname, val):
+        """
+        Write triple unless it involves entities or predicates that are
+        certainly pruned. Occurrences and global attributes of the others
+        are still counted, such that pruning keeps the same entities and
+        predicates as without prefiltering.
+        """
+        spruned = self.is_pruned(MAP.ENTITY, sname)
+        opruned = self.is_pruned(MAP.ENTITY, oname)
+        ppruned = self.is_pruned(MAP.PREDICATE, pname)
+        self.process_global_entity_attributes(*[n for n, pruned in [(sname, spruned), (oname, opruned)] if not pruned])
+        if not ppruned:
+            self.process_global_relation_attributes(pname)
+
+        if pname in self.attr_map:
+            if not spruned:
+                self.write_triple(sname, pname, oname, val)
+        elif not (spruned or opruned or ppruned):
+            self.write_triple(sname, pname, oname, val)
+        else:
+            for name, pruned in [(sname, spruned), (oname, opruned)]:
+                if not pruned:
+                    self.nnz[MAP.ENTITY][self.maps[MAP.ENTITY][name]] += 1
+            if not ppruned:
+                self.nnz[MAP.PREDICATE][self.maps[MAP.PREDICATE][pname]] += 1
+
     def flush_attributes(self):
         # process attributes
         flush_attr_dict(self.fout_eattr, self.eattr_dict)
@@ -175,65 +520,63 @@ class TabDelimited(Converter):
     offset = 0
     val_idx = None
 
+    def parse_line(self, line):
+        t = self.parse_lines([line])
+        return t[0] if t else None
+
+    def parse_lines(self, lines):
+        """
+        (sname, pname, oname, val) tuples of lines, lines are only split up
+        to the last column that is needed and the values of all lines are
+        converted at once
+        """
+        s, p, o, v = self.offset, self.offset + 1, self.offset + 2, self.val_idx
+        last = o if v is None else max(o, v)
+        rows = [line.split('\t', last + 1) for line in (l.strip() for l in lines) if line]
+        if v is None:
+            return [(d[s], d[p], d[o], 1) for d in rows]
+        vals = np.array([d[v] for d in rows], dtype=np.double).tolist()
+        return [(d[s], d[p], d[o], val) for d, val in zip(rows, vals)]
+
     def parse(self, fin):
         log.debug('Reading tab-delimited data from %s (offset %d, value index %s)' % (fin, self.offset, self.val_idx))
-        from nltk.corpus import wordnet as wn
+        for lines in read_chunks(fin):
+            self.write_batch(self.parse_lines(lines))
 
-        f = open(fin, 'r')
-        for line in f:
-            data = line.strip().split('\t')
-
-            # tensor
-            sname = data[0 + self.offset]
-            oname = data[2 + self.offset]
-            pname = data[1 + self.offset]
-            val = 1 if self.val_idx is None else float(data[self.val_idx])
-            self.write(sname, pname, oname, val)
-
-            # has_word attributes
-            #for attr_type, attr_id, val in has_word('noun', data[0 + offset]):
-            #    eattr_dict[(sidx, maps[MAP.EATTR][intern(val)])] += 1
-            #for attr_type, attr_id, val in has_word('noun', data[2 + offset]):
-            #    eattr_dict[(oidx, maps[MAP.EATTR][intern(val)])] += 1
-            #for attr_type, attr_id, val in has_word('pattern', data[1 + offset]):
-            #    rattr_dict[(pidx, maps[MAP.RATTR][intern(val)])] += 1
-
-            # synset attributes
-            #for attr_type, attr_id, val in synset('synset_noun', data[0 + self.offset], pos=wn.NOUN):
-            #    eattr_dict[(sidx, self.maps[MAP.EATTR][intern(val)])] += 1
-            #for attr_type, attr_id, val in synset('synset_noun', data[2 + self.offset], pos=wn.NOUN):
-            #    eattr_dict[(oidx, self.maps[MAP.EATTR][intern(val)])] += 1
-        f.close()
 
-
-@register_parser('mln', 'Markov Logic Network data')
+@register_parser('mln')
 class MarkovLogicNetworks(Converter):
 
     import re
     pattern = re.compile('(!)?(\w+)\((\w+),\s*(\w+)\)')
 
+    def parse_line(self, line):
+        line = line.strip()
+        if line in ['', '\n']:
+            return None
+        m = self.pattern.match(line)
+        pname = m.group(2).strip()
+        sname = m.group(3).strip()
+        oname = m.group(4).strip()
+        val = 1 if m.group(1) is None else -1
+        return sname, pname, oname, val
+
     def parse(self, fin):
         log.debug('Reading Markov Logic Network data from %s' % fin)
 
-        f = open(fin, 'r')
+        f = open_input(fin)
         for line in f:
-            line = line.strip()
-            if line in ['', '\n']:
-                continue
-            m = self.pattern.match(line)
-            pname = m.group(2).strip()
-            sname = m.group(3).strip()
-            oname = m.group(4).strip()
-            val = 1 if m.group(1) is None else -1
-            self.write(sname, pname, oname, val)
+            t = self.parse_line(line)
+            if t is not None:
+                self.write(*t)
         f.close()
 
 
-@register_parser('tab-delimited', '')
+@register_parser('tab-delimited')
 class TabPublic(TabDelimited):
     pass
 
-@register_parser('ntriples', '')
+@register_parser('ntriples')
 class NTriples(Redland):
     """
     Parser for N-Triples format, based on redland parser
@@ -241,7 +584,7 @@ class NTriples(Redland):
     parser = 'ntriples'
 
 
-@register_parser('rdfxml', '')
+@register_parser('rdfxml')
 class RDFXML(Redland):
     """
     Parser for RDF/XML format, based on redland parser
@@ -249,7 +592,7 @@ class RDFXML(Redland):
     parser = 'rdfxml'
 
 
-@register_parser('turtle', '')
+@register_parser('turtle')
 class Turtle(Redland):
     """
     Parser for Turtle format, based on redland parser
@@ -257,7 +600,7 @@ class Turtle(Redland):
     parser = 'turtle'
 
 
-@register_parser('reverb', '')
+@register_parser('reverb')
 class ReVerb(TabDelimited):
     """
     Parser for ReVerb format, based on tab parser
@@ -267,14 +610,14 @@ class ReVerb(TabDelimited):
     val_idx = 8
 
 
-@register_parser('ypss-surface', '')
+@register_parser('ypss-surface')
 class YPSSSurface(TabDelimited):
     """
     Parser for semi-synthethic Patty data, based on tab parser
     """
     val_idx = 6
 
-@register_parser('ypss-facts', '')
+@register_parser('ypss-facts')
 class YPSSFacts(TabDelimited):
     """
     Parser for semi-synthethic Patty data, based on tab parser
@@ -0,0 +1,178 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Threads connected by bounded queues for the stages of a conversion:
+
+  reader (I/O, decompression) -> parser -> id assignment -> writer
+
+Items are chunks of lines or tuples, such that the queues are not passed
+single lines. Bounded queues block fast stages until slow stages caught
+up, which keeps memory bounded. Id assignment runs in the calling thread
+and sees the chunks in input order, such that ids are the same as without
+the pipeline.
+"""
+
+import bz2
+import gzip
+import sys
+import threading
+from Queue import Full, Queue
+
+# number of bytes of lines in a chunk
+CHUNK_BYTES = 1 << 18
+
+# seconds a blocked producer waits before it checks whether the consumer
+# stopped, see threaded
+POLL = 0.1
+
+_END = object()
+
+
+class _Failure(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def open_input(fname):
+    """
+    Open input file, .gz and .bz2 files are decompressed
+    """
+    if fname.endswith('.gz'):
+        return gzip.open(fname, 'rb')
+    if fname.endswith('.bz2'):
+        return bz2.BZ2File(fname, 'rb')
+    return open(fname, 'rb')
+
+
+def read_chunks(fname, size=None):
+    """
+    Lists of lines of fname, without line breaks, from blocks of about size
+    bytes (default CHUNK_BYTES)
+    """
+    size = size or CHUNK_BYTES
+    tail = ''
+    with open_input(fname) as fin:
+        while True:
+            buf = fin.read(size)
+            if not buf:
+                break
+            lines = (tail + buf).split('\n')
+            tail = lines.pop()
+            if lines:
+                yield lines
+    if tail:
+        yield [tail]
+
+
+def threaded(iterable, maxsize=8):
+    """
+    Iterate iterable in a thread of its own, items are passed through a
+    queue of at most maxsize items. Exceptions of the thread are raised in
+    the consumer. When the consumer stops early, i.e. raises or closes the
+    generator, the thread stops and closes iterable within POLL seconds.
+    """
+    queue = Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # False if the consumer stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put(item):
+                    break
+            else:
+                put(_END)
+        except BaseException:
+            put(_Failure(sys.exc_info()))
+        finally:
+            # e.g. closes the input file of read_chunks or the thread of
+            # a nested stage
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    t = threading.Thread(target=run)
+    t.daemon = True
+    t.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc_info[0], item.exc_info[1], item.exc_info[2]
+            yield item
+        t.join()
+    finally:
+        stop.set()
+
+
+class Writer(object):
+    """
+    File-like object that writes to fout in a thread of its own. Strings
+    are joined to chunks of about CHUNK_BYTES.
+    """
+
+    def __init__(self, fout, maxsize=8):
+        self.fout = fout
+        self.buf = []
+        self.nbytes = 0
+        self.queue = Queue(maxsize)
+        self.failure = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            if self.failure is None:
+                try:
+                    self.fout.write(item)
+                except BaseException:
+                    self.failure = _Failure(sys.exc_info())
+
+    def write(self, s):
+        self.buf.append(s)
+        self.nbytes += len(s)
+        if self.nbytes >= CHUNK_BYTES:
+            self.queue.put(''.join(self.buf))
+            self.buf = []
+            self.nbytes = 0
+
+    def close(self):
+        """
+        Write remaining strings and wait for the thread, fout stays open
+        """
+        if self.buf:
+            self.queue.put(''.join(self.buf))
+            self.buf = []
+        self.queue.put(_END)
+        self.thread.join()
+        if self.failure is not None:
+            exc_info = self.failure.exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
@@ -1,10 +1,321 @@
 import logging
+from itertools import imap
+from multiprocessing import Pool, current_process
+import numpy as np
+import scipy.sparse as sp
+
+from tenc import register_postprocessor, available_postprocessors
 
 log = logging.getLogger('tenc')
 
+# Number of entries that are processed at once
+CHUNK_SIZE = 1000000
+
+
+def normalize(X, norm='l2'):
+    """
+    Scale rows of sparse matrix X to unit l1 or l2 norm, see L1Norm and
+    L2Norm
+    """
+    if not norm in ['l1', 'l2']:
+        raise ValueError('Unknown norm (%s)' % norm)
+    return process_matrix(norm, X)
+
+
+def tfidf(X, smooth_idf=True, sublinear_tf=False, norm='l2'):
+    """
+    Tf-idf weighting of sparse count matrix X with items as rows and
+    attributes as columns. Weights are computed as in scikit-learn's
+    TfidfTransformer, by the postprocessors of the tfidf pipeline.
+    """
+    if not norm in ['l1', 'l2', None]:
+        raise ValueError('Unknown norm (%s)' % norm)
+
+    def tfidf_pipeline(shape):
+        stages = [SublinearTf(shape)] if sublinear_tf else []
+        stages.append(Idf(shape, None if smooth_idf else 'raw'))
+        if norm is not None:
+            stages.append({'l1': L1Norm, 'l2': L2Norm}[norm](shape))
+        return Pipeline(shape, stages)
+
+    return process_matrix(tfidf_pipeline, X)
+
+
+class Postprocessor(object):
+    """
+    Base class for postprocessors of sparse matrices. Statistics are
+    collected chunk by chunk in partial_fit, transform then computes the
+    new values for a chunk of (rows, cols, vals). Entries are never removed
+    but set to zero, so that chunks keep their layout.
+
+    Parameter
+    ---------
+    shape: shape of the matrix
+    arg: optional argument, given as name:arg in a pipeline specification
+    """
+
+    # postprocessors without statistics do not need a pass over the data
+    stateless = False
+
+    def __init__(self, shape, arg=None):
+        self.shape = shape
+        self.arg = arg
+
+    def fit(self, chunks):
+        """
+        Collect statistics, chunks is a callable that returns an iterator
+        over (rows, cols, vals) chunks
+        """
+        self.reset()
+        for rows, cols, vals in chunks():
+            self.partial_fit(rows, cols, vals)
+        self.fitted()
+        return self
+
+    def reset(self):
+        pass
+
+    def partial_fit(self, rows, cols, vals):
+        pass
+
+    def fitted(self):
+        pass
+
+    def transform(self, rows, cols, vals):
+        raise NotImplementedError()
+
+
+class Pipeline(Postprocessor):
+    """
+    Chain of postprocessors, each stage is fit on the output of the
+    previous stages
+    """
+
+    def __init__(self, shape, stages):
+        Postprocessor.__init__(self, shape)
+        self.stages = stages
+        self.stateless = all(s.stateless for s in stages)
+
+    def fit(self, chunks):
+        for i, stage in enumerate(self.stages):
+            if not stage.stateless:
+                stage.fit(_transformed(chunks, self.stages[:i]))
+        return self
+
+    def transform(self, rows, cols, vals):
+        for stage in self.stages:
+            vals = stage.transform(rows, cols, vals)
+        return vals
+
+
+def _transformed(chunks, stages):
+    def _chunks():
+        for rows, cols, vals in chunks():
+            for stage in stages:
+                vals = stage.transform(rows, cols, vals)
+            yield rows, cols, vals
+    return _chunks
+
+
+def pipeline(spec, shape):
+    """
+    Create pipeline from a comma separated list of postprocessor names,
+    e.g. 'colcap:0.3,tfidf'. Arguments are separated by colons.
+    """
+    if not isinstance(spec, basestring):
+        spec = ','.join(spec)
+    stages = []
+    for name in spec.split(','):
+        name, _, arg = name.strip().partition(':')
+        if not name in available_postprocessors:
+            raise ValueError('Unknown postprocessor (%s)' % name)
+        stages.append(available_postprocessors[name][0](shape, arg or None))
+    return Pipeline(shape, stages)
+
+
+def process_matrix(spec, X, chunk_size=CHUNK_SIZE):
+    """
+    Run pipeline spec on sparse matrix X chunk-wise, returns a CSR matrix.
+    spec is a pipeline specification or a callable that creates the
+    pipeline for the shape of X.
+    """
+    log.debug('Running %s postprocessing' % getattr(spec, '__name__', spec))
+    X = sp.coo_matrix(X, dtype=np.double)
+    X.sum_duplicates()
+
+    def chunks():
+        for i in xrange(0, X.nnz, chunk_size):
+            yield X.row[i:i + chunk_size], X.col[i:i + chunk_size], X.data[i:i + chunk_size]
+
+    p = (spec(X.shape) if callable(spec) else pipeline(spec, X.shape)).fit(chunks)
+    vals = np.concatenate([p.transform(r, c, v) for r, c, v in chunks()] or [X.data])
+    X = sp.coo_matrix((vals, (X.row, X.col)), shape=X.shape).tocsr()
+    X.eliminate_zeros()
+    return X
+
+
+def _process_slice(args):
+    spec, shape, rows, cols, vals = args
+    chunks = lambda: [(rows, cols, vals)]
+    return pipeline(spec, shape).fit(chunks).transform(rows, cols, vals)
+
+
+def process_slices(spec, rows, cols, slices, vals, shape, processes=1):
+    """
+    Run pipeline spec independently on every frontal slice of a tensor.
+    Slices are processed in parallel when processes > 1.
+
+    Parameter
+    ---------
+    spec: pipeline specification
+    rows, cols, slices: subscripts of the tensor entries
+    vals: values of the tensor entries
+    shape: shape of a single slice
+    processes: number of worker processes
+
+    Returns the new values in the order of the input
+    """
+    log.debug('Running %s postprocessing on tensor slices' % spec)
+    order = np.argsort(slices, kind='mergesort')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(slices))))
+    idx = [order[bounds[k]:bounds[k + 1]] for k in xrange(len(bounds) - 1)]
+    tasks = ((spec, shape, rows[i], cols[i], vals[i]) for i in idx)
+
+    out = np.zeros(len(vals), dtype=np.double)
+    if processes > 1 and current_process().daemon:
+        # e.g. in a pool worker, which can not have children
+        log.warn('Processing slices in a daemonic process, not in %d processes' % processes)
+        processes = 1
+    if processes <= 1:
+        for i, v in zip(idx, imap(_process_slice, tasks)):
+            out[i] = v
+        return out
+    pool = Pool(processes)
+    try:
+        for i, v in zip(idx, pool.imap(_process_slice, tasks)):
+            out[i] = v
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return out
+
+
+@register_postprocessor('log')
+class LogScale(Postprocessor):
+    stateless = True
+
+    def transform(self, rows, cols, vals):
+        return np.log1p(vals)
+
+
+class SublinearTf(Postprocessor):
+    """
+    Replace counts tf by 1 + log(tf)
+    """
+    stateless = True
+
+    def transform(self, rows, cols, vals):
+        vals = np.array(vals, dtype=np.double)
+        nz = vals > 0
+        vals[nz] = np.log(vals[nz]) + 1
+        return vals
+
+
+@register_postprocessor('idf')
+class Idf(Postprocessor):
+    """
+    Inverse document frequency, idf:raw computes it without smoothing
+    """
+
+    def reset(self):
+        self.df = np.zeros(self.shape[1])
+
+    def partial_fit(self, rows, cols, vals):
+        self.df += np.bincount(cols[vals != 0], minlength=self.shape[1])
+
+    def fitted(self):
+        if self.arg == 'raw':
+            self.idf = np.log(self.shape[0] / np.maximum(self.df, 1)) + 1.0
+        else:
+            self.idf = np.log((1.0 + self.shape[0]) / (1.0 + self.df)) + 1.0
+
+    def transform(self, rows, cols, vals):
+        return vals * self.idf[cols]
+
+
+class RowNorm(Postprocessor):
+    """
+    Scale rows to unit norm
+    """
+
+    def reset(self):
+        self.norms = np.zeros(self.shape[0])
+
+    def partial_fit(self, rows, cols, vals):
+        self.norms += np.bincount(rows, weights=self.weights(vals), minlength=self.shape[0])
+
+    def fitted(self):
+        self.norms = self.finish(self.norms)
+        self.norms[self.norms == 0] = 1
+
+    def transform(self, rows, cols, vals):
+        return vals / self.norms[rows]
+
+
+@register_postprocessor('l1')
+class L1Norm(RowNorm):
+    weights = staticmethod(np.abs)
+    finish = staticmethod(lambda n: n)
+
+
+@register_postprocessor('l2')
+class L2Norm(RowNorm):
+    weights = staticmethod(np.square)
+    finish = staticmethod(np.sqrt)
+
+
+@register_postprocessor('tfidf')
+class TfIdf(Pipeline):
+
+    def __init__(self, shape, arg=None):
+        Pipeline.__init__(self, shape, [Idf(shape), L2Norm(shape)])
+
+
+@register_postprocessor('degree')
+class DegreeNorm(Postprocessor):
+
+    def reset(self):
+        self.out_deg = np.zeros(self.shape[0])
+        self.in_deg = np.zeros(self.shape[1])
+
+    def partial_fit(self, rows, cols, vals):
+        self.out_deg += np.bincount(rows, weights=np.abs(vals), minlength=self.shape[0])
+        self.in_deg += np.bincount(cols, weights=np.abs(vals), minlength=self.shape[1])
+
+    def fitted(self):
+        self.out_deg[self.out_deg == 0] = 1
+        self.in_deg[self.in_deg == 0] = 1
+        self.out_deg = np.sqrt(self.out_deg)
+        self.in_deg = np.sqrt(self.in_deg)
+
+    def transform(self, rows, cols, vals):
+        return vals / (self.out_deg[rows] * self.in_deg[cols])
+
+
+@register_postprocessor('colcap')
+class ColumnCap(Postprocessor):
+
+    def reset(self):
+        self.df = np.zeros(self.shape[1])
+
+    def partial_fit(self, rows, cols, vals):
+        self.df += np.bincount(cols[vals != 0], minlength=self.shape[1])
+
+    def fitted(self):
+        cap = float(self.arg) if self.arg is not None else 0.5
+        self.keep = self.df <= cap * self.shape[0]
+        log.debug('Capped columns %d -> %d (max fraction: %s)' % (len(self.df), self.keep.sum(), cap))
 
-def tfidf(X):
-    logging.debug('Running tf-idf postprocessing')
-    from sklearn.feature_extraction.text import TfidfTransformer
-    t = TfidfTransformer(use_idf=True, smooth_idf=True)
-    return t.fit_transform(X)
+    def transform(self, rows, cols, vals):
+        return np.where(self.keep[cols], vals, 0)
@@ -0,0 +1,132 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Orderings of pruned entity ids that improve the locality of the tensor
+slices:
+
+  degree:    by decreasing number of occurrences
+  rcm:       reverse Cuthill-McKee over the union of all slices
+  attribute: grouped by the most frequent attribute of an entity, by
+             decreasing number of occurrences within a group
+
+An ordering is an array with the old ids in their new order, see
+ArchiveReader.reorder for how it is applied.
+"""
+
+import logging
+from contextlib import closing
+import numpy as np
+
+from tenc import MAP
+from tenc._tenc import read_blocks
+
+log = logging.getLogger('tenc.reorder')
+
+
+def read_edges(reader):
+    """
+    Pruned subjects and objects of all triples of reader
+    """
+    subs, objs = [], []
+    with closing(reader.member(reader.arc.SUBS_FOUT, reader.arc.SUBS_SUFFIX)) as fin:
+        for block in read_blocks(fin, 4):
+            s = reader.eremap[block[:, 0].astype(np.int)]
+            o = reader.eremap[block[:, 1].astype(np.int)]
+            p = reader.premap[block[:, 2].astype(np.int)]
+            keep = (s >= 0) & (o >= 0) & (p >= 0)
+            subs.append(s[keep])
+            objs.append(o[keep])
+    if not subs:
+        return np.zeros(0, dtype=np.int), np.zeros(0, dtype=np.int)
+    return np.concatenate(subs), np.concatenate(objs)
+
+
+def degree_order(reader, edges):
+    return np.argsort(-reader.nnz[MAP.ENTITY], kind='mergesort')
+
+
+def rcm_order(reader, edges):
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+    N = len(reader.nnz[MAP.ENTITY])
+    s, o = edges
+    A = coo_matrix((np.ones(len(s), dtype=np.int8), (s, o)), shape=(N, N)).tocsr()
+    return reverse_cuthill_mckee(A + A.T, symmetric_mode=True).astype(np.int)
+
+
+def _best_attributes(e, a, v):
+    # row of the most frequent attribute of every entity, the smallest
+    # attribute id on ties
+    order = np.lexsort((a, -v, e))
+    e, a, v = e[order], a[order], v[order]
+    first = np.ones(len(e), dtype=np.bool)
+    first[1:] = e[1:] != e[:-1]
+    return e[first], a[first], v[first]
+
+
+def attribute_order(reader, edges):
+    N = len(reader.nnz[MAP.ENTITY])
+    # most frequent attribute of every entity, entities without attributes last
+    group = np.empty(N, dtype=np.int)
+    group.fill(np.iinfo(np.int).max)
+    best = [np.zeros(0, dtype=np.int)] * 2 + [np.zeros(0)]
+    for subs, vals in reader.entity_attribute_chunks():
+        keep = vals >= 0
+        rows = (subs[keep, 0].astype(np.int), subs[keep, 1].astype(np.int), vals[keep])
+        # the best rows so far compete with the ones of the chunk
+        best = _best_attributes(*[np.concatenate(c) for c in zip(best, rows)])
+    group[best[0]] = best[1]
+    return np.lexsort((-reader.nnz[MAP.ENTITY], group))
+
+
+ORDERINGS = {
+    'degree': degree_order,
+    'rcm': rcm_order,
+    'attribute': attribute_order,
+}
+
+
+def locality(edges, position=None):
+    """
+    Bandwidth and mean id distance |s - o| of edges, after mapping ids to
+    position if given
+    """
+    s, o = edges
+    if position is not None:
+        s, o = position[s], position[o]
+    if len(s) == 0:
+        return {'bandwidth': 0, 'mean_distance': 0.0}
+    d = np.abs(s - o)
+    return {'bandwidth': int(d.max()), 'mean_distance': float(d.mean())}
+
+
+def order_entities(reader, name):
+    """
+    New ids of pruned entities for ordering name. Logs the locality of the
+    tensor before and after reordering.
+    """
+    if not name in ORDERINGS:
+        raise ValueError('Unknown ordering (%s)' % name)
+    edges = read_edges(reader)
+    order = ORDERINGS[name](reader, edges)
+    position = np.empty(len(order), dtype=np.int)
+    position[order] = np.arange(len(order))
+    before, after = locality(edges), locality(edges, position)
+    log.info('Reordered entities by %s: bandwidth %d -> %d, mean id distance %.1f -> %.1f' % (
+        name, before['bandwidth'], after['bandwidth'], before['mean_distance'], after['mean_distance']
+    ))
+    return position
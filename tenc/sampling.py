@@ -0,0 +1,253 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Train/validation/test splits and negative sampling for tensor
+factorization. Triples are handled as integer arrays of shape (n, 3) with
+columns (subject, predicate, object), as yielded by Serializer.relations.
+"""
+
+import logging
+import numpy as np
+
+from tenc import MAP
+from tenc._tenc import TZArchive
+from tenc.serializer import ArchiveReader
+
+log = logging.getLogger('tenc.sampling')
+
+SPLIT_MODES = ['random', 'stratified', 'entity']
+
+
+def load_triples(fname, min_count=(1, 1)):
+    """
+    Read pruned subscripts of archive fname
+
+    Returns
+    -------
+    subs: array of shape (nnz, 3) with columns subject, predicate, object
+    vals: array of values
+    shape: (N, K)
+    """
+    reader = ArchiveReader(TZArchive(fname, 'r:bz2'), min_count)
+    chunks = [np.array(c, dtype=np.double) for c in reader.relation_chunks()]
+    triples = np.concatenate(chunks) if chunks else np.zeros((0, 4))
+    shape = (len(reader.nnz[MAP.ENTITY]), len(reader.nnz[MAP.PREDICATE]))
+    return triples[:, :3].astype(np.int), triples[:, 3], shape
+
+
+def _cut(fractions):
+    fractions = np.asarray(fractions, dtype=np.double)
+    if (fractions < 0).any() or abs(fractions.sum() - 1) > 1e-8:
+        raise ValueError('Fractions of splits must be non-negative and sum to 1 (%s)' % fractions)
+    return np.cumsum(fractions)[:-1]
+
+
+def split(subs, fractions=(0.8, 0.1, 0.1), mode='random', seed=0):
+    """
+    Split triples into disjoint parts
+
+    Parameter
+    ---------
+    subs: array of shape (n, 3) with columns subject, predicate, object
+    fractions: fraction of triples for each part, e.g. train/valid/test
+    mode: 'random'     - uniform split of all triples
+          'stratified' - every predicate is split according to fractions
+          'entity'     - entities are split according to fractions, a
+                         triple goes to the part of its entities. Triples
+                         between entities of different parts are dropped,
+                         hence parts do not share any entities.
+    seed: seed of the random number generator
+
+    Returns list of index arrays, one for each part
+    """
+    rng = np.random.RandomState(seed)
+    cuts = _cut(fractions)
+    n = len(subs)
+    if mode == 'random':
+        perm = rng.permutation(n)
+        part = np.empty(n, dtype=np.int)
+        part[perm] = np.searchsorted(cuts * n, np.arange(n), side='right')
+    elif mode == 'stratified':
+        # random order within predicates, then cut every predicate
+        perm = rng.permutation(n)
+        perm = perm[np.argsort(subs[perm, 1], kind='mergesort')]
+        counts = np.bincount(subs[:, 1])
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        p = subs[perm, 1]
+        rank = (np.arange(n) - starts[p]) / counts[p].astype(np.double)
+        part = np.empty(n, dtype=np.int)
+        part[perm] = np.searchsorted(cuts, rank, side='right')
+    elif mode == 'entity':
+        N = subs[:, [0, 2]].max() + 1 if n > 0 else 0
+        eperm = rng.permutation(N)
+        epart = np.empty(N, dtype=np.int)
+        epart[eperm] = np.searchsorted(cuts * N, np.arange(N), side='right')
+        part = epart[subs[:, 0]]
+        cross = part != epart[subs[:, 2]]
+        part[cross] = -1
+        log.info('Dropped %d of %d triples between entities of different parts' % (cross.sum(), n))
+    else:
+        raise ValueError('Unknown split mode (%s)' % mode)
+    return [np.flatnonzero(part == i) for i in xrange(len(cuts) + 1)]
+
+
+class SortedIndex(object):
+    """
+    Sorted neighbor arrays for pairs (a, b) -> c, e.g. (subject, predicate)
+    -> objects. Membership of triples is checked with binary search.
+
+    Parameter
+    ---------
+    a, b, c: integer arrays of equal length
+    nb: number of distinct values of b
+    nc: number of distinct values of c
+    """
+
+    def __init__(self, a, b, c, nb, nc):
+        self.nb, self.nc = nb, nc
+        pairs = a.astype(np.int64) * nb + b
+        order = np.lexsort((c, pairs))
+        pairs = pairs[order]
+        first = np.ones(len(pairs), dtype=np.bool)
+        first[1:] = pairs[1:] != pairs[:-1]
+        # unique pairs and their neighbors as keys rank * nc + c
+        self.pairs = pairs[first]
+        rank = np.cumsum(first) - 1
+        self.keys = rank * np.int64(nc) + c[order]
+
+    def _rank(self, a, b):
+        pairs = a.astype(np.int64) * self.nb + b
+        rank = np.searchsorted(self.pairs, pairs)
+        found = rank < len(self.pairs)
+        found[found] = self.pairs[rank[found]] == pairs[found]
+        return rank, found
+
+    def neighbors(self, a, b):
+        """
+        Sorted array of all c for pair (a, b)
+        """
+        rank, found = self._rank(np.array([a]), np.array([b]))
+        if not found[0]:
+            return np.zeros(0, dtype=np.int64)
+        lo, hi = np.searchsorted(self.keys, [rank[0] * self.nc, (rank[0] + 1) * self.nc])
+        return self.keys[lo:hi] - rank[0] * self.nc
+
+    def contains(self, a, b, c):
+        """
+        Boolean array, True where (a, b, c) is in the index
+        """
+        rank, found = self._rank(a, b)
+        keys = rank * np.int64(self.nc) + c
+        pos = np.searchsorted(self.keys, keys)
+        found &= pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        return found
+
+
+class NegativeSampler(object):
+    """
+    Creates negative triples by corrupting subjects or objects of positive
+    triples.
+
+    Parameter
+    ---------
+    subs: array of shape (n, 3) of all known triples, used for filtering
+    shape: (N, K)
+    filtered: do not return corrupted triples that are known triples
+    seed: seed of the random number generator
+    """
+
+    # number of rounds to redraw corrupted triples that are positives
+    max_tries = 10
+
+    def __init__(self, subs, shape, filtered=True, seed=0):
+        self.N, self.K = shape
+        self.filtered = filtered
+        self.rng = np.random.RandomState(seed)
+        if filtered:
+            s, p, o = subs[:, 0], subs[:, 1], subs[:, 2]
+            self.objects = SortedIndex(s, p, o, self.K, self.N)
+            self.subjects = SortedIndex(o, p, s, self.K, self.N)
+
+    def is_positive(self, subs):
+        return self.objects.contains(subs[:, 0], subs[:, 1], subs[:, 2])
+
+    def corrupt(self, subs, corrupt='both'):
+        """
+        One corrupted triple for every triple in subs
+
+        Parameter
+        ---------
+        corrupt: 'subject', 'object' or 'both' (chosen at random per triple)
+        """
+        neg = subs.copy()
+        if corrupt == 'both':
+            col = np.where(self.rng.randint(2, size=len(subs)) == 0, 0, 2)
+        elif corrupt in ['subject', 'object']:
+            col = np.empty(len(subs), dtype=np.int)
+            col.fill(0 if corrupt == 'subject' else 2)
+        else:
+            raise ValueError('Unknown corruption (%s)' % corrupt)
+        todo = np.arange(len(subs))
+        for _ in xrange(self.max_tries):
+            neg[todo, col[todo]] = self.rng.randint(self.N, size=len(todo))
+            if not self.filtered:
+                break
+            todo = todo[self.is_positive(neg[todo])]
+            if len(todo) == 0:
+                break
+        if self.filtered and len(todo) > 0:
+            log.debug('Could not find negatives for %d triples' % len(todo))
+        return neg
+
+    def batches(self, subs, batch_size=1000, negatives=1, corrupt='both', shuffle=True):
+        """
+        Iterator over batches of positive triples and their corrupted
+        triples. Each batch is a tuple (pos, neg), where neg holds
+        negatives corrupted copies of pos.
+        """
+        order = self.rng.permutation(len(subs)) if shuffle else np.arange(len(subs))
+        for i in xrange(0, len(subs), batch_size):
+            pos = subs[order[i:i + batch_size]]
+            neg = np.concatenate([self.corrupt(pos, corrupt) for _ in xrange(negatives)])
+            yield pos, neg
+
+
+def split_archive(fname, min_count=(1, 1), fractions=(0.8, 0.1, 0.1), mode='random',
+                  seed=0, negatives=0, prefix=None):
+    """
+    Split pruned archive fname and write the parts to %(prefix)s-split.npz.
+    When negatives > 0, negatives corrupted triples for each training
+    triple are written to %(prefix)s-negatives.npz.
+    """
+    from tenc._tenc import fjoin
+    prefix = fname if prefix is None else prefix
+    subs, vals, shape = load_triples(fname, min_count)
+    parts = split(subs, fractions, mode, seed)
+    names = ['train', 'valid', 'test'] if len(parts) == 3 else ['part%d' % i for i in xrange(len(parts))]
+    out = {'shape': np.array(shape)}
+    for name, idx in zip(names, parts):
+        log.debug('Split %s: %d triples' % (name, len(idx)))
+        out[name + '_subs'] = subs[idx]
+        out[name + '_vals'] = vals[idx]
+    np.savez(fjoin('split', 'npz', prefix), **out)
+
+    if negatives > 0:
+        sampler = NegativeSampler(subs, shape, seed=seed)
+        train = subs[parts[0]]
+        neg = [n for _, n in sampler.batches(train, negatives=negatives, shuffle=False)]
+        np.savez(fjoin('negatives', 'npz', prefix), subs=np.concatenate(neg) if neg else np.zeros((0, 3)))
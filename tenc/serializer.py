@@ -1,55 +1,222 @@
 import logging
+import sys
+import os
+import struct
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from contextlib import closing
+from Queue import Queue
 import numpy as np
 from scipy.io.matlab import savemat
 from scipy.sparse import coo_matrix
 
 from tenc import MAP, register_serializer
-from _tenc import TZArchive, Counter
-from _tenc import fjoin, write_tensor_index, read_tensor_size, prune
+from _tenc import TZArchive
+from _tenc import fjoin, write_remap_index, read_tensor_size, prune
+from _tenc import remap_array, read_blocks, index_dtype, value_dtype, cast_values
 # setup logging
 log = logging.getLogger('serializer')
 
+# Number of tuples that are passed between reader and serializers at once
+CHUNK_SIZE = 10000
+
+# Order in which the members of an archive are read
+SECTIONS = ['relations', 'eattr', 'rattr']
+
+# Postprocessing pipelines for tensor, entity and predicate attributes
+DEFAULT_POSTPROCESS = {'tensor': None, 'eattr': 'tfidf', 'rattr': 'tfidf'}
+
+
+class ArchiveReader(object):
+    """
+    Reads subscripts and attributes from a tensor archive and applies
+    pruning. Every member is decompressed and parsed once, chunks of pruned
+    tuples are handed to the serializers. arc can also be a Converter that
+    has not compressed its members yet, see Serializer.read_from.
+    """
+
+    def __init__(self, arc, min_count, order=None):
+        self.arc = arc
+        self.meta = arc.metadata()
+        with closing(self.member(arc.SUBS_FOUT, arc.SHAPE_SUFFIX)) as fin:
+            N, K, self.nnz = read_tensor_size(fin)
+        self.eidx = prune(min_count[0], self.nnz[MAP.ENTITY], N, 'entity')
+        self.pidx = prune(min_count[1], self.nnz[MAP.PREDICATE], K, 'predicate')
+        self.nnz[MAP.PREDICATE] = self.nnz[MAP.PREDICATE][sorted(self.pidx.keys())]
+        self.nnz[MAP.ENTITY] = self.nnz[MAP.ENTITY][sorted(self.eidx.keys())]
+        self.eremap = remap_array(self.eidx, N)
+        self.premap = remap_array(self.pidx, K)
+        if order is not None:
+            self.reorder(order)
+
+    def reorder(self, name):
+        """
+        Permute pruned entity ids by ordering name, see tenc.reorder
+        """
+        from tenc.reorder import order_entities
+        position = order_entities(self, name)
+        self.eidx = dict((k, int(position[v])) for k, v in self.eidx.iteritems())
+        keep = self.eremap >= 0
+        self.eremap[keep] = position[self.eremap[keep]]
+        nnz = np.empty_like(self.nnz[MAP.ENTITY])
+        nnz[position] = self.nnz[MAP.ENTITY]
+        self.nnz[MAP.ENTITY] = nnz
+
+    def member(self, fname, suffix):
+        # callers close the file, e.g. with closing
+        return self.arc.member(fjoin(fname, suffix))
+
+    def relation_chunks(self):
+        """
+        Chunks of (s, p, o, val) tuples for all triples that involve entities
+        and predicates that have not been pruned
+        """
+        eidx, pidx = self.eidx, self.pidx
+        chunk = []
+        with closing(self.member(self.arc.SUBS_FOUT, self.arc.SUBS_SUFFIX)) as fin:
+            for line in fin:
+                s, o, p, val = line.split()
+                s, o, p, val = int(s), int(o), int(p), float(val)
+                # check if pruned
+                if p in pidx and s in eidx and o in eidx:
+                    chunk.append((eidx[s], pidx[p], eidx[o], val))
+                    if len(chunk) == CHUNK_SIZE:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    def attribute_chunks(self, fname, remap):
+        """
+        Chunks of (item, attribute) subscripts and values for all items of
+        attribute member fname that have not been pruned. Each chunk is a
+        tuple of an integer array of shape (n, 2) and a value array of
+        length n.
+        """
+        with closing(self.member(fname, self.arc.ATTR_SUFFIX)) as fin:
+            for block in read_blocks(fin, 3):
+                items = remap[block[:, 0].astype(np.int)]
+                keep = items >= 0
+                subs = np.column_stack((items[keep], block[keep, 1].astype(np.int)))
+                yield subs, block[keep, 2]
+
+    def entity_attribute_chunks(self):
+        return self.attribute_chunks(self.arc.ENTITIES_FOUT, self.eremap)
+
+    def predicate_attribute_chunks(self):
+        return self.attribute_chunks(self.arc.PREDICATES_FOUT, self.premap)
+
+    def sections(self):
+        return zip(SECTIONS, [
+            self.relation_chunks,
+            self.entity_attribute_chunks,
+            self.predicate_attribute_chunks
+        ])
+
 
 class Serializer(TZArchive):
 
-    fin_subs = None
-    fin_eattr = None
-    fin_rattr = None
+    source = None
+    converter = None
     eidx = None
     pidx = None
+    eremap = None
+    premap = None
     nnz = None
 
-    def __init__(self, fname='tensor', attr_map={}):
-        TZArchive.__init__(self, fname, 'r:bz2')
+    def __init__(self, fname='tensor', attr_map={}, postprocess=None, processes=1, order=None, values=None):
+        # the archive is opened on first access, such that serializers that
+        # read from a converter do not need one
+        self.fname = fname
+        self._arc = None
         self.attr_map = attr_map
+        self.order = order
+        # value dtype, defaults to the one of the archive, see VALUE_DTYPES
+        self.values = values
+        self.postprocess = dict(DEFAULT_POSTPROCESS)
+        self.postprocess.update(postprocess or {})
+        self.processes = processes
+
+    def __del__(self):
+        if self._arc is not None:
+            self._arc.close()
+
+    @property
+    def arc(self):
+        if self._arc is None:
+            log.debug('Opening archive %s' % self.fname)
+            self._arc = tarfile.open(fjoin(self.fname, self.ARC_SUFFIX), 'r:bz2')
+        return self._arc
+
+    def read_from(self, converter):
+        """
+        Read members from converter, i.e. from the uncompressed files of a
+        conversion, instead of the archive
+        """
+        self.converter = converter
 
-    def write_prune_idx(self, idx, fname):
+    def member(self, name):
+        if self.converter is not None:
+            return self.converter.member(name)
+        return TZArchive.member(self, name)
+
+    def metadata(self):
+        if self.converter is not None:
+            return self.converter.metadata()
+        return TZArchive.metadata(self)
+
+    def write_prune_idx(self, remap, fname):
         pout = open(fjoin(fname + '_pruned', self.MAP_SUFFIX, self.fname), 'wb')
-        write_tensor_index(pout, idx, sort=True)
+        write_remap_index(pout, remap)
         pout.close()
 
-    def serialize(self, min_count):
-        # open archive
-        N, K, self.nnz = read_tensor_size(self.arc.extractfile(
-            fjoin(self.SUBS_FOUT, self.SHAPE_SUFFIX)
-        ))
+    def write_pruned_indexes(self):
+        # write pruned predicates index
+        self.write_prune_idx(self.premap, self.PREDICATES_FOUT)
+        # write pruned entities index
+        self.write_prune_idx(self.eremap, self.ENTITIES_FOUT)
 
-        # extract files for subscripts and attributes
-        self.fin_subs = self.arc.extractfile(fjoin(self.SUBS_FOUT, self.SUBS_SUFFIX))
-        self.fin_eattr = self.arc.extractfile(fjoin(self.ENTITIES_FOUT, self.ATTR_SUFFIX))
-        self.fin_rattr = self.arc.extractfile(fjoin(self.PREDICATES_FOUT, self.ATTR_SUFFIX))
+    def attach(self, source):
+        """
+        Read pruned subscripts and attributes from source, i.e. an
+        ArchiveReader or a channel of a fan-out
+        """
+        self.source = source
+        self.eidx = source.eidx
+        self.pidx = source.pidx
+        self.eremap = source.eremap
+        self.premap = source.premap
+        self.nnz = source.nnz
 
-        self.eidx = prune(min_count[0], self.nnz[MAP.ENTITY], N, 'entity')
-        self.pidx = prune(min_count[1], self.nnz[MAP.PREDICATE], K, 'predicate')
-        self.nnz[MAP.PREDICATE] = self.nnz[MAP.PREDICATE][self.pidx.keys()]
-        self.nnz[MAP.ENTITY] = self.nnz[MAP.ENTITY][self.eidx.keys()]
+    @staticmethod
+    def parse_arg(arg):
+        """
+        Options of a serializer from the argument of its name, e.g.
+        shards:grid:16
+        """
+        if arg:
+            raise ValueError('Serializer takes no arguments (%s)' % arg)
+        return {}
 
-        self.write()
+    def configure(self, arg):
+        self.__dict__.update(self.parse_arg(arg))
 
-        # write pruned predicates index
-        self.write_prune_idx(self.pidx, self.PREDICATES_FOUT)
-        # write pruned entities index
-        self.write_prune_idx(self.eidx, self.ENTITIES_FOUT)
+    def dtypes(self):
+        """
+        Narrowest dtype for subscripts of the pruned tensor and dtype of its
+        values, None for implicit ones
+        """
+        N, K = len(self.nnz[MAP.ENTITY]), len(self.nnz[MAP.PREDICATE])
+        values = self.values or self.source.meta.get('values', 'float64')
+        return index_dtype(max(N, K)), value_dtype(values)
+
+    def serialize(self, min_count):
+        self.attach(ArchiveReader(self, min_count, self.order))
+        self.write()
+        self.write_pruned_indexes()
 
     def write(self):
         raise NotImplementedError()
@@ -59,110 +226,314 @@ class Serializer(TZArchive):
         Iterator over all triples that involve entities and predicates that
         have not been pruned
         """
-        s, o, p, val = 0, 0, 0, 0.0
-        for line in self.fin_subs:
-            s, o, p, val = line.strip().split()
-            s, o, p, val = int(s), int(o), int(p), float(val)
-            # check if pruned
-            if p in self.pidx and s in self.eidx and o in self.eidx:
-                yield (self.eidx[s], self.pidx[p], self.eidx[o], val)
-
-    @staticmethod
-    def attributes(fin, keep_idx):
-        """
-        Iterator over item, attribute tuples for all items that have not been pruned
-        """
-        for line in fin:
-            e, a, v = line.strip().split()
-            e, a, v = int(e), int(a), float(v)
-            if e in keep_idx:
-                yield (keep_idx[e], a, v)
+        for chunk in self.source.relation_chunks():
+            for t in chunk:
+                yield t
 
     def entity_attributes(self):
         """
         Iterator over entity, attribute tuples for all entities that have not been pruned
         """
-        for a in self.attributes(self.fin_eattr, self.eidx):
-            yield a
+        for subs, vals in self.source.entity_attribute_chunks():
+            for (e, a), v in zip(subs.tolist(), vals.tolist()):
+                yield e, a, v
 
     def predicate_attributes(self):
         """
         Iterator over predicate, attribute tuples for all predicates that have not been pruned
         """
-        for a in self.attributes(self.fin_rattr, self.pidx):
-            yield a
+        for subs, vals in self.source.predicate_attribute_chunks():
+            for (p, a), v in zip(subs.tolist(), vals.tolist()):
+                yield p, a, v
 
 
-@register_serializer('matlab', '')
+@register_serializer('matlab')
 class Matlab(Serializer):
     """
     Serialize tensor archive in matlab format
     """
 
     def write(self):
-        from postprocess import tfidf
         K = len(self.nnz[MAP.PREDICATE])
         N = len(self.nnz[MAP.ENTITY])
-        nnz_tensor = sum(self.nnz[0])
-        subs = np.zeros((nnz_tensor, 3), dtype=np.int)
-        vals = np.zeros((nnz_tensor, 1), dtype=np.double)
+        idtype, vdtype = self.dtypes()
+        # predicate counts are an upper bound for the number of pruned triples
+        nnz_tensor = int(self.nnz[MAP.PREDICATE].sum())
+        subs = np.zeros((nnz_tensor, 3), dtype=idtype)
+        vals = None
+        if vdtype is not None:
+            # integral values are checked when they are cast, see cast_values
+            vals = np.zeros((nnz_tensor, 1), dtype=np.double if vdtype.kind == 'i' else vdtype)
         offset = 0
         for s, p, o, val in self.relations():
+            # remove zeros
+            if val == 0:
+                continue
             # awesome matlab start-at-1 indexing...
             subs[offset, :] = (s + 1, o + 1, p + 1)
-            vals[offset] = val
+            if vals is not None:
+                vals[offset] = val
             offset += 1
-
-        # remove zeros
-        nnzidx = vals.nonzero()[0]
-        vals = vals[nnzidx]
-        subs = subs[nnzidx, :]
-
-        eattr = self.__create_matlab_attr(self.entity_attributes, N, self.nnz[MAP.EATTR], postprocessor=tfidf)
-        rattr = self.__create_matlab_attr(self.predicate_attributes, K, self.nnz[MAP.RATTR], postprocessor=tfidf)
-
-        log.debug('Writing MATLAB tensor')
-        savemat(fjoin(TZArchive.SUBS_FOUT, 'mat', self.fname), {
+        subs.resize((offset, 3), refcheck=False)
+        if vals is not None:
+            vals.resize((offset, 1), refcheck=False)
+
+        if self.postprocess['tensor'] and vals is None:
+            log.warn('Tensor postprocessing requires values, skipping %s' % self.postprocess['tensor'])
+        elif self.postprocess['tensor']:
+            from postprocess import process_slices
+            pvals = process_slices(self.postprocess['tensor'], subs[:, 0] - 1, subs[:, 1] - 1,
+                                   subs[:, 2] - 1, vals[:, 0].astype(np.double), (N, N), self.processes)
+            # postprocessors remove entries by setting them to zero
+            nnzidx = pvals.nonzero()[0]
+            vals = pvals[nnzidx][:, np.newaxis]
+            subs = subs[nnzidx, :]
+        if vals is not None:
+            vals = cast_values(vals, vdtype)
+
+        eattr = self._create_matlab_attr(self.source.entity_attribute_chunks(), N, self.nnz[MAP.EATTR],
+                                         postprocessor=self.postprocess['eattr'])
+        rattr = self._create_matlab_attr(self.source.predicate_attribute_chunks(), K, self.nnz[MAP.RATTR],
+                                         postprocessor=self.postprocess['rattr'])
+
+        log.debug('Writing MATLAB tensor (subscripts %s, values %s)' % (idtype, vdtype or 'ones'))
+        variables = {
             'subs': subs,
-            'vals': vals,
             'size': (N, N, K),
             'eattr': eattr,
             'rattr': rattr
-        }, oned_as='column')
+        }
+        if vals is not None:
+            variables['vals'] = vals
+        savemat(fjoin(TZArchive.SUBS_FOUT, 'mat', self.fname), variables, oned_as='column')
         return subs, vals
 
-    def __create_matlab_attr(self, attr_generator, N, nnz, min_count=1, postprocessor=None):
-        _subs = np.zeros((nnz, 2), dtype=np.int)
-        _vals = np.zeros(nnz, dtype=np.double)
+    def _create_matlab_attr(self, chunks, N, nnz, min_count=1, postprocessor=None):
+        # nnz of the unpruned attributes is an upper bound for the pruned ones
+        # and for the number of attributes
+        _subs = np.zeros((nnz, 2), dtype=index_dtype(max(N, nnz)))
+        _vals = np.zeros(nnz, dtype=np.float32 if self.dtypes()[1] == np.float32 else np.double)
         offset = 0
-        A = -1
-        for e, a, v in attr_generator():
-            # get number of attributes
-            A = max(a, A)
-            _subs[offset, :] = (e, a)
-            _vals[offset] = v
-            offset += 1
+        for subs, vals in chunks:
+            _subs[offset:offset + len(vals)] = subs
+            _vals[offset:offset + len(vals)] = vals
+            offset += len(vals)
         # handle empty attribute files
-        if A == -1:
+        if offset == 0:
             return []
 
         # normal attribute handling
-        _subs = zip(*_subs.tolist())
-        attr = coo_matrix((_vals, _subs), shape=(N, A + 1))
-
-        # prune attribute
-        c = Counter(attr.nonzero()[1])  # count attibute occurrences
-        idx = [i[0] for i in c.iteritems() if i[1] > min_count]
-        log.debug('Pruned attributes %d -> %d (min_count: %d)' % (attr.shape[1], len(idx), min_count))
+        _subs, _vals = _subs[:offset], _vals[:offset]
+        A = _subs[:, 1].max() + 1
+        attr = coo_matrix((_vals, (_subs[:, 0], _subs[:, 1])), shape=(N, A))
+
+        # prune attributes
+        c = np.bincount(_subs[:, 1], minlength=A)  # count attribute occurrences
+        idx = np.flatnonzero(c > min_count)
+        log.debug('Pruned attributes %d -> %d (min_count: %d)' % (A, len(idx), min_count))
+        del _subs, _vals
         attr = attr.tocsc()[:, idx]
 
         # postprocessing
-        if postprocessor is not None:
-            attr = postprocessor(attr)
+        if postprocessor:
+            from postprocess import process_matrix
+            attr = process_matrix(postprocessor, attr)
         return attr
 
 
-@register_serializer('mln', '')
+class _Mat5Stream(object):
+    """
+    Writes subs and vals of a MATLAB v5 file in chunks. Columns are
+    buffered in temporary files, such that only the header of each variable
+    has to be known when the file is assembled.
+    """
+
+    # MATLAB v5 data types and array classes
+    miINT8, miUINT8, miINT16, miINT32, miUINT32, miSINGLE, miDOUBLE, miINT64, miMATRIX = 1, 2, 3, 5, 6, 7, 9, 12, 14
+    # array class, data type and flags of dtypes, logical arrays are uint8
+    logical = 0x0200
+    classes = {
+        np.dtype(np.int8): (8, miINT8, 0),
+        np.dtype(np.int16): (10, miINT16, 0),
+        np.dtype(np.int32): (12, miINT32, 0),
+        np.dtype(np.int64): (14, miINT64, 0),
+        np.dtype(np.float32): (7, miSINGLE, 0),
+        np.dtype(np.double): (6, miDOUBLE, 0),
+        np.dtype(np.bool_): (9, miUINT8, logical),
+    }
+    # MATLAB refuses to load v5 variables larger than 2GB
+    max_bytes = 2 ** 31 - 1
+
+    def __init__(self, fname, index_dtype, value_dtype=np.double):
+        self.fname = fname
+        self.index_dtype = np.dtype(index_dtype)
+        # no values for implicit ones
+        self.value_dtype = np.dtype(value_dtype) if value_dtype is not None else None
+        ncols = 3 if value_dtype is None else 4
+        self.cols = [tempfile.TemporaryFile(prefix='tenc-') for _ in xrange(ncols)]
+        self.nnz = 0
+
+    def append(self, subs, vals):
+        # fail before streaming data that can not be written
+        nnz = self.nnz + len(subs)
+        self._check('subs', 3 * nnz * self.index_dtype.itemsize)
+        if self.value_dtype is not None:
+            self._check('vals', nnz * self.value_dtype.itemsize)
+        for j in xrange(3):
+            self.cols[j].write(np.ascontiguousarray(subs[:, j]).tostring())
+        if self.value_dtype is not None:
+            self.cols[3].write(cast_values(vals, self.value_dtype).tostring())
+        self.nnz = nnz
+
+    def _check(self, name, nbytes):
+        if nbytes > self.max_bytes:
+            raise ValueError(
+                'Variable %s exceeds the 2GB limit of MATLAB v5 files, install h5py to write v7.3 files' % name
+            )
+
+    @staticmethod
+    def _pad(n):
+        return (8 - n % 8) % 8
+
+    def _write_var(self, fout, name, shape, dtype, files):
+        mx_class, mi_type, flags = self.classes[dtype]
+        nbytes = shape[0] * shape[1] * dtype.itemsize
+        self._check(name, nbytes)
+        size = 16 + 16 + 8 + len(name) + self._pad(len(name)) + 8 + nbytes + self._pad(nbytes)
+        fout.write(struct.pack('<II', self.miMATRIX, size))
+        fout.write(struct.pack('<IIII', self.miUINT32, 8, mx_class | flags, 0))
+        fout.write(struct.pack('<IIii', self.miINT32, 8, shape[0], shape[1]))
+        fout.write(struct.pack('<II', self.miINT8, len(name)) + name + '\0' * self._pad(len(name)))
+        fout.write(struct.pack('<II', mi_type, nbytes))
+        for f in files:
+            f.seek(0)
+            shutil.copyfileobj(f, fout, 1 << 20)
+            f.close()
+        fout.write('\0' * self._pad(nbytes))
+
+    def finish(self, variables):
+        from scipy.io.matlab.mio5 import MatFile5Writer
+        with open(self.fname, 'wb') as fout:
+            text = 'MATLAB 5.0 MAT-file Platform: %s, Created on: %s' % (os.name, time.asctime())
+            fout.write(text.ljust(116)[:116] + '\0' * 8 + struct.pack('<H', 0x0100) + 'IM')
+            self._write_var(fout, 'subs', (self.nnz, 3), self.index_dtype, self.cols[:3])
+            if self.value_dtype is not None:
+                self._write_var(fout, 'vals', (self.nnz, 1), self.value_dtype, self.cols[3:])
+            # remaining variables are small enough for scipy
+            MatFile5Writer(fout, oned_as='column').put_variables(variables, write_header=False)
+
+
+class _Mat73Stream(object):
+    """
+    Writes subs and vals of a MATLAB v7.3 (HDF5) file in chunks. MATLAB
+    stores arrays in column-major order, hence all datasets are transposed.
+    """
+
+    # MATLAB classes of dtypes whose names differ, logical arrays are uint8
+    classes = {'float64': 'double', 'float32': 'single', 'bool': 'logical'}
+
+    def __init__(self, fname, index_dtype, h5py, value_dtype=np.double):
+        self.fname = fname
+        self.h5py = h5py
+        self.f = h5py.File(fname, 'w', userblock_size=512)
+        self.subs = self.f.create_dataset('subs', (3, 0), dtype=index_dtype,
+                                          maxshape=(3, None), chunks=(3, CHUNK_SIZE))
+        self.subs.attrs['MATLAB_class'] = np.string_(np.dtype(index_dtype).name)
+        # no values for implicit ones
+        self.vals = None
+        self.value_dtype = np.dtype(value_dtype) if value_dtype is not None else None
+        if value_dtype is not None:
+            name = np.dtype(value_dtype).name
+            self.vals = self.f.create_dataset('vals', (1, 0), dtype=np.uint8 if name == 'bool' else value_dtype,
+                                              maxshape=(1, None), chunks=(1, CHUNK_SIZE))
+            self.vals.attrs['MATLAB_class'] = np.string_(self.classes.get(name, name))
+        self.nnz = 0
+
+    def append(self, subs, vals):
+        n = len(subs)
+        self.subs.resize((3, self.nnz + n))
+        self.subs[:, self.nnz:self.nnz + n] = subs.T
+        if self.vals is not None:
+            self.vals.resize((1, self.nnz + n))
+            # logicals are stored as uint8, values are cast to bool first
+            self.vals[0, self.nnz:self.nnz + n] = cast_values(vals, self.value_dtype).astype(self.vals.dtype)
+        self.nnz += n
+
+    def _write_var(self, name, value):
+        if isinstance(value, list) and len(value) == 0:
+            ds = self.f.create_dataset(name, data=np.zeros(2, dtype=np.uint64))
+            ds.attrs['MATLAB_class'] = np.string_('double')
+            ds.attrs['MATLAB_empty'] = np.uint8(1)
+        elif hasattr(value, 'tocsc'):
+            value = value.tocsc()
+            grp = self.f.create_group(name)
+            grp.attrs['MATLAB_class'] = np.string_('double')
+            grp.attrs['MATLAB_sparse'] = np.uint64(value.shape[0])
+            grp.create_dataset('data', data=value.data.astype(np.double))
+            grp.create_dataset('ir', data=value.indices.astype(np.uint64))
+            grp.create_dataset('jc', data=value.indptr.astype(np.uint64))
+        else:
+            value = np.atleast_2d(np.asarray(value, dtype=np.double))
+            ds = self.f.create_dataset(name, data=value)
+            ds.attrs['MATLAB_class'] = np.string_('double')
+
+    def finish(self, variables):
+        for name, value in variables.iteritems():
+            self._write_var(name, value)
+        self.f.close()
+        # MATLAB recognizes v7.3 files by the header in the HDF5 userblock
+        with open(self.fname, 'r+b') as fout:
+            text = 'MATLAB 7.3 MAT-file, Platform: %s, Created on: %s HDF5 schema 1.00 .' % (
+                os.name, time.asctime()
+            )
+            fout.write(text.ljust(116)[:116] + '\0' * 8 + struct.pack('<H', 0x0200) + 'IM')
+
+
+@register_serializer('matlab-stream')
+class MatlabStream(Matlab):
+    """
+    Serialize tensor archive in matlab format without creating subs and
+    vals in memory. Writes v7.3 files when h5py is available and v5 files
+    otherwise.
+    """
+
+    def write(self):
+        K = len(self.nnz[MAP.PREDICATE])
+        N = len(self.nnz[MAP.ENTITY])
+        fout = fjoin(TZArchive.SUBS_FOUT, 'mat', self.fname)
+        index_dtype, vdtype = self.dtypes()
+        try:
+            import h5py
+            stream = _Mat73Stream(fout, index_dtype, h5py, vdtype)
+        except ImportError:
+            log.debug('h5py is not available, writing MATLAB v5 file')
+            stream = _Mat5Stream(fout, index_dtype, vdtype)
+
+        if self.postprocess['tensor']:
+            log.warn('Tensor postprocessing is not supported when writing in chunks, skipping %s'
+                     % self.postprocess['tensor'])
+
+        log.debug('Writing MATLAB tensor in chunks')
+        for chunk in self.source.relation_chunks():
+            chunk = np.array(chunk, dtype=np.double)
+            # remove zeros
+            chunk = chunk[chunk[:, 3] != 0]
+            # awesome matlab start-at-1 indexing...
+            subs = (chunk[:, [0, 2, 1]] + 1).astype(index_dtype)
+            stream.append(subs, chunk[:, 3])
+
+        eattr = self._create_matlab_attr(self.source.entity_attribute_chunks(), N, self.nnz[MAP.EATTR],
+                                         postprocessor=self.postprocess['eattr'])
+        rattr = self._create_matlab_attr(self.source.predicate_attribute_chunks(), K, self.nnz[MAP.RATTR],
+                                         postprocessor=self.postprocess['rattr'])
+        stream.finish({
+            'size': (N, N, K),
+            'eattr': eattr,
+            'rattr': rattr
+        })
+
+
+@register_serializer('mln')
 class MarkovLogicSerializer(Serializer):
 
     template = '%s%s(%s,%s)\n'
@@ -186,14 +557,14 @@ class MarkovLogicSerializer(Serializer):
         fout.close()
 
 
-@register_serializer('ntriples', '')
+@register_serializer('ntriples')
 class NTriples(Serializer):
     entity_template = '<file://localhost/%s/%%s>'
     relation_template = '%s %s %s .\n'
     attribute_template = '%s %s "%%s" .\n'
 
-    def __init__(self, fname='tensor', attr_map={}):
-        Serializer.__init__(self, fname, attr_map)
+    def __init__(self, fname='tensor', attr_map={}, postprocess=None, processes=1, order=None, values=None):
+        Serializer.__init__(self, fname, attr_map, postprocess, processes, order, values)
         self.entity_template = self.entity_template % fname
         self.relation_template = self.relation_template % (self.entity_template, self.entity_template, self.entity_template)
         self.attribute_template = self.attribute_template % (self.entity_template, self.entity_template)
@@ -215,7 +586,7 @@ class NTriples(Serializer):
         fout.close()
 
 
-@register_serializer('turtle', '')
+@register_serializer('turtle')
 class Turtle(Serializer):
     relation_template = 'l:%s l:%s l:%s .\n'
     attribute_template = 'l:%s l:%s "%s" .\n'
@@ -237,6 +608,289 @@ class Turtle(Serializer):
             fout.write(self.attribute_template % (enames[e], attr_id, val))
 
 
+# Schemes of the sharding serializer
+SHARD_SCHEMES = ['subject', 'grid', 'predicate']
+
+# Relations of a shard while they are collected, global ids
+_SHARD_RECORD = np.dtype([('s', '<i8'), ('o', '<i8'), ('p', '<i8'), ('val', '<f8')])
+
+
+def _shard_hash(ids, n):
+    # multiplicative hashing, such that consecutive ids spread over shards
+    h = (ids.astype(np.uint64) * np.uint64(2654435761)) & np.uint64(0xffffffff)
+    return (h % np.uint64(n)).astype(np.int)
+
+
+def _write_shard(args):
+    """
+    Write shard with local ids from its collected relations, returns its
+    entry of the manifest
+    """
+    tmp, fout, gdtype, values = args
+    rec = np.fromfile(tmp, dtype=_SHARD_RECORD)
+    os.remove(tmp)
+    n = len(rec)
+    entities, local = np.unique(np.concatenate((rec['s'], rec['o'])), return_inverse=True)
+    predicates, plocal = np.unique(rec['p'], return_inverse=True)
+    ldtype = index_dtype(max(len(entities), len(predicates)))
+    arrays = {
+        'subs': np.column_stack((local[:n], local[n:], plocal)).astype(ldtype),
+        'entities': entities.astype(gdtype),
+        'predicates': predicates.astype(gdtype),
+    }
+    # no values for implicit ones
+    vdtype = value_dtype(values)
+    if vdtype is not None:
+        arrays['vals'] = cast_values(rec['val'], vdtype)
+    np.savez(fout, **arrays)
+    return {'file': os.path.basename(fout), 'nnz': n,
+            'entities': len(entities), 'predicates': len(predicates)}
+
+
+@register_serializer('shards')
+class Shards(Serializer):
+    """
+    Partition the tensor into shards by subject hash, by blocks of a 2D grid
+    over subject and object hashes, or by predicate. Relations are streamed
+    once into one file per shard, then shards are written in parallel to
+    <prefix>-shard-<i>.npz with local subscripts (s, o, p), values and the
+    global ids of their local entities and predicates. <prefix>-shards.json
+    describes the shards.
+    """
+
+    scheme = 'subject'
+    nshards = 8
+
+    @staticmethod
+    def parse_arg(arg):
+        opts = {}
+        for part in (arg or '').split(':'):
+            if part in SHARD_SCHEMES:
+                opts['scheme'] = part
+            elif part.isdigit() and int(part) > 0:
+                opts['nshards'] = int(part)
+            elif part:
+                raise ValueError('Unknown shard option (%s)' % part)
+        n = opts.get('nshards', Shards.nshards)
+        if opts.get('scheme') == 'grid' and int(np.sqrt(n)) ** 2 != n:
+            raise ValueError('Number of shards of a grid must be a square (%d)' % n)
+        return opts
+
+    def assign(self, s, o, p):
+        """
+        Shard of every relation
+        """
+        if self.scheme == 'subject':
+            return _shard_hash(s, self.nshards)
+        if self.scheme == 'grid':
+            g = int(np.sqrt(self.nshards))
+            return _shard_hash(s, g) * g + _shard_hash(o, g)
+        # largest predicates first, each into the shard with fewest relations
+        if not hasattr(self, '_pshard'):
+            counts = np.asarray(self.nnz[MAP.PREDICATE])
+            self._pshard = np.zeros(len(counts), dtype=np.int)
+            load = np.zeros(self.nshards, dtype=np.int64)
+            for k in np.argsort(-counts, kind='mergesort'):
+                self._pshard[k] = load.argmin()
+                load[self._pshard[k]] += counts[k]
+        return self._pshard[p]
+
+    def write(self):
+        tmpdir = tempfile.mkdtemp(prefix='tenc-')
+        try:
+            shards, values = self.write_shards(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        import json
+        manifest = {
+            'scheme': self.scheme,
+            'values': values,
+            'shape': [len(self.nnz[MAP.ENTITY]), len(self.nnz[MAP.ENTITY]), len(self.nnz[MAP.PREDICATE])],
+            # global ids are the ids of the pruned indexes
+            'entities': os.path.basename(fjoin(self.ENTITIES_FOUT + '_pruned', self.MAP_SUFFIX, self.fname)),
+            'predicates': os.path.basename(fjoin(self.PREDICATES_FOUT + '_pruned', self.MAP_SUFFIX, self.fname)),
+            'shards': shards,
+        }
+        with open('%s-shards.json' % self.fname, 'w') as fout:
+            json.dump(manifest, fout, indent=2)
+
+    def write_shards(self, tmpdir):
+        """
+        Stream relations into one file per shard in tmpdir and write the
+        shards, returns their descriptions and the name of the value dtype
+        """
+        n = self.nshards
+        tmps = [os.path.join(tmpdir, '%d' % i) for i in xrange(n)]
+        fouts = [open(tmp, 'wb') for tmp in tmps]
+        log.debug('Writing relations into %d shards by %s' % (n, self.scheme))
+        try:
+            for chunk in self.source.relation_chunks():
+                chunk = np.array(chunk, dtype=np.double)
+                rec = np.empty(len(chunk), dtype=_SHARD_RECORD)
+                rec['s'], rec['p'], rec['o'], rec['val'] = chunk.T
+                shard = self.assign(rec['s'], rec['o'], rec['p'])
+                order = np.argsort(shard, kind='mergesort')
+                bounds = np.searchsorted(shard[order], np.arange(n + 1))
+                for i in xrange(n):
+                    if bounds[i] < bounds[i + 1]:
+                        rec[order[bounds[i]:bounds[i + 1]]].tofile(fouts[i])
+        finally:
+            for fout in fouts:
+                fout.close()
+
+        gdtype, vdtype = self.dtypes()
+        values = vdtype.name if vdtype is not None else 'ones'
+        args = [(tmp, '%s-shard-%d.npz' % (self.fname, i), gdtype, values) for i, tmp in enumerate(tmps)]
+        processes = min(self.processes, n)
+        if processes > 1:
+            import multiprocessing
+            if multiprocessing.current_process().daemon:
+                # e.g. in a pool worker, which can not have children
+                log.warn('Writing shards in a daemonic process, not in %d processes' % processes)
+                processes = 1
+        if processes <= 1:
+            return map(_write_shard, args), values
+        pool = multiprocessing.Pool(processes)
+        try:
+            shards = pool.map(_write_shard, args)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        return shards, values
+
+
+_END = object()
+_ERROR = object()
+
+
+class _Channel(object):
+    """
+    Bounded queue between the archive reader and a single serializer.
+    Sections are delivered in the order of SECTIONS; sections that a
+    serializer does not ask for are skipped.
+    """
+
+    def __init__(self, reader, maxsize):
+        self.queue = Queue(maxsize)
+        self.eidx = reader.eidx
+        self.pidx = reader.pidx
+        self.eremap = reader.eremap
+        self.premap = reader.premap
+        self.nnz = reader.nnz
+        self.meta = reader.meta
+        self.head = None
+        self.position = 0
+        self.closed = False
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def _next(self):
+        if self.head is not None:
+            item, self.head = self.head, None
+        else:
+            item = self.queue.get()
+        if item is _END:
+            self.closed = True
+        elif item[0] is _ERROR:
+            raise RuntimeError('Reading archive failed: %s' % item[1])
+        return item
+
+    def chunks(self, section):
+        pos = SECTIONS.index(section)
+        if pos < self.position:
+            raise RuntimeError('Section %s has already been consumed' % section)
+        self.position = pos
+        while not self.closed:
+            item = self._next()
+            if item is _END:
+                return
+            sec, chunk = item
+            if sec == section:
+                yield chunk
+            elif SECTIONS.index(sec) > pos:
+                self.head = item
+                return
+
+    def relation_chunks(self):
+        return self.chunks('relations')
+
+    def entity_attribute_chunks(self):
+        return self.chunks('eattr')
+
+    def predicate_attribute_chunks(self):
+        return self.chunks('rattr')
+
+    def drain(self):
+        while not self.closed:
+            try:
+                self._next()
+            except RuntimeError:
+                pass
+
+
+def _pump(reader, channels):
+    try:
+        for section, chunks in reader.sections():
+            for chunk in chunks():
+                for c in channels:
+                    c.put((section, chunk))
+    except Exception as e:
+        log.exception('Reading archive %s failed' % reader.arc.fname)
+        for c in channels:
+            c.put((_ERROR, e))
+    finally:
+        for c in channels:
+            c.put(_END)
+
+
+def _write(ser, channel, errors):
+    try:
+        ser.write()
+    except Exception:
+        log.exception('Serializer %s failed' % ser.__class__.__name__)
+        errors.append(sys.exc_info())
+    finally:
+        # keep the reader going for the remaining serializers
+        channel.drain()
+
+
+def fanout(serializers, min_count, maxsize=8):
+    """
+    Serialize one archive with several serializers at once. The archive is
+    decompressed, parsed and pruned in a single pass, each serializer
+    consumes the pruned chunks through its own bounded queue.
+
+    Parameter
+    ---------
+    serializers: list of Serializer objects for the same archive
+    min_count: tuple of minimal counts for entities and predicates
+    maxsize: number of chunks that can be buffered per serializer
+    """
+    # the reader gets an archive of its own, serializers read indexes from
+    # theirs in other threads
+    arc = serializers[0].converter or TZArchive(serializers[0].fname, 'r:bz2')
+    reader = ArchiveReader(arc, min_count, serializers[0].order)
+    channels = [_Channel(reader, maxsize) for _ in serializers]
+    errors = []
+
+    threads = [threading.Thread(target=_pump, args=(reader, channels))]
+    for ser, channel in zip(serializers, channels):
+        ser.attach(channel)
+        threads.append(threading.Thread(target=_write, args=(ser, channel, errors)))
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    serializers[0].write_pruned_indexes()
+
+
 def python(fin, eidx, pidx, nnz, prefix, fin_eattr=None, fin_rattr=None):
     import cPickle
 
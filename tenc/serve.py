@@ -0,0 +1,408 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Query service over a converted archive (10c serve) and its client.
+
+The indexes of the archive are loaded once, index members are extracted
+into a cache directory and memory-mapped, see TensorView. Subject and
+object indexes that the archive lacks are built in memory at startup, such
+that neighbors only reads the adjacency lists of the requested entities. Requests are JSON
+objects {"op": ..., "keys": [...], "kind": ...} that look up a batch of
+keys, responses are {"results": [...]} with one result per key or
+{"error": ...}. Operations:
+
+  ids         ids of entity or predicate names (kind: entities, predicates)
+  names       names of entity or predicate ids
+  neighbors   triples (s, p, o) of entities
+  attributes  attributes (name, count) of entities
+  slices      subscripts (s, o) and values of predicates
+  stats       request counts, latencies and cache hits
+
+The service listens on a Unix socket (one request per line) or on localhost
+HTTP (POST a request to /, GET /stats).
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import time
+from collections import deque
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+import numpy as np
+
+from tenc.view import LRUCache, TensorView
+
+log = logging.getLogger('tenc.serve')
+
+OPS = ['ids', 'names', 'neighbors', 'attributes', 'slices', 'stats']
+
+# hosts the HTTP server may bind to
+LOCALHOST = ['', 'localhost', '127.0.0.1']
+
+
+def parse_address(address):
+    """
+    ('http', (host, port)) for [host:]port addresses, ('unix', path)
+    otherwise
+    """
+    m = re.match(r'^(?:([\w.]*):)?(\d+)$', str(address))
+    if m is None:
+        return 'unix', address
+    host = m.group(1) or '127.0.0.1'
+    if not host in LOCALHOST:
+        raise ValueError('Query service only listens on localhost (%s)' % host)
+    return 'http', (host, int(m.group(2)))
+
+
+class _ResultCache(LRUCache):
+    """
+    LRU cache of encoded results, bounded in bytes
+    """
+    size = staticmethod(len)
+
+
+class Metrics(object):
+    """
+    Request counts and latencies per operation, percentiles are computed
+    over the most recent requests
+    """
+
+    def __init__(self, recent=1024):
+        self.lock = threading.Lock()
+        self.recent = recent
+        self.ops = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, op, seconds, error=False):
+        with self.lock:
+            m = self.ops.get(op)
+            if m is None:
+                m = self.ops[op] = {'requests': 0, 'errors': 0, 'seconds': 0.0, 'max': 0.0,
+                                    'recent': deque(maxlen=self.recent)}
+            m['requests'] += 1
+            m['errors'] += int(error)
+            m['seconds'] += seconds
+            m['max'] = max(m['max'], seconds)
+            m['recent'].append(seconds)
+
+    def cache(self, hits, misses):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def summary(self):
+        with self.lock:
+            ops = {}
+            for op, m in self.ops.iteritems():
+                p50, p95, p99 = np.percentile(list(m['recent']), [50, 95, 99])
+                ops[op] = {
+                    'requests': m['requests'],
+                    'errors': m['errors'],
+                    'mean_ms': 1000 * m['seconds'] / m['requests'],
+                    'p50_ms': 1000 * p50,
+                    'p95_ms': 1000 * p95,
+                    'p99_ms': 1000 * p99,
+                    'max_ms': 1000 * m['max'],
+                }
+            return {'ops': ops, 'cache': {'hits': self.hits, 'misses': self.misses}}
+
+
+class QueryService(object):
+    """
+    Answers batched lookups on an archive
+
+    Parameter
+    ---------
+    fname: basename of the archive
+    cache_dir: directory for memory-mapped index members, a temporary
+               directory if None
+    cache_bytes: size of the result cache in bytes
+    max_bytes: size of the slice cache of the view in bytes
+    """
+
+    def __init__(self, fname, cache_dir=None, cache_bytes=1 << 26, max_bytes=1 << 28):
+        self.tmpdir = None
+        if cache_dir is None:
+            cache_dir = self.tmpdir = tempfile.mkdtemp(prefix='tenc-')
+        t = time.time()
+        self.view = TensorView(fname, max_bytes, cache_dir)
+        self.names = {
+            'entities': self.view.entity_index(),
+            'predicates': self.view.predicate_index(),
+        }
+        for kind, names in self.names.iteritems():
+            self.view.names[kind] = dict((n, i) for i, n in enumerate(names))
+        if self.view.has_index('predicate'):
+            self.view.members = self.view.open_index('predicate')
+        for name in ['subject', 'object']:
+            if self.view.adjacency[name] is None:
+                self.view.adjacency[name] = self.view.open_index(name)
+        self.lock = threading.Lock()
+        self.cache = _ResultCache(cache_bytes)
+        self.metrics = Metrics()
+        log.info('Loaded %s in %.2fs (%d entities, %d predicates, %d triples)' % (
+            fname, time.time() - t, self.view.shape[0], self.view.shape[2], self.view.nnz))
+
+    def close(self):
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir)
+            self.tmpdir = None
+
+    def lookup(self, op, kind, key):
+        """
+        Result of op for a single key
+        """
+        view = self.view
+        if op == 'ids':
+            return view.names[kind].get(key)
+        if op == 'names':
+            if int(key) < 0:
+                raise IndexError('Negative id (%s)' % key)
+            return self.names[kind][int(key)]
+        if op == 'neighbors':
+            return view.neighbors(key).tolist()
+        if op == 'attributes':
+            return [[name, float(v)] for name, v in view.entity_attributes(key)]
+        if op == 'slices':
+            subs, vals = view.slice_arrays(key)
+            return {'subs': np.asarray(subs).tolist(), 'vals': np.asarray(vals).tolist()}
+        raise ValueError('Unknown operation (%s)' % op)
+
+    def handle(self, request):
+        """
+        Encoded response to the encoded request
+        """
+        t = time.time()
+        op = None
+        try:
+            request = json.loads(request)
+            op = request.get('op')
+            if op == 'stats':
+                return json.dumps({'results': self.metrics.summary()})
+            if not op in OPS:
+                raise ValueError('Unknown operation (%s)' % op)
+            kind = request.get('kind', 'entities')
+            if not kind in self.names:
+                raise ValueError('Unknown kind (%s)' % kind)
+            parts, misses = [], 0
+            for key in request.get('keys', []):
+                if isinstance(key, unicode):
+                    key = key.encode('utf-8')
+                ckey = (op, kind, key)
+                with self.lock:
+                    part = self.cache.get(ckey)
+                if part is None:
+                    misses += 1
+                    part = json.dumps(self.lookup(op, kind, key))
+                    with self.lock:
+                        self.cache.put(ckey, part)
+                parts.append(part)
+            self.metrics.cache(len(parts) - misses, misses)
+            self.metrics.add(op, time.time() - t)
+            return '{"results": [%s]}' % ', '.join(parts)
+        except Exception as e:
+            if not isinstance(e, (ValueError, KeyError, IndexError)):
+                log.exception('Request failed')
+            self.metrics.add(op if op in OPS else 'invalid', time.time() - t, error=True)
+            return json.dumps({'error': '%s: %s' % (e.__class__.__name__, e)})
+
+
+class _UnixHandler(StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            self.wfile.write(self.server.service.handle(line) + '\n')
+            self.wfile.flush()
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def respond(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        self.respond(self.server.service.handle(self.rfile.read(length)))
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            self.send_error(404)
+            return
+        self.respond(self.server.service.handle('{"op": "stats"}'))
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+class _UnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_server(service, address):
+    """
+    Server of service on address, a Unix socket path or [host:]port on
+    localhost. Port 0 picks a free port, see server.server_address. A stale
+    socket at the path is replaced, other files are not.
+    """
+    kind, addr = parse_address(address)
+    if kind == 'unix':
+        if os.path.exists(addr):
+            if not stat.S_ISSOCK(os.stat(addr).st_mode):
+                raise ValueError('%s exists and is not a socket' % addr)
+            os.remove(addr)
+        server = _UnixServer(addr, _UnixHandler)
+    else:
+        server = _HTTPServer(addr, _HTTPHandler)
+    server.service = service
+    return server
+
+
+def serve(fname, address, cache_dir=None, cache_bytes=1 << 26, max_bytes=1 << 28):
+    """
+    Serve queries on archive fname until interrupted
+    """
+    service = QueryService(fname, cache_dir, cache_bytes, max_bytes)
+    try:
+        server = make_server(service, address)
+    except BaseException:
+        service.close()
+        raise
+    log.info('Serving %s on %s' % (fname, address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if parse_address(address)[0] == 'unix' and os.path.exists(address):
+            os.remove(address)
+        service.close()
+
+
+class Client(object):
+    """
+    Client of a query service, see serve. Connections are kept open between
+    requests.
+
+    Parameter
+    ---------
+    address: Unix socket path or [host:]port of the service
+    timeout: socket timeout in seconds
+    """
+
+    def __init__(self, address, timeout=None):
+        self.kind, self.addr = parse_address(address)
+        self.timeout = timeout
+        self.conn = None
+
+    def connect(self):
+        if self.kind == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.addr)
+            self.conn = (sock, sock.makefile('rb'))
+        else:
+            import httplib
+            self.conn = httplib.HTTPConnection(self.addr[0] or '127.0.0.1', self.addr[1], timeout=self.timeout)
+
+    def close(self):
+        if self.conn is None:
+            return
+        if self.kind == 'unix':
+            self.conn[1].close()
+            self.conn[0].close()
+        else:
+            self.conn.close()
+        self.conn = None
+
+    def request(self, request):
+        if self.conn is None:
+            self.connect()
+        body = json.dumps(request)
+        if self.kind == 'unix':
+            self.conn[0].sendall(body + '\n')
+            response = self.conn[1].readline()
+        else:
+            self.conn.request('POST', '/', body, {'Content-Type': 'application/json'})
+            response = self.conn.getresponse().read()
+        if not response:
+            self.close()
+            raise IOError('Query service closed the connection')
+        response = json.loads(response)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['results']
+
+    def query(self, op, keys, kind='entities'):
+        return self.request({'op': op, 'keys': list(keys), 'kind': kind})
+
+    def ids(self, names, kind='entities'):
+        """
+        Ids of names, None for unknown names
+        """
+        return self.query('ids', names, kind)
+
+    def names(self, ids, kind='entities'):
+        return self.query('names', [int(i) for i in ids], kind)
+
+    def neighbors(self, entities):
+        """
+        Arrays of rows (s, p, o) of triples of entities, given as names or ids
+        """
+        return [np.array(t, dtype=np.int64).reshape(-1, 3) for t in self.query('neighbors', _keys(entities))]
+
+    def attributes(self, entities):
+        """
+        Lists of (attribute name, count) of entities
+        """
+        return [[tuple(a) for a in attr] for attr in self.query('attributes', _keys(entities))]
+
+    def slices(self, predicates):
+        """
+        Subscripts (s, o) and values of predicates, given as names or ids
+        """
+        return [(np.array(r['subs'], dtype=np.int64).reshape(-1, 2), np.array(r['vals']))
+                for r in self.query('slices', _keys(predicates), 'predicates')]
+
+    def stats(self):
+        return self.request({'op': 'stats'})
+
+
+def _keys(items):
+    # numpy integers are not JSON serializable
+    return [k if isinstance(k, basestring) else int(k) for k in items]
@@ -0,0 +1,74 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Count-min sketch of name frequencies. Counts of the sketch never
+underestimate the true counts, such that names whose count in the sketch
+is at most the minimal count of pruning are certainly pruned.
+"""
+
+import logging
+import numpy as np
+
+log = logging.getLogger('tenc.sketch')
+
+MASK = (1 << 64) - 1
+
+# number of keys that are hashed into the table at once
+CHUNK_SIZE = 1 << 16
+
+
+class CountMinSketch(object):
+    """
+    Parameter
+    ---------
+    nbytes: size of the table in bytes, the width of the table is the
+            largest power of two that fits
+    depth: number of hash functions
+    seed: seed of the multiply-shift hash functions
+    """
+
+    def __init__(self, nbytes=1 << 26, depth=4, seed=0):
+        bits = max(int(np.log2(nbytes // (4 * depth))), 1)
+        self.shift = 64 - bits
+        rng = np.random.RandomState(seed)
+        # odd multipliers for multiply-shift hashing of 64-bit keys
+        self.a = [int(rng.randint(0, 1 << 31)) << 33 | int(rng.randint(0, 1 << 31)) << 1 | 1
+                  for _ in xrange(depth)]
+        self.table = np.zeros((depth, 1 << bits), dtype=np.uint32)
+        self.buf = []
+
+    def add(self, key):
+        self.buf.append(hash(key) & MASK)
+        if len(self.buf) == CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buf:
+            return
+        keys = np.array(self.buf, dtype=np.uint64)
+        shift = np.uint64(self.shift)
+        for row, a in zip(self.table, self.a):
+            cols, counts = np.unique((keys * np.uint64(a)) >> shift, return_counts=True)
+            row[cols] += counts.astype(np.uint32)
+        self.buf = []
+
+    def count(self, key):
+        """
+        Upper bound of the number of times key was added, requires flush
+        """
+        h = hash(key) & MASK
+        return min(row[((h * a) & MASK) >> self.shift] for row, a in zip(self.table, self.a))
@@ -0,0 +1,175 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Statistics of a tensor archive to choose pruning thresholds. Everything
+except the exact triple counts is computed from tensor.size and the
+attribute members, i.e. without reading tensor.ten.
+"""
+
+import logging
+import numpy as np
+
+from tenc import MAP
+from tenc._tenc import TZArchive, fjoin, read_tensor_size, read_blocks
+
+log = logging.getLogger('tenc.stats')
+
+DEFAULT_THRESHOLDS = [0, 1, 2, 5, 10, 20, 50, 100, 1000]
+
+
+def histogram(counts):
+    """
+    Histogram of counts in logarithmic bins [0], [1], [2, 3], [4, 7], ...
+
+    Returns list of (lower bound, upper bound, number of counts in bin)
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(counts) == 0:
+        return []
+    bins = np.zeros(len(counts), dtype=np.int)
+    pos = counts > 0
+    bins[pos] = np.floor(np.log2(counts[pos])).astype(np.int) + 1
+    hist = np.bincount(bins)
+    result = []
+    for b, c in enumerate(hist):
+        lo, hi = (0, 0) if b == 0 else (2 ** (b - 1), 2 ** b - 1)
+        result.append((lo, hi, int(c)))
+    return result
+
+
+def survivors(counts, thresholds):
+    """
+    Number of items that survive pruning for each threshold, i.e. have a
+    count larger than the threshold
+    """
+    s = np.sort(np.asarray(counts))
+    return (len(s) - np.searchsorted(s, thresholds, side='right')).tolist()
+
+
+def triple_survivors(blocks, edeg, pdeg, ethresholds, pthresholds):
+    """
+    Number of triples that survive pruning for all pairs of entity and
+    predicate thresholds, computed in one pass over blocks of tensor.ten
+
+    Returns array of shape (len(ethresholds), len(pthresholds))
+    """
+    te, tp = np.asarray(ethresholds), np.asarray(pthresholds)
+    if (np.diff(te) < 0).any() or (np.diff(tp) < 0).any():
+        raise ValueError('Thresholds must be sorted (%s, %s)' % (te, tp))
+    hist = np.zeros((len(te) + 1, len(tp) + 1), dtype=np.int64)
+    for b in blocks:
+        s, o, p = [b[:, i].astype(np.int) for i in xrange(3)]
+        # number of thresholds a triple survives
+        ie = np.searchsorted(te, np.minimum(edeg[s], edeg[o]), side='left')
+        ip = np.searchsorted(tp, pdeg[p], side='left')
+        hist += np.bincount(ie * (len(tp) + 1) + ip, minlength=hist.size).reshape(hist.shape)
+    # triples surviving thresholds i, j have ie > i and ip > j
+    cum = hist[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1]
+    return cum[1:, 1:]
+
+
+def attribute_stats(fin, nitems):
+    """
+    Cardinalities of an attribute member
+    """
+    items = []
+    attrs = []
+    for b in read_blocks(fin, 3):
+        items.append(b[:, 0].astype(np.int))
+        attrs.append(b[:, 1].astype(np.int))
+    items = np.concatenate(items) if items else np.zeros(0, dtype=np.int)
+    attrs = np.concatenate(attrs) if attrs else np.zeros(0, dtype=np.int)
+    per_item = np.bincount(items, minlength=nitems)
+    per_attr = np.bincount(attrs)
+    return {
+        'nnz': len(items),
+        'attributes': int((per_attr > 0).sum()),
+        'items with attributes': int((per_item > 0).sum()),
+        'attributes per item': histogram(per_item),
+        'items per attribute': histogram(per_attr[per_attr > 0]),
+        # attribute columns that survive the pruning in Matlab (min_count 1)
+        'attributes with count > 1': int((per_attr > 1).sum()),
+    }
+
+
+def archive_stats(fname, thresholds=DEFAULT_THRESHOLDS, exact=False):
+    """
+    Statistics of archive fname. With exact, the number of triples that
+    survive each pair of thresholds is computed from tensor.ten.
+    Thresholds are reported in increasing order.
+    """
+    thresholds = sorted(set(thresholds))
+    arc = TZArchive(fname, 'r:bz2')
+    N, K, nnz = read_tensor_size(arc.member(fjoin(arc.SUBS_FOUT, arc.SHAPE_SUFFIX)))
+    edeg, pdeg = nnz[MAP.ENTITY], nnz[MAP.PREDICATE]
+    stats = {
+        'entities': N,
+        'predicates': K,
+        'triples': int(pdeg.sum()),
+        'entity degrees': histogram(edeg),
+        'predicate sizes': histogram(pdeg),
+        'entity attributes': attribute_stats(arc.member(fjoin(arc.ENTITIES_FOUT, arc.ATTR_SUFFIX)), N),
+        'predicate attributes': attribute_stats(arc.member(fjoin(arc.PREDICATES_FOUT, arc.ATTR_SUFFIX)), K),
+        'thresholds': list(thresholds),
+        'surviving entities': survivors(edeg, thresholds),
+        'surviving predicates': survivors(pdeg, thresholds),
+    }
+    if exact:
+        log.debug('Counting surviving triples in tensor.ten')
+        blocks = read_blocks(arc.member(fjoin(arc.SUBS_FOUT, arc.SUBS_SUFFIX)), 4)
+        stats['surviving triples'] = triple_survivors(blocks, edeg, pdeg, thresholds, thresholds).tolist()
+    return stats
+
+
+def format_stats(stats):
+    """
+    Human-readable report of archive_stats
+    """
+    lines = []
+    add = lines.append
+    add('entities:   %d' % stats['entities'])
+    add('predicates: %d' % stats['predicates'])
+    add('triples:    %d' % stats['triples'])
+
+    def hist(title, h):
+        add('')
+        add(title)
+        for lo, hi, c in h:
+            add('  %10d - %-10d %d' % (lo, hi, c))
+
+    hist('entity degrees (occurrences in triples):', stats['entity degrees'])
+    hist('predicate sizes (triples per predicate):', stats['predicate sizes'])
+    for key in ['entity attributes', 'predicate attributes']:
+        a = stats[key]
+        add('')
+        add('%s: %d nonzeros, %d attributes (%d with count > 1), %d items with attributes' % (
+            key, a['nnz'], a['attributes'], a['attributes with count > 1'], a['items with attributes']))
+        hist('  attributes per item:', a['attributes per item'])
+        hist('  items per attribute:', a['items per attribute'])
+
+    add('')
+    add('pruning (items with count > threshold survive):')
+    add('  %10s %12s %12s' % ('threshold', 'entities', 'predicates'))
+    for t, e, p in zip(stats['thresholds'], stats['surviving entities'], stats['surviving predicates']):
+        add('  %10d %12d %12d' % (t, e, p))
+    if 'surviving triples' in stats:
+        add('')
+        add('surviving triples (rows: --min-count-ent, columns: --min-count-pred):')
+        add('  %10s ' % '' + ' '.join('%12d' % t for t in stats['thresholds']))
+        for t, row in zip(stats['thresholds'], stats['surviving triples']):
+            add('  %10d ' % t + ' '.join('%12d' % c for c in row))
+    return '\n'.join(lines)
@@ -0,0 +1,122 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Extraction of k-hop neighborhoods from archives with subject and object
+indexes (10c --index subject,object). Opening the view decompresses the
+archive once to extract its indexes (see TensorView), unless they are in
+its cache directory already. The traversal then only reads the adjacency
+lists of the visited entities from the memory-mapped indexes, i.e. its
+time is proportional to the size of the subgraph.
+"""
+
+import logging
+import numpy as np
+
+from tenc._tenc import fjoin, read_blocks, select_tensor_index, write_archive
+from tenc.view import TensorView
+
+log = logging.getLogger('tenc.subgraph')
+
+
+def khop(view, seeds, hops):
+    """
+    Sorted ids of all entities within hops of seeds, following edges of
+    all predicates in both directions
+    """
+    visited = np.unique(np.asarray(seeds, dtype=np.int64))
+    frontier = visited
+    for h in xrange(hops):
+        if len(frontier) == 0:
+            break
+        out, _ = view.edges(frontier, 'subject')
+        inc, _ = view.edges(frontier, 'object')
+        found = np.unique(np.concatenate((out[:, 2], inc[:, 0])))
+        frontier = np.setdiff1d(found, visited, assume_unique=True)
+        visited = np.union1d(visited, frontier)
+        log.debug('Hop %d: %d new entities, %d in total' % (h + 1, len(frontier), len(visited)))
+    return visited
+
+
+def induced(view, entities):
+    """
+    Triples (s, p, o) and values between the sorted entity ids
+    """
+    triples, vals = view.edges(entities, 'subject')
+    pos = np.searchsorted(entities, triples[:, 2])
+    keep = entities[np.minimum(pos, len(entities) - 1)] == triples[:, 2]
+    return triples[keep], vals[keep]
+
+
+def _select_attributes(fin, ids):
+    """
+    Rows (item, attribute, count) of an attribute member for the sorted
+    ids, items are renumbered by their position in ids
+    """
+    selected = []
+    for block in read_blocks(fin, 3):
+        items = block[:, 0].astype(np.int64)
+        pos = np.searchsorted(ids, items)
+        keep = ids[np.minimum(pos, len(ids) - 1)] == items
+        block = block[keep]
+        block[:, 0] = pos[keep]
+        selected.append(block)
+    return np.concatenate(selected) if selected else np.zeros((0, 3))
+
+
+def extract(fname, seeds, hops, out, cache_dir=None, indexes=(), attributes=True):
+    """
+    Write the subgraph induced by the k-hop neighborhood of seeds into the
+    new archive out. Entities and predicates are renumbered, their index
+    members only hold the names of the subgraph.
+
+    Parameter
+    ---------
+    fname: basename of the source archive
+    seeds: entity ids or names
+    hops: number of hops
+    out: basename of the new archive
+    cache_dir: see TensorView
+    indexes: sorted subscript indexes of the new archive
+    attributes: copy attributes of the selected entities and predicates
+    """
+    view = TensorView(fname, cache_dir=cache_dir)
+    try:
+        entities = khop(view, [view.index('entities', s) for s in seeds], hops)
+        triples, vals = induced(view, entities)
+        predicates = np.unique(triples[:, 1])
+        log.debug('Subgraph has %d entities, %d predicates and %d triples' % (
+            len(entities), len(predicates), len(triples)))
+
+        # renumber
+        s = np.searchsorted(entities, triples[:, 0])
+        p = np.searchsorted(predicates, triples[:, 1])
+        o = np.searchsorted(entities, triples[:, 2])
+        rows = np.column_stack((s, o, p, vals))
+
+        member = lambda name, suffix: view.member(fjoin(name, suffix))
+        enames = select_tensor_index(member(view.ENTITIES_FOUT, view.MAP_SUFFIX), entities)
+        pnames = select_tensor_index(member(view.PREDICATES_FOUT, view.MAP_SUFFIX), predicates)
+        eattr = rattr = None
+        eattr_names = rattr_names = []
+        if attributes:
+            eattr = _select_attributes(member(view.ENTITIES_FOUT, view.ATTR_SUFFIX), entities)
+            rattr = _select_attributes(member(view.PREDICATES_FOUT, view.ATTR_SUFFIX), predicates)
+            eattr_names = view.entity_attributes_index()
+            rattr_names = view.predicate_attributes_index()
+        write_archive(out, rows, enames, pnames, eattr, rattr, eattr_names, rattr_names, indexes)
+    finally:
+        view.close()
@@ -0,0 +1,124 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Reproducible synthetic multigraphs with power-law entity degrees, e.g. for
+benchmarks:
+
+    g = generate(100000, n_entities=10000, n_predicates=20, n_attributes=50000)
+    write(g, 'graph.tsv', 'tab-delimited')
+
+Entities and predicates are drawn from Zipf-like distributions, attributes
+are literals of several words from a Zipf-distributed vocabulary that are
+attached to entities by attribute predicates (attr0, attr1, ...).
+"""
+
+import numpy as np
+
+# formats that write knows, by name of their parser
+FORMATS = ['tab-delimited', 'ntriples', 'reverb', 'mln']
+
+NAMESPACE = 'http://example.org/'
+
+
+def powerlaw(rng, n, size, exponent):
+    """
+    Draw size ids from 0..n-1 with probability proportional to
+    (id + 1)^-exponent
+    """
+    p = np.arange(1, n + 1, dtype=np.double) ** -exponent
+    return rng.choice(n, size=size, p=p / p.sum())
+
+
+class Graph(object):
+    """
+    Relations as arrays of subject, predicate and object ids, attributes as
+    arrays of entity and attribute predicate ids and a list of literals
+    """
+
+    def __init__(self, subs, preds, objs, attr_entities, attr_preds, literals):
+        self.subs, self.preds, self.objs = subs, preds, objs
+        self.attr_entities, self.attr_preds, self.literals = attr_entities, attr_preds, literals
+
+    def __len__(self):
+        return len(self.subs) + len(self.literals)
+
+    def attribute_predicates(self):
+        return sorted(set('attr%d' % a for a in self.attr_preds))
+
+
+def generate(n_triples, n_entities=None, n_predicates=10, n_attributes=0, n_attribute_predicates=2,
+             words=5, vocabulary=10000, exponent=1.1, seed=0):
+    """
+    Parameter
+    ---------
+    n_triples: number of relations
+    n_entities: number of entities, defaults to n_triples / 10
+    n_predicates: number of predicates
+    n_attributes: number of literal attributes
+    n_attribute_predicates: number of attribute predicates
+    words: mean number of words of a literal
+    vocabulary: number of distinct words
+    exponent: exponent of the entity degree distribution
+    seed: seed of the random number generator
+    """
+    rng = np.random.RandomState(seed)
+    N = n_entities or max(n_triples // 10, 2)
+    subs = powerlaw(rng, N, n_triples, exponent)
+    objs = powerlaw(rng, N, n_triples, exponent)
+    # shuffle ids, such that frequent entities are not seen first
+    perm = rng.permutation(N)
+    subs, objs = perm[subs], perm[objs]
+    preds = powerlaw(rng, n_predicates, n_triples, 1.0)
+
+    attr_entities = perm[powerlaw(rng, N, n_attributes, exponent)]
+    attr_preds = rng.randint(0, n_attribute_predicates, n_attributes)
+    lengths = rng.poisson(words - 1, n_attributes) + 1
+    tokens = powerlaw(rng, vocabulary, lengths.sum(), 1.0)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    literals = [' '.join('w%d' % t for t in tokens[offsets[i]:offsets[i + 1]]) for i in xrange(n_attributes)]
+    return Graph(subs, preds, objs, attr_entities, attr_preds, literals)
+
+
+def _rows(g):
+    for s, p, o in zip(g.subs.tolist(), g.preds.tolist(), g.objs.tolist()):
+        yield 'e%d' % s, 'p%d' % p, 'e%d' % o, False
+    for e, a, lit in zip(g.attr_entities.tolist(), g.attr_preds.tolist(), g.literals):
+        yield 'e%d' % e, 'attr%d' % a, lit, True
+
+
+def write(g, fname, fmt):
+    """
+    Write graph g to file fname in format fmt, one of FORMATS. MLN has no
+    literals, attributes are skipped.
+    """
+    if not fmt in FORMATS:
+        raise ValueError('Unknown format (%s)' % fmt)
+    with open(fname, 'wb') as fout:
+        for i, (s, p, o, literal) in enumerate(_rows(g)):
+            if fmt == 'tab-delimited':
+                fout.write('%s\t%s\t%s\n' % (s, p, o))
+            elif fmt == 'reverb':
+                # ids of extraction and sentence, raw subject and relation,
+                # normalized triple, sentence and confidence
+                fout.write('%d\t%d\t%s\t%s\t%s\t%s\t%s\tsentence %d\t%.2f\n' % (
+                    i, i // 10, s, p, s, p, o, i, 0.5 + (i % 50) / 100.
+                ))
+            elif fmt == 'ntriples':
+                o = '"%s"' % o if literal else '<%s%s>' % (NAMESPACE, o)
+                fout.write('<%s%s> <%s%s> %s .\n' % (NAMESPACE, s, NAMESPACE, p, o))
+            elif not literal:
+                fout.write('%s(%s, %s)\n' % (p, s, o))
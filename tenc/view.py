@@ -0,0 +1,295 @@
+# tenc - tool to convert large multigraphs to adjacency tensors
+# Copyright (C) 2013 Maximilian Nickel <max@inmachina.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from itertools import chain
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from tenc import MAP
+from tenc._tenc import TZArchive, fjoin, read_tensor_size, read_tensor_index, read_blocks
+from tenc.index import INDEXES, PARTS, member_name, S, O, P, VAL
+
+log = logging.getLogger('tenc.view')
+
+
+class LRUCache(object):
+    """
+    Least recently used cache of numpy arrays, bounded in bytes
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.items = OrderedDict()
+
+    @staticmethod
+    def size(value):
+        return sum(v.nbytes for v in value)
+
+    def get(self, key):
+        value = self.items.pop(key, None)
+        if value is not None:
+            self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.nbytes += self.size(value)
+        while self.nbytes > self.max_bytes and len(self.items) > 1:
+            _, old = self.items.popitem(last=False)
+            self.nbytes -= self.size(old)
+
+
+class TensorView(TZArchive):
+    """
+    Lazy, read-only view on the unpruned tensor of an archive. Frontal
+    slices are read on demand from the predicate index of the archive (see
+    10c --index predicate) and kept in an LRU cache. Entities and predicates
+    can be given as ids or names.
+
+    When the archive has subject and object indexes (10c --index
+    subject,object), neighbors and edges only read the adjacency lists of
+    the requested entities.
+
+    Index members are extracted in a single pass over the archive into
+    cache_dir and memory-mapped, i.e. the compressed archive is read once
+    when the view is opened and slices are read from the extracted members.
+
+    Parameter
+    ---------
+    fname: basename of the archive
+    max_bytes: size of the slice cache in bytes
+    cache_dir: directory for the extracted index members, kept between
+               views of the same archive. A temporary directory that is
+               removed on close if None.
+    """
+
+    def __init__(self, fname='tensor', max_bytes=1 << 28, cache_dir=None):
+        TZArchive.__init__(self, fname, 'r:bz2')
+        self.lock = threading.RLock()
+        self.cache = LRUCache(max_bytes)
+        self.tmpdir = None
+        if cache_dir is None:
+            cache_dir = self.tmpdir = tempfile.mkdtemp(prefix='tenc-')
+        self.cache_dir = cache_dir
+        N, K, nnz = read_tensor_size(self.member(fjoin(self.SUBS_FOUT, self.SHAPE_SUFFIX)))
+        self.shape = (N, N, K)
+        self.nnz = int(nnz[MAP.PREDICATE].sum())
+        self.counts = nnz
+        self.names = {}
+        self.attributes = None
+        self.members = None
+        self.index_members = self.extract_indexes()
+        self.adjacency = dict((name, self.open_index(name, build=False)) for name in ['subject', 'object'])
+
+    def close(self):
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            self.tmpdir = None
+
+    def __del__(self):
+        self.close()
+
+    def cache_path(self, mname):
+        return os.path.join(self.cache_dir, '%s-%s' % (os.path.basename(self.fname), mname))
+
+    def extract_indexes(self):
+        """
+        Extract all index members into the cache directory, unless they
+        were extracted from the same archive before. Returns the names of
+        the index members of the archive.
+        """
+        st = os.stat(fjoin(self.fname, self.ARC_SUFFIX))
+        stamp = {'size': st.st_size, 'mtime': st.st_mtime}
+        manifest = self.cache_path('index.json')
+        if os.path.exists(manifest):
+            with open(manifest) as fin:
+                cached = json.load(fin)
+            if cached['archive'] == stamp and all(os.path.exists(self.cache_path(m)) for m in cached['members']):
+                return set(cached['members'])
+        wanted = set(member_name(name, part) for name in INDEXES for part in PARTS)
+        members = []
+        # members that were already read, then the remaining ones in archive
+        # order, i.e. without seeking backwards
+        for info in chain(list(self.arc.members), iter(self.arc.next, None)):
+            if not info.name in wanted:
+                continue
+            path = self.cache_path(info.name)
+            log.debug('Extracting %s to %s' % (info.name, path))
+            with open(path + '.tmp', 'wb') as fout:
+                shutil.copyfileobj(self.arc.extractfile(info), fout, 1 << 20)
+            os.rename(path + '.tmp', path)
+            members.append(info.name)
+        self.complete = True
+        with open(manifest, 'w') as fout:
+            json.dump({'archive': stamp, 'members': members}, fout)
+        return set(members)
+
+    def has_index(self, name):
+        return all(member_name(name, part) in self.index_members for part in PARTS)
+
+    def open_member(self, name, part):
+        return _Array(np.load(self.cache_path(member_name(name, part)), mmap_mode='r'))
+
+    def open_index(self, name, build=True):
+        """
+        Members (subs, vals, offsets) of index name. If the archive has no
+        such index, it is built in memory or None is returned.
+        """
+        if not self.has_index(name):
+            if not build:
+                return None
+            log.warn('Archive %s has no %s index, building it in memory' % (self.fname, name))
+            return self.build_index(name)
+        subs = self.open_member(name, 'subs')
+        vals = self.open_member(name, 'vals')
+        offsets = np.asarray(self.open_member(name, 'offsets').data)
+        return subs, vals, offsets
+
+    def build_index(self, name):
+        key, cols = INDEXES[name]
+        size = self.shape[2] if key == P else self.shape[0]
+        fin = self.member(fjoin(self.SUBS_FOUT, self.SUBS_SUFFIX))
+        blocks = list(read_blocks(fin, 4))
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, 4))
+        order = np.argsort(rows[:, key], kind='mergesort')
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[:, key].astype(np.int), minlength=size), out=offsets[1:])
+        return _Array(rows[order][:, cols].astype(np.int64)), _Array(rows[order, VAL]), offsets
+
+    def index(self, kind, name):
+        """
+        Id of entity or predicate name, kind is 'entities' or 'predicates'
+        """
+        if not isinstance(name, basestring):
+            return int(name)
+        with self.lock:
+            if not kind in self.names:
+                idx = self.entity_index() if kind == 'entities' else self.predicate_index()
+                self.names[kind] = dict((n, i) for i, n in enumerate(idx))
+        return self.names[kind][name]
+
+    def slice_arrays(self, predicate):
+        """
+        Subscripts (subjects, objects) and values of frontal slice predicate
+        """
+        k = self.index('predicates', predicate)
+        with self.lock:
+            arrays = self.cache.get(k)
+            if arrays is None:
+                if self.members is None:
+                    self.members = self.open_index('predicate')
+                subs, vals, offsets = self.members
+                start, stop = offsets[k], offsets[k + 1]
+                arrays = (subs.rows(start, stop), vals.rows(start, stop))
+                self.cache.put(k, arrays)
+        return arrays
+
+    def slice(self, predicate):
+        """
+        Frontal slice of predicate as sparse N x N matrix
+        """
+        subs, vals = self.slice_arrays(predicate)
+        N = self.shape[0]
+        return coo_matrix((vals, (subs[:, 0], subs[:, 1])), shape=(N, N))
+
+    def edges(self, entities, name):
+        """
+        Outgoing (name = 'subject') or incoming (name = 'object') edges of
+        entities as array of rows (s, p, o) and their values. Requires the
+        subject or object index.
+        """
+        if self.adjacency[name] is None:
+            raise ValueError('Archive %s has no %s index' % (self.fname, name))
+        subs, vals, offsets = self.adjacency[name]
+        triples, values = [], []
+        with self.lock:
+            # read in order of the index, i.e. without seeking backwards
+            for e in np.unique(np.asarray(entities, dtype=np.int64)):
+                start, stop = offsets[e], offsets[e + 1]
+                if start == stop:
+                    continue
+                rows = subs.rows(start, stop)
+                other = np.repeat(e, stop - start)
+                if name == 'subject':
+                    triples.append(np.column_stack((other, rows[:, 0], rows[:, 1])))
+                else:
+                    triples.append(np.column_stack((rows[:, 1], rows[:, 0], other)))
+                values.append(vals.rows(start, stop))
+        if not triples:
+            return np.zeros((0, 3), dtype=np.int64), np.zeros(0)
+        return np.concatenate(triples), np.concatenate(values)
+
+    def neighbors(self, entity):
+        """
+        All triples that involve entity as array of rows (s, p, o)
+        """
+        e = self.index('entities', entity)
+        if self.adjacency['subject'] is not None and self.adjacency['object'] is not None:
+            out, _ = self.edges([e], 'subject')
+            inc, _ = self.edges([e], 'object')
+            # self loops are in both lists
+            return np.concatenate((out, inc[inc[:, 0] != e]))
+        triples = []
+        for k in xrange(self.shape[2]):
+            if self.counts[MAP.PREDICATE][k] == 0:
+                continue
+            subs, _ = self.slice_arrays(k)
+            hit = (subs[:, 0] == e) | (subs[:, 1] == e)
+            if hit.any():
+                sub = subs[hit]
+                triples.append(np.column_stack((sub[:, 0], np.repeat(k, len(sub)), sub[:, 1])))
+        return np.concatenate(triples) if triples else np.zeros((0, 3), dtype=np.int64)
+
+    def entity_attributes(self, entity):
+        """
+        Attributes of entity as list of (attribute name, count)
+        """
+        e = self.index('entities', entity)
+        with self.lock:
+            if self.attributes is None:
+                # attributes are sorted by entity on first use
+                fin = self.member(fjoin(self.ENTITIES_FOUT, self.ATTR_SUFFIX))
+                blocks = list(read_blocks(fin, 3))
+                attr = np.concatenate(blocks) if blocks else np.zeros((0, 3))
+                attr = attr[np.argsort(attr[:, 0], kind='mergesort')]
+                names = self.entity_attributes_index()
+                self.attributes = (attr, names)
+        attr, names = self.attributes
+        lo, hi = np.searchsorted(attr[:, 0], [e, e + 1])
+        return [(names[int(a)], v) for a, v in attr[lo:hi, 1:]]
+
+
+class _Array(object):
+    """
+    Rows of an in-memory or memory-mapped array, see tenc.index.Member
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def rows(self, start, stop):
+        return self.data[start:stop]
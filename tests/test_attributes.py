@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+from tenc import TZArchive, available_parsers
+from tenc import parser
+
+
+class TestParallelAttributes(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        with open(self.fin, 'w') as fout:
+            for i in xrange(200):
+                fout.write('Parent(E%d, E%d)\n' % (i % 37, (i * 11) % 41))
+                if i % 3 == 0:
+                    fout.write('HasName(E%d, name_%d_of_e%d)\n' % (i % 37, i % 5, i))
+        self.attr_map = {'HasName': 'has_class_word', 'global-entities': ['has_id']}
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def convert(self, name, attr_processes):
+        prefix = os.path.join(self.dir, name)
+        available_parsers['mln'][0](prefix, self.attr_map, attr_processes=attr_processes).convert([self.fin])
+        arc = TZArchive(prefix, 'r:bz2')
+        return dict((m, arc.member(m).read()) for m in ['entities.attr', 'entities_attr.idx', 'tensor.ten'])
+
+    def test_same_archive(self):
+        batch = parser.ATTR_BATCH
+        parser.ATTR_BATCH = 7
+        try:
+            serial = self.convert('serial', 1)
+            pooled = self.convert('pooled', 3)
+        finally:
+            parser.ATTR_BATCH = batch
+        # attributes of has_class_word and has_id
+        names = serial['entities_attr.idx'].splitlines()
+        assert '2,HasName,NAME' in names and 'E0' in names
+        assert serial == pooled
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+from scipy.io import loadmat
+from tenc.batch import jobs_from_config, job_hash, parse_bytes, run_batch
+
+
+class TestBatch(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        self.prefix = os.path.join(self.dir, 'family')
+        self.state = os.path.join(self.dir, 'state.json')
+        with open(self.fin, 'w') as fout:
+            fout.write('Parent(Anna, Bob)\nParent(Bob, Carl)\nFriends(Anna, Carl)\n')
+        self.conf = {
+            'tenc': {'parser': 'mln', 'min_count_ent': '1'},
+            'attributes': {'HasWord': 'has_word'},
+            'jobs': {
+                'family': {'file': self.fin, 'serializer': 'ntriples'},
+            },
+        }
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_bytes(self):
+        assert 1024 == parse_bytes('1K')
+        assert 3 << 30 == parse_bytes('3g')
+        assert 100 == parse_bytes(100)
+
+    def test_jobs(self):
+        [(name, job)] = jobs_from_config(self.conf)
+        assert 'family' == name
+        assert 'family' == job['prefix']
+        assert 'mln' == job['parser']
+        assert [self.fin] == job['file']
+        assert ['ntriples'] == job['serializer']
+        assert {'HasWord': 'has_word'} == job['attributes']
+        # a memory limit does not switch to external id assignment
+        self.conf['jobs']['family']['max_memory'] = '8G'
+        job = jobs_from_config(self.conf)[0][1]
+        assert '8G' == job['max_memory'] and job['external_budget'] is None
+        del self.conf['jobs']['family']['max_memory']
+
+        h = job_hash(job)
+        self.conf['jobs']['family']['min_count_ent'] = '2'
+        assert h != job_hash(jobs_from_config(self.conf)[0][1])
+
+    def test_run_batch(self):
+        self.conf['jobs']['family']['prefix'] = self.prefix
+        farc = self.prefix + '.tz'
+        assert {} == run_batch(self.conf, state_file=self.state)
+        assert os.path.exists(farc)
+        # unchanged jobs are skipped
+        os.utime(farc, (0, 0))
+        assert {} == run_batch(self.conf, state_file=self.state)
+        assert 0 == os.stat(farc).st_mtime
+        assert {} == run_batch(self.conf, force=True, state_file=self.state)
+        assert 0 != os.stat(farc).st_mtime
+
+    def test_job_processes(self):
+        # jobs may start processes of their own
+        self.conf['jobs'] = {
+            'shards': {'file': self.fin, 'serializer': 'shards:subject:4', 'processes': '2',
+                       'prefix': self.prefix + '-a'},
+            'tfidf': {'file': self.fin, 'serializer': 'matlab', 'processes': '2',
+                      'postprocess': {'tensor': 'tfidf'}, 'prefix': self.prefix + '-b'},
+        }
+        assert {} == run_batch(self.conf, processes=2, state_file=self.state)
+        assert os.path.exists(self.prefix + '-a-shard-0.npz')
+        assert os.path.exists(self.prefix + '-b-tensor.mat')
+
+    def test_attr_processes(self, monkeypatch):
+        # attributes are extracted by a pool in batch jobs, with the same
+        # result as without
+        from tenc.parser import Converter
+        start_pool = Converter.start_pool
+
+        def start(self):
+            start_pool(self)
+            if self.pool is not None:
+                open(self.fname + '-pool', 'w').close()
+        monkeypatch.setattr(Converter, 'start_pool', start)
+        with open(self.fin, 'a') as fout:
+            fout.write('HasWord(Anna, Apple)\nHasWord(Bob, Pear)\nHasWord(Anna, Pear)\n')
+        self.conf['jobs'] = dict(
+            ('job%d' % n, {'file': self.fin, 'serializer': 'matlab', 'attr_processes': str(n),
+                           'prefix': '%s-%d' % (self.prefix, n)})
+            for n in [1, 2]
+        )
+        assert {} == run_batch(self.conf, state_file=self.state)
+        assert not os.path.exists(self.prefix + '-1-pool')
+        assert os.path.exists(self.prefix + '-2-pool')
+        a, b = [loadmat('%s-%d-tensor.mat' % (self.prefix, n)) for n in [1, 2]]
+        assert a['eattr'].nnz > 0
+        assert (a['eattr'] != b['eattr']).nnz == 0
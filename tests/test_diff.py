@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from tenc import diff as diff_module
+from tenc._tenc import TZArchive, write_archive
+from tenc.diff import align, diff, merge, pair_values
+from tenc.view import TensorView
+
+
+class TestDiff(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.old = os.path.join(self.dir, 'old')
+        self.new = os.path.join(self.dir, 'new')
+        # a -knows-> b, b -knows-> c (twice), c -likes-> a
+        write_archive(self.old, np.array([[0, 1, 0, 1.], [1, 2, 0, 1.], [2, 0, 1, 1.], [1, 2, 0, 1.]]),
+                      ['a', 'b', 'c'], ['knows', 'likes'],
+                      eattr=np.array([[0, 0, 1]]), eattr_names=['red'])
+        # other numbering: c -likes-> a (value 2), b -knows-> c, d -knows-> a
+        write_archive(self.new, np.array([[0, 3, 0, 2.], [1, 0, 1, 1.], [2, 3, 1, 1.]]),
+                      ['c', 'b', 'd', 'a'], ['likes', 'knows'],
+                      eattr=np.array([[3, 0, 2], [2, 1, 1]]), eattr_names=['red', 'blue'])
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, path):
+        with open(path) as fin:
+            return sorted(tuple(line.split('\t')[:3]) for line in fin)
+
+    def test_align(self):
+        names, remap = align(['a', 'b'], ['c', 'a'])
+        assert ['a', 'b', 'c'] == names
+        assert [2, 0] == remap.tolist()
+
+    def test_diff(self):
+        out = os.path.join(self.dir, 'diff')
+        # runs of two rows, such that runs are merged
+        counts = diff(self.old, self.new, out, max_rows=2)
+        # the second occurrence of b -knows-> c is removed
+        assert {'added': 1, 'removed': 2, 'changed': 1, 'unchanged': 1} == counts
+        assert [('d', 'knows', 'a')] == self.read(out + '-added.tsv')
+        assert [('a', 'knows', 'b'), ('b', 'knows', 'c')] == self.read(out + '-removed.tsv')
+        assert [('c', 'likes', 'a')] == self.read(out + '-changed.tsv')
+
+    def test_merge(self):
+        out = os.path.join(self.dir, 'merged')
+        merge(self.old, self.new, out, max_rows=2)
+        view = TensorView(out)
+        assert (4, 4, 2) == view.shape
+        assert ['a', 'b', 'c', 'd'] == view.entity_index()
+        # b -knows-> c occurs twice as in the first archive
+        assert 5 == view.nnz
+        # attribute counts of the second archive win
+        assert ['red', 'blue'] == view.entity_attributes_index()
+        attrs = sorted(tuple(l.split()) for l in view.member('entities.attr'))
+        assert [('0', '0', '2'), ('3', '1', '1')] == attrs
+
+    def test_multiset(self):
+        # a -knows-> b with values 1 and 2 against 2 and 1, 3
+        old = os.path.join(self.dir, 'm-old')
+        new = os.path.join(self.dir, 'm-new')
+        write_archive(old, np.array([[0, 1, 0, 1.], [0, 1, 0, 2.]]), ['a', 'b'], ['knows'])
+        write_archive(new, np.array([[0, 1, 0, 2.], [0, 1, 0, 3.], [0, 1, 0, 1.]]), ['a', 'b'], ['knows'])
+        out = os.path.join(self.dir, 'm')
+        counts = diff(old, new, out, max_rows=1)
+        assert {'added': 1, 'removed': 0, 'changed': 0, 'unchanged': 2} == counts
+        counts = diff(new, old, out, max_rows=1)
+        assert {'added': 0, 'removed': 1, 'changed': 0, 'unchanged': 2} == counts
+        merge(old, new, out, max_rows=1)
+        view = TensorView(out)
+        assert 3 == view.nnz
+        view.close()
+
+    def test_pair_values(self):
+        # equal values are paired first
+        assert [(5., 5.), (1., None)] == pair_values([1., 5.], [5.])
+        assert [(2., 2.), (1., 3.), (None, 4.)] == pair_values([1., 2.], [2., 3., 4.])
+        old = os.path.join(self.dir, 'p-old')
+        new = os.path.join(self.dir, 'p-new')
+        write_archive(old, np.array([[0, 1, 0, 1.], [0, 1, 0, 5.]]), ['a', 'b'], ['knows'])
+        write_archive(new, np.array([[0, 1, 0, 5.]]), ['a', 'b'], ['knows'])
+        out = os.path.join(self.dir, 'p')
+        counts = diff(old, new, out)
+        assert {'added': 0, 'removed': 1, 'changed': 0, 'unchanged': 1} == counts
+        with open(out + '-removed.tsv') as fin:
+            assert ['a', 'knows', 'b', '1.000000'] == fin.read().split()
+
+    def test_merge_metadata(self):
+        # value dtype and indexes of both archives are kept
+        a = os.path.join(self.dir, 'ia')
+        b = os.path.join(self.dir, 'ib')
+        write_archive(a, np.array([[0, 1, 0, 1.]]), ['a', 'b'], ['knows'],
+                      indexes=('predicate', 'subject'), values='int8')
+        write_archive(b, np.array([[1, 2, 1, 1.]]), ['b', 'c', 'd'], ['knows', 'likes'],
+                      indexes=('subject', 'object'), values='int8')
+        out = os.path.join(self.dir, 'merged')
+        merge(a, b, out)
+        assert 'int8' == TZArchive(out, 'r:bz2').metadata()['values']
+        view = TensorView(out)
+        assert view.has_index('subject')
+        assert not view.has_index('predicate') and not view.has_index('object')
+        assert [[0, 0, 1]] == view.edges([0], 'subject')[0].tolist()
+        assert [[2, 1, 3]] == view.edges([2], 'subject')[0].tolist()
+        view.close()
+
+    def test_failure(self, monkeypatch):
+        # no partial outputs and no sorted runs are left behind
+        tmp = os.path.join(self.dir, 'tmp')
+        os.mkdir(tmp)
+        monkeypatch.setattr(tempfile, 'tempdir', tmp)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('failed')
+        out = os.path.join(self.dir, 'out')
+        monkeypatch.setattr(diff_module, '_write_triples', fail)
+        with pytest.raises(RuntimeError):
+            diff(self.old, self.new, out, max_rows=2)
+        monkeypatch.setattr(diff_module, 'write_tensor_index', fail)
+        with pytest.raises(RuntimeError):
+            merge(self.old, self.new, out, max_rows=2)
+        assert [] == os.listdir(tmp)
+        assert sorted(['old.tz', 'new.tz', 'tmp']) == sorted(os.listdir(self.dir))
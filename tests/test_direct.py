@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from scipy.io import loadmat
+from tenc.batch import make_job, run_job
+from tenc.serializer import Matlab
+
+
+class TestDirect(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        rng = np.random.RandomState(0)
+        names = ['E%d' % int(i) for i in rng.zipf(1.5, 400) % 50]
+        with open(self.fin, 'w') as fout:
+            for i in xrange(0, len(names), 2):
+                fout.write('P%d(%s, %s)\n' % (i % 3, names[i], names[i + 1]))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def run(self, name, serializer, **options):
+        prefix = os.path.join(self.dir, name)
+        options.update({'file': self.fin, 'parser': 'mln', 'serializer': serializer,
+                        'prefix': prefix, 'min_count_ent': 2})
+        run_job(make_job(options))
+        return prefix
+
+    def test_same_output(self):
+        for serializer in ['matlab', 'matlab,mln']:
+            a = self.run('archive', serializer)
+            b = self.run('direct', serializer, direct=True)
+            assert os.path.exists(a + '.tz')
+            assert not os.path.exists(b + '.tz')
+            mat_a, mat_b = loadmat(a + '-tensor.mat'), loadmat(b + '-tensor.mat')
+            for key in ['subs', 'vals', 'size']:
+                assert (mat_a[key] == mat_b[key]).all()
+            for suffix in ['-entities_pruned.idx', '-predicates_pruned.idx']:
+                assert open(a + suffix).read() == open(b + suffix).read()
+        assert open(a + '-generated.db').read() == open(b + '-generated.db').read()
+
+    def test_keep_archive(self):
+        a = self.run('archive', 'mln')
+        b = self.run('direct', 'mln', direct=True, keep_archive=True)
+        assert open(a + '-generated.db').read() == open(b + '-generated.db').read()
+        # the archive can be serialized again
+        c = self.run('direct', 'mln', do_convert=False)
+        assert open(a + '-generated.db').read() == open(c + '-generated.db').read()
+
+    def test_failure(self, monkeypatch):
+        # a failing serializer leaves neither an archive nor uncompressed
+        # members behind
+        tmp = os.path.join(self.dir, 'tmp')
+        os.mkdir(tmp)
+        monkeypatch.setattr(tempfile, 'tempdir', tmp)
+
+        def fail(self):
+            raise RuntimeError('failed')
+        monkeypatch.setattr(Matlab, 'write', fail)
+        with pytest.raises(RuntimeError):
+            self.run('direct', 'matlab', direct=True, keep_archive=True)
+        assert not os.path.exists(os.path.join(self.dir, 'direct.tz'))
+        assert [] == os.listdir(tmp)
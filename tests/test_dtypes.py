@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from scipy.io import loadmat
+from tenc import TZArchive
+from tenc._tenc import cast_values, index_dtype, value_dtype
+from tenc.batch import make_job, run_job
+
+
+def load(fname):
+    try:
+        return loadmat(fname)
+    except NotImplementedError:
+        # MATLAB v7.3 files of matlab-stream, datasets are transposed
+        import h5py
+        f = h5py.File(fname, 'r')
+        mat = dict((k, f[k][()].T) for k in ['subs', 'vals'] if k in f)
+        if 'vals' in mat and f['vals'].attrs['MATLAB_class'] == 'logical':
+            mat['vals'] = mat['vals'].astype(bool)
+        f.close()
+        return mat
+
+
+def test_index_dtype():
+    assert np.int8 == index_dtype(127)
+    assert np.int16 == index_dtype(128)
+    assert np.int32 == index_dtype(100, np.int32)
+    assert np.int64 == index_dtype(2 ** 31)
+    assert None is value_dtype('ones')
+    assert np.float32 == value_dtype('float32')
+    with pytest.raises(ValueError):
+        value_dtype('float16')
+
+
+def test_cast_values():
+    int8 = np.dtype(np.int8)
+    assert [-128, 0, 127] == cast_values(np.array([-128., 0, 127]), int8).tolist()
+    # fractions would be truncated, large counts would wrap
+    for vals in [[1, 0.5], [1, 128]]:
+        with pytest.raises(ValueError):
+            cast_values(np.array(vals), int8)
+    assert [True, True] == cast_values(np.array([0.5, 128]), np.dtype(bool)).tolist()
+
+
+class TestDtypes(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        with open(self.fin, 'w') as fout:
+            for i in xrange(300):
+                fout.write('%sP%d(E%d, E%d)\n' % ('!' if i % 4 == 0 else '', i % 3, i % 200, (i * 7) % 200))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def run(self, name, serializer, **options):
+        prefix = os.path.join(self.dir, name)
+        options.update({'file': self.fin, 'parser': 'mln', 'serializer': serializer, 'prefix': prefix})
+        run_job(make_job(options))
+        return prefix
+
+    def test_metadata(self):
+        prefix = self.run('meta', 'mln', values='float32')
+        assert {'index_dtype': 'int16', 'values': 'float32'} == TZArchive(prefix, 'r:bz2').metadata()
+        mat = loadmat(self.run('meta', 'matlab', do_convert=False) + '-tensor.mat')
+        assert np.float32 == mat['vals'].dtype
+
+    @pytest.mark.parametrize('serializer', ['matlab', 'matlab-stream'])
+    def test_matlab(self, serializer):
+        ref = load(self.run('ref', serializer, values='float64') + '-tensor.mat')
+        assert np.int16 == ref['subs'].dtype
+        assert np.double == ref['vals'].dtype
+        for values in ['float32', 'int8', 'bool', 'ones']:
+            mat = load(self.run(values, serializer, values=values) + '-tensor.mat')
+            assert (ref['subs'] == mat['subs']).all()
+            if values == 'ones':
+                assert not 'vals' in mat
+            else:
+                assert (ref['vals'].astype(values) == mat['vals']).all()
+
+    def test_shards(self):
+        prefix = self.run('shards', 'shards:subject:2', values='ones')
+        shard = np.load(prefix + '-shard-0.npz')
+        assert not 'vals' in shard.files
+        assert np.int16 == shard['entities'].dtype
+
+    def reverb(self):
+        # ReVerb confidences
+        fin = os.path.join(self.dir, 'reverb.tsv')
+        with open(fin, 'w') as fout:
+            for i in xrange(20):
+                fout.write('\t'.join(['0'] * 4 + ['E%d' % (i % 5), 'P', 'E%d' % (i % 3), '', '0.%d' % (i % 9 + 1)]) + '\n')
+        return fin
+
+    @pytest.mark.parametrize('serializer', ['matlab', 'matlab-stream', 'shards:subject:2'])
+    def test_fractional_int8(self, serializer):
+        prefix = os.path.join(self.dir, 'reverb')
+        with pytest.raises(ValueError):
+            run_job(make_job({'file': self.reverb(), 'parser': 'reverb', 'serializer': serializer, 'prefix': prefix,
+                              'values': 'int8'}))
+
+    @pytest.mark.parametrize('serializer', ['matlab', 'matlab-stream', 'shards:subject:1'])
+    def test_fractional_bool(self, serializer):
+        # nonzero confidences are true
+        prefix = os.path.join(self.dir, 'reverb')
+        run_job(make_job({'file': self.reverb(), 'parser': 'reverb', 'serializer': serializer, 'prefix': prefix,
+                          'values': 'bool'}))
+        if serializer.startswith('shards'):
+            vals = np.load(prefix + '-shard-0.npz')['vals']
+        else:
+            vals = load(prefix + '-tensor.mat')['vals']
+        assert 0 < len(vals) and (vals == 1).all()
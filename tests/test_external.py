@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import pytest
+from tenc import MAP, available_parsers
+from tenc.view import TensorView
+from tenc.external import HashVocabulary
+
+
+class TestExternal(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        names = ['Anna', 'Bob', 'Carl', 'Dora', 'Emil']
+        with open(self.fin, 'w') as fout:
+            for i, a in enumerate(names):
+                fout.write('Parent(%s, %s)\n' % (a, names[(i + 1) % 5]))
+                fout.write('Friends(%s, %s)\n' % (a, names[(i + 2) % 5]))
+            fout.write('!Friends(Anna, Bob)\n')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def triples(self, fname):
+        view = TensorView(fname)
+        entities, predicates = view.entity_index(), view.predicate_index()
+        triples, vals = view.edges(range(view.shape[0]), 'subject')
+        counts = (view.counts[MAP.ENTITY], view.counts[MAP.PREDICATE])
+        return counts, sorted(
+            (entities[s], predicates[p], entities[o], v) for (s, p, o), v in zip(triples.tolist(), vals)
+        )
+
+    def test_convert(self):
+        parser_cls = available_parsers['mln'][0]
+        memory = os.path.join(self.dir, 'memory')
+        parser_cls(memory, indexes=('subject',)).convert([self.fin])
+        # budget for two names, such that the vocabulary is spilled to runs
+        hashed = os.path.join(self.dir, 'hashed')
+        parser_cls(hashed, indexes=('subject',), external_budget=1000).convert([self.fin])
+
+        (ecount, pcount), triples = self.triples(memory)
+        (hecount, hpcount), htriples = self.triples(hashed)
+        assert triples == htriples
+        assert sorted(ecount.tolist()) == sorted(hecount.tolist())
+        assert sorted(pcount.tolist()) == sorted(hpcount.tolist())
+
+    def test_vocabulary(self):
+        vocab = HashVocabulary(0)
+        hashes = [vocab[name] for name in ['b', 'a', 'b', 'c']]
+        # b is in two runs and merged again
+        assert 4 == len(vocab.runs)
+        with tempfile.TemporaryFile() as fout:
+            assert 3 == vocab.assign(fout)
+            fout.seek(0)
+            assert 'length: 3' == fout.readline().strip()
+        ids = vocab.ids(hashes).tolist()
+        assert ids[0] == ids[2] and sorted(set(ids)) == [0, 1, 2]
+
+    def test_collision(self):
+        vocab = HashVocabulary(1 << 20)
+        vocab.names[vocab['a']] = 'b'
+        with pytest.raises(ValueError):
+            vocab['a']
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+from tenc.index import build_index, Member
+from tenc.view import LRUCache
+
+
+class TestIndex(object):
+    def setup(self):
+        # rows of tensor.ten: s, o, p, val
+        self.rows = np.array([[0, 1, 2, 1.], [1, 2, 0, 2.], [2, 0, 2, 3.], [1, 1, 1, 4.], [0, 2, 0, 5.]])
+
+    def test_build_index(self):
+        blocks = lambda: [self.rows[:2], self.rows[2:]]
+        paths = build_index(blocks, 'predicate', 3)
+        offsets = np.load(paths['offsets'])
+        assert [0, 2, 3, 5] == offsets.tolist()
+        subs = np.load(paths['subs'])
+        vals = np.load(paths['vals'])
+        # rows are sorted by predicate, order within a predicate is kept
+        assert [2., 5., 4., 1., 3.] == vals.tolist()
+        assert [[1, 2], [0, 2], [1, 1], [0, 1], [2, 0]] == subs.tolist()
+
+        with open(paths['subs'], 'rb') as fin:
+            m = Member(fin)
+            assert len(m) == 5
+            assert (m.rows(3, 5) == subs[3:5]).all()
+        for path in paths.itervalues():
+            os.remove(path)
+
+    def test_lru_cache(self):
+        c = LRUCache(max_bytes=200)
+        c.put(0, (np.zeros(10),))
+        c.put(1, (np.zeros(10),))
+        c.get(0)
+        c.put(2, (np.zeros(10),))
+        # least recently used entry is evicted
+        assert c.get(1) is None
+        assert c.get(0) is not None and c.get(2) is not None
+        assert c.nbytes == 160
@@ -0,0 +1,58 @@
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pytest
+from scipy.io import loadmat
+from tenc._tenc import write_archive
+from tenc.serializer import Matlab, MatlabStream, _Mat5Stream
+
+
+class TestMatlabStream(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'tensor')
+        rng = np.random.RandomState(0)
+        rows = np.column_stack([rng.zipf(1.5, 500) % 60, rng.zipf(1.5, 500) % 60,
+                                rng.randint(0, 5, 500), rng.randint(1, 4, 500)])
+        eattr = np.array([[i, i % 3, 1] for i in xrange(60)])
+        write_archive(self.fname, rows, ['e%d' % i for i in xrange(60)], ['p%d' % i for i in xrange(5)],
+                      eattr=eattr, eattr_names=['a%d' % i for i in xrange(3)])
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def serialize(self, cls):
+        cls(self.fname).serialize((2, 1))
+        return self.fname + '-tensor.mat'
+
+    def test_v5(self, monkeypatch):
+        ref = loadmat(self.serialize(Matlab))
+        # without h5py, matlab-stream writes v5 files
+        monkeypatch.setitem(sys.modules, 'h5py', None)
+        mat = loadmat(self.serialize(MatlabStream))
+        for key in ['subs', 'vals', 'size']:
+            assert ref[key].dtype == mat[key].dtype
+            assert (ref[key] == mat[key]).all()
+        assert (ref['eattr'] != mat['eattr']).nnz == 0
+
+    def test_v73(self):
+        h5py = pytest.importorskip('h5py')
+        ref = loadmat(self.serialize(Matlab))
+        f = h5py.File(self.serialize(MatlabStream), 'r')
+        # MATLAB stores arrays in column-major order
+        assert (ref['subs'] == f['subs'][()].T).all()
+        assert (ref['vals'] == f['vals'][()].T).all()
+        assert (ref['size'] == f['size'][()].T).all()
+        assert 'int8' == f['subs'].attrs['MATLAB_class']
+        f.close()
+
+    def test_v5_limit(self, monkeypatch):
+        monkeypatch.setattr(_Mat5Stream, 'max_bytes', 100)
+        stream = _Mat5Stream(os.path.join(self.dir, 'large.mat'), np.int8)
+        stream.append(np.ones((10, 3), dtype=np.int8), np.ones(10))
+        # fails while appending, not after all data has been streamed
+        with pytest.raises(ValueError):
+            stream.append(np.ones((10, 3), dtype=np.int8), np.ones(10))
+        assert 10 == stream.nnz
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+from tenc import TZArchive, available_parsers, entities_index, predicates_index
+from tenc.parser import ReVerb, TabPublic, YPSSFacts
+
+
+class TestTabDelimited(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_lines(self):
+        p = TabPublic(os.path.join(self.dir, 'tab'))
+        assert [('a', 'r', 'b', 1), ('b', 'r', 'c', 1)] == p.parse_lines(['a\tr\tb\n', '\n', 'b\tr\tc\textra\tcolumns'])
+        p = YPSSFacts(os.path.join(self.dir, 'ypss'))
+        assert [('a', 'r', 'b', 0.5)] == p.parse_lines(['0\t1\t2\ta\tr\tb\t0.5\tx\ty\n'])
+
+    def test_reverb(self):
+        fin = os.path.join(self.dir, 'reverb.txt')
+        with open(fin, 'w') as fout:
+            for i, (s, p, o) in enumerate([('a', 'likes', 'b'), ('b', 'likes', 'c'), ('a', 'knows', 'c')]):
+                cols = ['%d' % i, 'src', s, p, s, p, o, 'sentence %d' % i, '0.%d' % (i + 1)]
+                # wide rows with normalized arguments and tags after the value
+                fout.write('\t'.join(cols + ['n1', 'n2', 'n3', 'NN VB NN']) + '\n')
+        prefix = os.path.join(self.dir, 'reverb')
+        available_parsers['reverb'][0](prefix).convert([fin])
+        assert ['a', 'b', 'c'] == entities_index(prefix + '.tz')
+        assert ['likes', 'knows'] == predicates_index(prefix + '.tz')
+        arc = TZArchive(prefix, 'r:bz2')
+        tensor = arc.member('tensor.ten').read()
+        assert '0 1 0 0.100000\n1 2 0 0.200000\n0 2 1 0.300000\n' == tensor
+
+    def test_write_batch(self):
+        # same archive as writing the triples one by one, with attributes
+        rows = [('a', 'likes', 'b', 1), ('b', 'name', 'bob_b', 1), ('c', 'likes', 'a', 0.5), ('a', 'likes', 'b', 2)]
+        tensors = []
+        for batch in [True, False]:
+            prefix = os.path.join(self.dir, 'batch-%s' % batch)
+            p = TabPublic(prefix, {'name': 'has_class_word'})
+            p.parse_lines = lambda lines: rows
+            if not batch:
+                p.write_batch = lambda rows: [p.write(*t) for t in rows]
+            p.parse_file = lambda fin: p.write_batch(p.parse_lines([]))
+            p.convert(['unused'])
+            arc = TZArchive(prefix, 'r:bz2')
+            tensors.append([arc.member(name).read() for name in
+                            ['tensor.ten', 'tensor.size', 'entities.attr', 'entities_attr.idx']])
+            assert ['a', 'b', 'c'] == entities_index(prefix + '.tz')
+        assert tensors[0] == tensors[1]
+        assert '0 1 0 1.000000\n2 0 0 0.500000\n0 1 0 2.000000\n' == tensors[0][0]
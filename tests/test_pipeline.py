@@ -0,0 +1,88 @@
+import bz2
+import os
+import shutil
+import tempfile
+import threading
+import time
+from itertools import imap
+import numpy as np
+import pytest
+from tenc import TZArchive, available_parsers, entities_index, predicates_index
+from tenc import pipeline
+from tenc.pipeline import Writer, read_chunks, threaded
+
+
+class TestPipeline(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db.bz2')
+        rng = np.random.RandomState(0)
+        names = ['E%d' % int(i) for i in rng.zipf(1.5, 2000) % 300]
+        fout = bz2.BZ2File(self.fin, 'w')
+        for i in xrange(0, len(names), 2):
+            fout.write('%sP%d(%s, %s)\n\n' % ('!' if i % 7 == 0 else '', i % 5, names[i], names[i + 1]))
+        fout.close()
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def convert(self, name, pipelined):
+        fname = os.path.join(self.dir, name)
+        available_parsers['mln'][0](fname, pipelined=pipelined).convert([self.fin])
+        arc = TZArchive(fname, 'r:bz2')
+        tensor = arc.member('tensor.ten').read()
+        return tensor, entities_index(fname + '.tz'), predicates_index(fname + '.tz')
+
+    def test_same_archive(self):
+        chunk_bytes = pipeline.CHUNK_BYTES
+        pipeline.CHUNK_BYTES = 64
+        try:
+            serial = self.convert('serial', False)
+            pipelined = self.convert('pipelined', True)
+        finally:
+            pipeline.CHUNK_BYTES = chunk_bytes
+        assert 1000 == len(serial[0].splitlines())
+        assert serial == pipelined
+
+    def test_read_chunks(self):
+        lines = [l for chunk in read_chunks(self.fin, 100) for l in chunk]
+        assert lines == bz2.BZ2File(self.fin).read().splitlines()
+
+    def test_threaded_failure(self):
+        with pytest.raises(ZeroDivisionError):
+            list(threaded(1 / (3 - i) for i in xrange(5)))
+
+    def test_threaded_stop(self):
+        # the consumer fails after the first chunk, nested stages stop and
+        # close the input file
+        closed = threading.Event()
+
+        def produce():
+            try:
+                for i in xrange(1000):
+                    yield i
+            finally:
+                closed.set()
+
+        threads = threading.active_count()
+        chunks = threaded(imap(str, threaded(produce(), maxsize=1)), maxsize=1)
+        with pytest.raises(ZeroDivisionError):
+            for chunk in chunks:
+                1 / 0
+        chunks.close()
+        assert closed.wait(10 * pipeline.POLL)
+        for _ in xrange(100):
+            if threading.active_count() == threads:
+                break
+            time.sleep(pipeline.POLL)
+        assert threads == threading.active_count()
+
+    def test_writer(self):
+        fname = os.path.join(self.dir, 'out')
+        with open(fname, 'wb') as fout:
+            w = Writer(fout, maxsize=1)
+            for i in xrange(50000):
+                w.write('%d\n' % i)
+            w.close()
+        with open(fname) as fin:
+            assert range(50000) == [int(l) for l in fin]
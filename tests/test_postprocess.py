@@ -0,0 +1,39 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from tenc.postprocess import tfidf, normalize, process_matrix, process_slices
+
+
+class TestPostprocess(object):
+    def setup(self):
+        self.X = csr_matrix([[3, 0, 1], [2, 0, 0], [3, 0, 0], [4, 0, 0], [3, 2, 0], [3, 0, 2]])
+
+    def test_tfidf(self):
+        # reference values of scikit-learn's TfidfTransformer
+        T = tfidf(self.X, smooth_idf=False).toarray()
+        assert np.allclose(T[0], [0.81940995, 0, 0.57320793])
+        assert np.allclose(T[4], [0.47330339, 0.88089948, 0])
+        T = tfidf(self.X).toarray()
+        assert np.allclose(T[0], [0.85151335, 0, 0.52433293])
+        T = tfidf(self.X, sublinear_tf=True, norm=None).toarray()
+        assert np.allclose(T[0, 0], (1 + np.log(3)) * (np.log(7 / 7.) + 1))
+
+    def test_normalize(self):
+        assert np.allclose(normalize(self.X, 'l1').sum(axis=1), 1)
+        assert np.allclose(normalize(self.X, 'l2').multiply(normalize(self.X, 'l2')).sum(axis=1), 1)
+
+    def test_pipeline(self):
+        # chunked pipeline has to agree with tfidf on the full matrix
+        T = process_matrix('tfidf', self.X, chunk_size=4)
+        assert np.allclose(T.toarray(), tfidf(self.X).toarray())
+        T = process_matrix('colcap:0.5,l1', self.X).toarray()
+        assert (T[:, 0] == 0).all()
+        assert np.allclose(T[[0, 4, 5]].sum(axis=1), 1)
+
+    def test_process_slices(self):
+        rows = np.array([0, 1, 0, 1])
+        cols = np.array([0, 0, 1, 1])
+        slices = np.array([1, 0, 1, 0])
+        vals = np.array([1., 3., 3., 1.])
+        out = process_slices('l1', rows, cols, slices, vals, (2, 2))
+        assert np.allclose(out, [0.25, 0.75, 0.75, 0.25])
+        assert np.allclose(out, process_slices('l1', rows, cols, slices, vals, (2, 2), processes=2))
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from tenc import MAP, TZArchive
+from tenc._tenc import write_archive
+from tenc.serializer import ArchiveReader
+from tenc.reorder import attribute_order, read_edges, locality
+
+
+class TestReorder(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'chain')
+        # chain over scattered ids and a hub with id 0
+        rng = np.random.RandomState(0)
+        ids = rng.permutation(20)
+        rows = [[ids[i], ids[i + 1], 0, 1.] for i in xrange(19)]
+        rows += [[ids[0], ids[i], 1, 1.] for i in xrange(2, 20, 3)]
+        self.entities = ['e%d' % i for i in xrange(20)]
+        eattr = np.array([[i, i % 2, 1] for i in xrange(20)])
+        write_archive(self.fname, np.array(rows), self.entities, ['next', 'hub'],
+                      eattr=eattr, eattr_names=['even', 'odd'])
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def triples(self, reader):
+        names = dict((v, self.entities[k]) for k, v in reader.eidx.iteritems())
+        return sorted((names[s], p, names[o]) for chunk in reader.relation_chunks() for s, p, o, _ in chunk)
+
+    def test_reorder(self):
+        reader = ArchiveReader(TZArchive(self.fname, 'r:bz2'), (0, 0))
+        before = locality(read_edges(reader))
+        for order in ['degree', 'rcm', 'attribute']:
+            r = ArchiveReader(TZArchive(self.fname, 'r:bz2'), (0, 0), order)
+            # same triples, entity names follow their new ids
+            assert self.triples(reader) == self.triples(r)
+            assert sorted(r.eidx.values()) == range(20)
+            if order == 'degree':
+                assert (np.diff(r.nnz[MAP.ENTITY]) <= 0).all()
+            if order == 'rcm':
+                assert locality(read_edges(r))['bandwidth'] < before['bandwidth']
+            if order == 'attribute':
+                groups = [a for chunk, _ in r.entity_attribute_chunks() for e, a in sorted(chunk.tolist())]
+                assert groups == sorted(groups)
+
+
+class MockReader(object):
+    def __init__(self, N, chunks):
+        self.nnz = [np.zeros(N), None, 0, 0]
+        self.chunks = chunks
+
+    def entity_attribute_chunks(self):
+        return iter(self.chunks)
+
+
+def test_attribute_order():
+    rng = np.random.RandomState(0)
+    N = 30
+    chunks = [(rng.randint(0, N - 5, size=(50, 2)), rng.randint(1, 4, size=50).astype(np.double))
+              for _ in xrange(4)]
+    # reference: most frequent attribute, smallest attribute on ties
+    best, group = np.zeros(N), np.empty(N, dtype=np.int)
+    group.fill(np.iinfo(np.int).max)
+    for subs, vals in chunks:
+        for (e, a), v in zip(subs.tolist(), vals.tolist()):
+            if v > best[e] or (v == best[e] and a < group[e]):
+                best[e], group[e] = v, a
+    expected = np.lexsort((np.zeros(N), group))
+    assert (expected == attribute_order(MockReader(N, chunks), None)).all()
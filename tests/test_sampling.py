@@ -0,0 +1,50 @@
+import numpy as np
+from tenc.sampling import split, SortedIndex, NegativeSampler
+
+
+class TestSampling(object):
+    def setup(self):
+        rng = np.random.RandomState(1)
+        self.N, self.K = 50, 4
+        subs = np.column_stack((rng.randint(self.N, size=1000), rng.randint(self.K, size=1000),
+                                rng.randint(self.N, size=1000)))
+        # unique triples
+        keys = np.unique((subs[:, 0] * self.K + subs[:, 1]) * self.N + subs[:, 2])
+        self.subs = np.column_stack((keys // self.N // self.K, keys // self.N % self.K, keys % self.N))
+
+    def test_split(self):
+        for mode in ['random', 'stratified', 'entity']:
+            parts = split(self.subs, (0.6, 0.2, 0.2), mode, seed=3)
+            idx = np.concatenate(parts)
+            assert len(np.unique(idx)) == len(idx)
+            if mode != 'entity':
+                assert len(idx) == len(self.subs)
+            # reproducible
+            assert all((a == b).all() for a, b in zip(parts, split(self.subs, (0.6, 0.2, 0.2), mode, seed=3)))
+
+    def test_entity_split(self):
+        parts = split(self.subs, (0.6, 0.2, 0.2), 'entity')
+        entities = [set(self.subs[idx][:, [0, 2]].ravel()) for idx in parts]
+        assert all(len(e) > 0 for e in entities)
+        for i in xrange(3):
+            for j in xrange(i + 1, 3):
+                assert len(entities[i] & entities[j]) == 0
+        # only triples between entities of different parts are dropped
+        idx = np.concatenate(parts)
+        dropped = np.setdiff1d(np.arange(len(self.subs)), idx)
+        assert len(dropped) > 0
+        for s, _, o in self.subs[dropped]:
+            assert not any(s in e and o in e for e in entities)
+
+    def test_sorted_index(self):
+        s, p, o = self.subs.T
+        idx = SortedIndex(s, p, o, self.K, self.N)
+        assert idx.contains(s, p, o).all()
+        expected = np.sort(o[(s == s[0]) & (p == p[0])])
+        assert (idx.neighbors(s[0], p[0]) == expected).all()
+
+    def test_filtered_negatives(self):
+        sampler = NegativeSampler(self.subs, (self.N, self.K), seed=0)
+        for pos, neg in sampler.batches(self.subs, batch_size=100, negatives=2):
+            assert len(neg) == 2 * len(pos)
+            assert not sampler.is_positive(neg).any()
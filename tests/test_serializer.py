@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from tenc._tenc import write_archive
+from tenc.serializer import _Channel, _END, Matlab, NTriples, Serializer, fanout
+
+
+class MockReader(object):
+    eidx = {0: 0}
+    pidx = {0: 0}
+    nnz = [[1], [1], 0, 0]
+    meta = {}
+    eremap = None
+    premap = None
+
+
+class TestChannel(object):
+
+    def test_skip_sections(self):
+        c = _Channel(MockReader(), 10)
+        for item in [('relations', [1]), ('relations', [2]), ('eattr', [3]), ('rattr', [4]), _END]:
+            c.put(item)
+        # serializer only asks for relations and predicate attributes
+        assert [[1], [2]] == list(c.relation_chunks())
+        assert [[4]] == list(c.predicate_attribute_chunks())
+        c.drain()
+        assert c.closed
+
+
+class Failing(Serializer):
+
+    def write(self):
+        for i, _ in enumerate(self.relations()):
+            if i == 10:
+                raise RuntimeError('failing serializer')
+
+
+class TestFanout(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        rng = np.random.RandomState(0)
+        rows = np.column_stack([rng.zipf(1.5, 300) % 40, rng.zipf(1.5, 300) % 40,
+                                rng.randint(0, 4, 300), np.ones(300)])
+        eattr = np.array([[i, i % 3, 1] for i in xrange(40)])
+        for name in ['single', 'fanout']:
+            write_archive(os.path.join(self.dir, name), rows, ['e%d' % i for i in xrange(40)],
+                          ['p%d' % i for i in xrange(4)], eattr=eattr,
+                          eattr_names=['attr,a%d,v' % i for i in xrange(3)])
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def outputs(self, name):
+        prefix = os.path.join(self.dir, name)
+        out = {}
+        for suffix in ['-tensor.mat', '-generated.nt', '-entities_pruned.idx', '-predicates_pruned.idx']:
+            if os.path.exists(prefix + suffix):
+                # N-Triples URIs contain the prefix
+                data = open(prefix + suffix, 'rb').read().replace(prefix, '')
+                # skip the MAT-file header, it holds the creation time
+                out[suffix] = data[128:] if suffix.endswith('.mat') else data
+        return out
+
+    def test_same_output(self):
+        single = os.path.join(self.dir, 'single')
+        for cls in [Matlab, NTriples]:
+            cls(single).serialize((2, 1))
+        fanout([cls(os.path.join(self.dir, 'fanout')) for cls in [Matlab, NTriples]], (2, 1))
+        expected = self.outputs('single')
+        assert len(expected) == 4
+        assert expected == self.outputs('fanout')
+
+    def test_failing_serializer(self):
+        single = os.path.join(self.dir, 'single')
+        fname = os.path.join(self.dir, 'fanout')
+        Matlab(single).serialize((2, 1))
+        with pytest.raises(RuntimeError):
+            fanout([Failing(fname), Matlab(fname)], (2, 1))
+        # the other serializer still gets all chunks
+        out = self.outputs('fanout')
+        assert self.outputs('single')['-tensor.mat'] == out['-tensor.mat']
+        assert not '-entities_pruned.idx' in out
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pytest
+from tenc import query_client
+from tenc._tenc import write_archive
+from tenc.serve import QueryService, make_server, parse_address
+
+
+def test_parse_address():
+    assert ('http', ('127.0.0.1', 8080)) == parse_address('8080')
+    assert ('http', ('localhost', 0)) == parse_address('localhost:0')
+    assert ('unix', '/tmp/tenc.sock') == parse_address('/tmp/tenc.sock')
+    with pytest.raises(ValueError):
+        parse_address('0.0.0.0:8080')
+
+
+class TestServe(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'chain')
+        # chain 0 -> 1 -> 2 -> 3 with two predicates
+        rows = np.array([[0, 1, 0, 1.], [1, 2, 1, 2.], [2, 3, 0, 3.]])
+        names = ['e%d' % i for i in xrange(4)]
+        write_archive(self.fname, rows, names, ['p0', 'p1'], eattr=np.array([[1, 0, 2]]),
+                      eattr_names=['HasWord,w'], indexes=('predicate', 'subject', 'object'))
+        self.service = QueryService(self.fname, cache_bytes=1 << 10)
+        self.servers = []
+
+    def teardown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.service.close()
+        shutil.rmtree(self.dir)
+
+    def client(self, address):
+        server = make_server(self.service, address)
+        t = threading.Thread(target=server.serve_forever, args=(0.05,))
+        t.daemon = True
+        t.start()
+        self.servers.append(server)
+        if isinstance(server.server_address, tuple):
+            address = '%s:%d' % server.server_address
+        return query_client(address, timeout=10)
+
+    @pytest.mark.parametrize('transport', ['unix', 'http'])
+    def test_queries(self, transport):
+        c = self.client(os.path.join(self.dir, 'sock') if transport == 'unix' else 'localhost:0')
+        assert [1, None] == c.ids(['e1', 'x'])
+        assert ['p1'] == c.names([1], 'predicates')
+        out = c.neighbors(['e1', 3])
+        assert [[0, 0, 1], [1, 1, 2]] == sorted(out[0].tolist())
+        assert [[2, 0, 3]] == out[1].tolist()
+        assert [[('HasWord,w', 2.0)], []] == c.attributes(['e1', 'e2'])
+        subs, vals = c.slices(['p0'])[0]
+        assert [[0, 1], [2, 3]] == subs.tolist() and [1., 3.] == vals.tolist()
+        with pytest.raises(RuntimeError):
+            c.names([9])
+        # the connection survives errors, repeated lookups are cached
+        assert [1] == c.ids(['e1'])
+        stats = c.stats()
+        assert 2 == stats['ops']['ids']['requests']
+        assert 1 == stats['ops']['names']['errors']
+        assert stats['cache']['hits'] >= 1
+        c.close()
+
+    def test_socket_path(self):
+        # a file at the socket path is not replaced
+        path = os.path.join(self.dir, 'file')
+        open(path, 'w').close()
+        with pytest.raises(ValueError):
+            make_server(self.service, path)
+        assert os.path.isfile(path)
+        # a stale socket is
+        path = os.path.join(self.dir, 'sock')
+        make_server(self.service, path).server_close()
+        make_server(self.service, path).server_close()
+
+    def test_adjacency(self):
+        # indexes the archive lacks are built at startup
+        fname = os.path.join(self.dir, 'plain')
+        write_archive(fname, np.array([[0, 1, 0, 1.], [1, 2, 1, 2.]]), ['a', 'b', 'c'], ['p0', 'p1'])
+        service = QueryService(fname)
+        try:
+            assert all(service.view.adjacency[name] is not None for name in ['subject', 'object'])
+            assert [[0, 0, 1], [1, 1, 2]] == sorted(service.view.neighbors('b').tolist())
+        finally:
+            service.close()
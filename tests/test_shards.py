@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from tenc._tenc import write_archive
+from tenc.serializer import Shards
+
+
+def _fail(args):
+    raise IOError('disk full')
+
+
+class TestShards(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'graph')
+        rng = np.random.RandomState(0)
+        self.rows = np.column_stack((rng.randint(0, 30, 200), rng.randint(0, 30, 200),
+                                     rng.randint(0, 5, 200), rng.randint(1, 4, 200)))
+        write_archive(self.fname, self.rows, ['e%d' % i for i in xrange(30)], ['p%d' % i for i in xrange(5)])
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_arg(self):
+        assert {'scheme': 'grid', 'nshards': 4} == Shards.parse_arg('grid:4')
+        with pytest.raises(ValueError):
+            Shards.parse_arg('grid:8')
+        with pytest.raises(ValueError):
+            Shards.parse_arg('object')
+
+    @pytest.mark.parametrize('arg', ['subject:3', 'grid:4', 'predicate:2'])
+    def test_shards(self, arg):
+        ser = Shards(self.fname)
+        ser.configure(arg)
+        ser.serialize((0, 0))
+        with open(self.fname + '-shards.json') as fin:
+            manifest = json.load(fin)
+        assert [30, 30, 5] == manifest['shape']
+
+        triples, seen = [], set()
+        for entry in manifest['shards']:
+            shard = np.load(os.path.join(self.dir, entry['file']))
+            e, p = shard['entities'], shard['predicates']
+            assert entry['nnz'] == len(shard['vals'])
+            for (s, o, k), v in zip(shard['subs'].tolist(), shard['vals'].tolist()):
+                triples.append((e[s], e[o], p[k], v))
+            if arg.startswith('subject'):
+                # subjects are not split between shards
+                assert len(set(e[shard['subs'][:, 0]]) & seen) == 0
+                seen |= set(e[shard['subs'][:, 0]])
+        assert sorted(map(tuple, self.rows.tolist())) == sorted(triples)
+
+    def test_failing_shard(self, monkeypatch):
+        tmp = os.path.join(self.dir, 'tmp')
+        os.mkdir(tmp)
+        monkeypatch.setattr(tempfile, 'tempdir', tmp)
+        monkeypatch.setattr('tenc.serializer._write_shard', _fail)
+        for processes in [1, 2]:
+            ser = Shards(self.fname, processes=processes)
+            ser.configure('subject:4')
+            with pytest.raises(IOError):
+                ser.serialize((0, 0))
+            # the temporary shard files are removed
+            assert [] == os.listdir(tmp)
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from tenc import MAP, TZArchive, available_parsers, entities_index, predicates_index
+from tenc.batch import check_job, make_job
+from tenc.serializer import ArchiveReader
+from tenc.sketch import CountMinSketch
+
+
+class TestSketch(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fin = os.path.join(self.dir, 'family.db')
+        rng = np.random.RandomState(0)
+        # a few frequent and many rare entities
+        names = ['E%d' % int(i) for i in rng.zipf(1.5, 400) % 100]
+        with open(self.fin, 'w') as fout:
+            for i in xrange(0, len(names), 2):
+                fout.write('P%d(%s, %s)\n' % (i % 3 if i % 50 else 9, names[i], names[i + 1]))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_count(self):
+        sketch = CountMinSketch(1 << 10, depth=3)
+        keys = ['k%d' % (i % 37) for i in xrange(1000)]
+        for k in keys:
+            sketch.add(k)
+        sketch.flush()
+        for k in set(keys):
+            assert sketch.count(k) >= keys.count(k)
+        assert 0 == CountMinSketch(1 << 16).count('k1')
+
+    def pruned(self, fname, min_count):
+        arc = TZArchive(fname, 'r:bz2')
+        reader = ArchiveReader(arc, min_count)
+        entities = entities_index(fname + '.tz')
+        predicates = predicates_index(fname + '.tz')
+        einv = dict((v, k) for k, v in reader.eidx.iteritems())
+        pinv = dict((v, k) for k, v in reader.pidx.iteritems())
+        triples = sorted(
+            (entities[einv[s]], predicates[pinv[p]], entities[einv[o]], val)
+            for chunk in reader.relation_chunks() for s, p, o, val in chunk
+        )
+        return triples, reader.nnz[MAP.ENTITY].sum()
+
+    def test_prefilter(self):
+        parser_cls = available_parsers['mln'][0]
+        full = os.path.join(self.dir, 'full')
+        parser_cls(full).convert([self.fin])
+        filtered = os.path.join(self.dir, 'filtered')
+        p = parser_cls(filtered, prefilter=(2, 1, 1 << 16))
+        p.convert([self.fin])
+        assert len(entities_index(filtered + '.tz')) < len(entities_index(full + '.tz'))
+
+        triples, nnz = self.pruned(full, (2, 1))
+        assert len(triples) > 0
+        assert (triples, nnz) == self.pruned(filtered, (2, 1))
+
+    def test_prefilter_stdin(self):
+        parser_cls = available_parsers['mln'][0]
+        p = parser_cls(os.path.join(self.dir, 'stdin'), prefilter=(2, 1, 1 << 16))
+        with pytest.raises(ValueError):
+            p.convert([''])
+        p.discard()
+        job = make_job({'file': '', 'parser': 'mln', 'prefilter': '64K'})
+        with pytest.raises(ValueError):
+            check_job(job)
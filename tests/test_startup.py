@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs 10c with the given arguments and prints the loaded heavy modules
+SCRIPT = """
+import sys
+from tenc import cli
+sys.argv = ['10c'] + sys.argv[1:]
+try:
+    cli.main()
+except SystemExit:
+    pass
+heavy = ['scipy', 'nltk', 'h5py', 'RDF', 'tenc.parser', 'tenc.serializer', 'tenc.postprocess']
+sys.stderr.write('\\nloaded: ' + ' '.join(m for m in heavy if m in sys.modules))
+"""
+
+
+def run(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    p = subprocess.Popen([sys.executable, '-c', SCRIPT] + list(args), env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    return err.splitlines()[-1].split()[1:]
+
+
+class TestStartup(object):
+
+    def test_help(self):
+        assert [] == run('-h')
+
+    def test_list(self):
+        assert [] == run('-l')
+
+
+def test_declarations():
+    # declarations in tenc/__init__.py match the registered plugins
+    from tenc import available_parsers, available_serializers, available_postprocessors
+    for registry in [available_parsers, available_serializers, available_postprocessors]:
+        for module in set(m for m, _ in registry.declared.itervalues()):
+            __import__(module)
+        registered = dict((name, cls) for name, (cls, _) in registry.iteritems())
+        assert sorted(registry.declared) == sorted(registered)
+        for name, (module, description) in registry.declared.iteritems():
+            assert module == registered[name].__module__
+            assert description == registry.description(name)
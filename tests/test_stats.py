@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from tenc.stats import histogram, survivors, triple_survivors
+
+
+class TestStats(object):
+
+    def test_histogram(self):
+        assert [(0, 0, 1), (1, 1, 2), (2, 3, 1), (4, 7, 1)] == histogram([0, 1, 1, 3, 7])
+
+    def test_survivors(self):
+        assert [4, 2, 1] == survivors([0, 1, 1, 3, 7], [0, 1, 5])
+
+    def test_triple_survivors(self):
+        edeg = np.array([1, 2, 3])
+        pdeg = np.array([1, 2])
+        # rows of tensor.ten: s, o, p, val
+        blocks = [np.array([[0, 1, 0, 1.], [1, 2, 1, 1.]]), np.array([[2, 2, 1, 1.]])]
+        T = triple_survivors(blocks, edeg, pdeg, [0, 1, 2], [0, 1])
+        assert [[3, 2], [2, 2], [1, 1]] == T.tolist()
+        with pytest.raises(ValueError):
+            triple_survivors(blocks, edeg, pdeg, [2, 0, 1], [0, 1])
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from tenc._tenc import write_archive
+from tenc.view import TensorView
+from tenc.subgraph import khop, extract
+
+
+class TestSubgraph(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'chain')
+        # chain 0 -> 1 -> 2 -> 3 -> 4 with two predicates
+        rows = np.array([[0, 1, 0, 1.], [1, 2, 1, 1.], [2, 3, 0, 1.], [3, 4, 1, 1.]])
+        names = ['e%d' % i for i in xrange(5)]
+        write_archive(self.fname, rows, names, ['p0', 'p1'], indexes=('subject', 'object'))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_khop(self):
+        view = TensorView(self.fname)
+        assert [2] == khop(view, [2], 0).tolist()
+        assert [1, 2, 3] == khop(view, [2], 1).tolist()
+        assert [0, 1, 2, 3, 4] == khop(view, [view.index('entities', 'e2')], 2).tolist()
+        assert [[1, 1, 2], [2, 0, 3]] == sorted(view.neighbors('e2').tolist())
+
+    def test_extract(self):
+        out = os.path.join(self.dir, 'sub')
+        extract(self.fname, ['e3'], 1, out)
+        view = TensorView(out)
+        assert (3, 3, 2) == view.shape
+        assert ['e2', 'e3', 'e4'] == view.entity_index()
+        assert 2 == view.nnz
+
+    def test_cache_dir(self):
+        cache = os.path.join(self.dir, 'cache')
+        os.mkdir(cache)
+        for name in ['a', 'b']:
+            extract(self.fname, ['e3'], 1, os.path.join(self.dir, name), cache)
+        # adjacency lists are extracted once and kept for later runs
+        assert 7 == len(os.listdir(cache))
+        assert TensorView(os.path.join(self.dir, 'b')).entity_index() == ['e2', 'e3', 'e4']
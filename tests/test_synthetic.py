@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from tenc import MAP, TZArchive, available_parsers
+from tenc._tenc import fjoin, read_tensor_size
+from tenc.synthetic import generate, write, FORMATS
+
+
+class TestSynthetic(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_generate(self):
+        g = generate(5000, n_entities=500, n_attributes=100, seed=1)
+        assert 5100 == len(g)
+        assert (g.subs == generate(5000, n_entities=500, n_attributes=100, seed=1).subs).all()
+        # power-law degrees, a few entities take a large part of the triples
+        degrees = np.sort(np.bincount(np.concatenate((g.subs, g.objs)), minlength=500))[::-1]
+        assert degrees[:50].sum() > degrees[250:].sum()
+        assert ['attr0', 'attr1'] == g.attribute_predicates()
+
+    def test_write(self):
+        g = generate(300, n_attributes=20)
+        for fmt in FORMATS:
+            fname = os.path.join(self.dir, 'graph.' + fmt)
+            write(g, fname, fmt)
+            with open(fname) as fin:
+                assert (300 if fmt == 'mln' else 320) == len(fin.readlines())
+
+        prefix = os.path.join(self.dir, 'graph')
+        available_parsers['mln'][0](prefix).convert([os.path.join(self.dir, 'graph.mln')])
+        arc = TZArchive(prefix, 'r:bz2')
+        N, K, nnz = read_tensor_size(arc.member(fjoin(arc.SUBS_FOUT, arc.SHAPE_SUFFIX)))
+        assert 300 == nnz[MAP.PREDICATE].sum()
+        assert len(set(g.subs) | set(g.objs)) == N
@@ -39,3 +39,22 @@ class TestTenc(object):
         fout = MockFile()
         write_tensor_index(fout, idx, False)
         assert 'length: 2\ne0\ne1\n' == fout.getvalue()
+
+    def test_id_map(self):
+        m = IdMap()
+        assert [0, 1, 0, 2] == [m[name] for name in ['e1', 'e0', 'e1', 'e2']]
+        assert ['e1', 'e0', 'e2'] == m.names
+        fout = MockFile()
+        write_tensor_index(fout, m.names, False)
+        assert 'length: 3\ne1\ne0\ne2\n' == fout.getvalue()
+
+    def test_write_remap_index(self):
+        # original ids 1, 3 and 4 are kept, in pruned order 4, 1, 3
+        remap = np.array([-1, 1, -1, 2, 0])
+        fout = MockFile()
+        write_remap_index(fout, remap)
+        assert 'length: 3\n4\n1\n3\n' == fout.getvalue()
+        # same as the pruned map of original id -> pruned id
+        expected = MockFile()
+        write_tensor_index(expected, {1: 1, 3: 2, 4: 0}, True)
+        assert expected.getvalue() == fout.getvalue()
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from tenc._tenc import write_archive
+from tenc.view import TensorView
+
+
+class TestView(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp(prefix='tenc-test-')
+        self.fname = os.path.join(self.dir, 'tensor')
+        rows = np.array([[0, 1, 0, 1.], [1, 2, 1, 2.], [2, 0, 0, 3.], [1, 1, 1, 4.]])
+        write_archive(self.fname, rows, ['e0', 'e1', 'e2'], ['p0', 'p1'], indexes=('predicate',))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_extracted_members(self):
+        view = TensorView(self.fname)
+        tmpdir = view.cache_dir
+        assert view.has_index('predicate') and not view.has_index('subject')
+        subs, vals = view.slice_arrays('p1')
+        assert [[1, 2], [1, 1]] == subs.tolist()
+        # slices are read from memory-mapped members
+        assert isinstance(view.open_member('predicate', 'subs').data, np.memmap)
+        view.close()
+        assert not os.path.exists(tmpdir)
+
+    def test_cache_dir(self):
+        cache = os.path.join(self.dir, 'cache')
+        os.mkdir(cache)
+        TensorView(self.fname, cache_dir=cache).close()
+        files = sorted(os.listdir(cache))
+        assert 4 == len(files)
+        mtimes = [os.stat(os.path.join(cache, f)).st_mtime for f in files]
+        # members are extracted only once
+        view = TensorView(self.fname, cache_dir=cache)
+        assert [os.stat(os.path.join(cache, f)).st_mtime for f in files] == mtimes
+        assert [[0, 1], [2, 0]] == view.slice_arrays('p0')[0].tolist()